@@ -0,0 +1,89 @@
+"""
+Benchmarks the recommendation search of CustomDataFrame against the previous
+scan-and-serialize implementation on the nlp_*.csv vocabulary lists.
+
+Usage (from the igc directory):
+    python benchmarks/bench_recommendations.py
+    python benchmarks/bench_recommendations.py --csv-dir path/to/lists/csv
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.CustomDataFrame import CustomDataFrame, Dataframes
+
+
+QUERIES = ["a", "ho", "hor", "horse", "eagle", "zeus", "hold", "xyz"]
+
+
+def legacy_search(df, column, query):
+    """
+    The serialization path of CustomDataFrame.search before records were prebuilt.
+    """
+    df_filtered = df[df[column].str.contains(query, case=False, na=False)].copy()
+
+    df_filtered['found_in_column'] = column
+
+    for col in df_filtered.columns:
+        if pd.api.types.is_numeric_dtype(df_filtered[col]):
+            df_filtered[col] = df_filtered[col].apply(lambda x: None if pd.isna(x) else x).copy()
+
+    df_filtered = df_filtered.where(pd.notnull(df_filtered), None)
+
+    return df_filtered.to_dict(orient='records')
+
+
+def load_tables(csv_dir):
+    """
+    Loads the raw tables either from a local directory or from the upstream repository.
+    """
+    if csv_dir is None:
+        return {table: frame.df for table, frame in Dataframes().dataframes.items()}
+
+    return {
+        table: pd.read_csv(os.path.join(csv_dir, f"nlp_{table}.csv"))
+        for table in Dataframes.column_mapping
+    }
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv-dir", help="Directory containing the nlp_*.csv files (default: download them)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tables = load_tables(args.csv_dir)
+
+    print(f"{'table':<12} {'rows':>6} {'legacy ms':>10} {'indexed ms':>11} {'speedup':>8}")
+    for table, df in tables.items():
+        columns = [column for column in Dataframes.column_mapping[table] if column in df.columns]
+        custom = CustomDataFrame(df, columns)
+
+        def run_legacy():
+            for q in QUERIES:
+                for column in columns:
+                    legacy_search(df, column, q)
+
+        def run_indexed():
+            for q in QUERIES:
+                custom.multi_search(columns, q)
+
+        legacy = timed(run_legacy, args.repeat) * 1000
+        indexed = timed(run_indexed, args.repeat) * 1000
+        print(f"{table:<12} {len(df):>6} {legacy:>10.2f} {indexed:>11.2f} {legacy / indexed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Benchmarks the decoding and conversion of coin search results: the previous path (SPARQL XML parsed
+by rdflib as the SPARQLStore did, row-by-row conversion through attribute access on rdflib terms,
+JsonResponse encoding) against the current one (SPARQL JSON decoded into plain values, column-wise
+conversion, fast JSON encoder). Fetching the result from the endpoint is not part of either timing.
+
+The result set is a recorded SPARQL XML or JSON response of a searchCoin query, or a synthetic one if
+none is given. `--record` sends a query to the endpoint once and stores its response for later runs.
+
+Usage (from the igc directory):
+    python benchmarks/bench_search_results.py --record results.srx --query search.rq
+    python benchmarks/bench_search_results.py --recorded results.srx
+    python benchmarks/bench_search_results.py --rows 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from io import BytesIO
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rdflib.query import Result
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.FastJson import dumps, orjson
+from services.Helper import Helper
+from services.QueryCache import QueryResult
+from services.SearchResults import search_records
+from services.SparqlTransport import SparqlTransport
+
+
+ENDPOINT = "https://data.corpus-nummorum.eu/sparql"
+MINT_MAP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "newapp", "ressources", "mintMap.csv")
+
+VARS = ["url", "thumbnailObverse", "thumbnailReverse", "descriptionObverse", "descriptionReverse",
+        "date", "maxDiameter", "id", "weight", "type", "mint"]
+
+
+def synthetic_result(rows, seed=0):
+    """
+    Builds a SPARQL JSON result that resembles a NumismaticObject search, with optional values left unbound.
+    """
+    rng = random.Random(seed)
+    mints = [f"http://nomisma.org/id/mint{index}" for index in range(200)]
+    bindings = []
+
+    for index in range(rows):
+        binding = {
+            "url": {"type": "uri", "value": f"https://www.corpus-nummorum.eu/coins?coin_id={index}"},
+            "id": {"type": "literal", "value": f"https://www.corpus-nummorum.eu/coins?coin_id={index}"},
+            "type": {"type": "uri", "value": f"https://www.corpus-nummorum.eu/types/{rng.randrange(5000)}"},
+            "mint": {"type": "uri", "value": rng.choice(mints)}
+        }
+        if rng.random() < 0.7:
+            binding["thumbnailObverse"] = {"type": "uri", "value": f"https://img.example/{index}_obv.jpg"}
+            binding["thumbnailReverse"] = {"type": "uri", "value": f"https://img.example/{index}_rev.jpg"}
+        if rng.random() < 0.9:
+            binding["descriptionObverse"] = {"type": "literal", "xml:lang": "en", "value": f"Head of Zeus, right, number {index}"}
+            binding["descriptionReverse"] = {"type": "literal", "xml:lang": "en", "value": f"Eagle standing left on thunderbolt {index}"}
+        if rng.random() < 0.8:
+            binding["weight"] = {"type": "literal", "value": f"{rng.uniform(1, 20):.2f}"}
+            binding["maxDiameter"] = {"type": "literal", "value": f"{rng.uniform(10, 30):.1f}"}
+            binding["date"] = {"type": "literal", "xml:lang": "en", "value": f"{rng.randrange(100, 400)} BC"}
+        bindings.append(binding)
+
+    return {"head": {"vars": VARS}, "results": {"bindings": bindings}}
+
+
+def convert(payload, format):
+    """
+    Converts a SPARQL result document between the XML and the JSON format through rdflib.
+    """
+    source = "json" if format == "xml" else "xml"
+    return Result.parse(BytesIO(payload), format=source).serialize(format=format)
+
+
+def record(path, query_path):
+    """
+    Sends a query to the endpoint and stores its SPARQL XML response, the format the previous path requested.
+    """
+    with open(query_path, "r") as file:
+        query = file.read()
+
+    response = SparqlTransport(ENDPOINT, read_timeout=600).post(query)
+    with open(path, "wb") as file:
+        file.write(response.content)
+
+
+def convertId(id_str):
+    if "coin_id=" in id_str:
+        return id_str.split("coin_id=")[1]
+    else:
+        return id_str
+
+
+def legacy_path(xml_payload, searchType, mintMap):
+    """
+    The searchCoin path before SPARQL JSON decoding and the column-wise conversion, as it was in views.py:
+    the SPARQLStore parsed the XML response into rdflib rows, every field was read through attribute access
+    on the rdflib terms and the response was encoded by JsonResponse.
+    """
+    results = Result.parse(BytesIO(xml_payload), format="xml")
+    result = []
+
+    for row in results:
+        category = row.type if searchType == "NumismaticObject" else "TYPE" if searchType == "TypeSeriesItem" else None
+
+        result_item = {
+            "type": searchType,
+            "url": str(row.url) if row.url else None,
+            "thumbnailObverse": str(row.thumbnailObverse) if row.thumbnailObverse else "static/no_image.jpg",
+            "thumbnailReverse": str(row.thumbnailReverse) if row.thumbnailReverse else "static/no_image.jpg",
+            "descriptionObverse": str(row.descriptionObverse) if row.descriptionObverse else None,
+            "descriptionReverse": str(row.descriptionReverse) if row.descriptionReverse else None,
+            "date": str(row.date) if row.date else None,
+            "maxDiameter": float(row.maxDiameter) if row.maxDiameter else None,
+            "id": convertId(row.id),
+            "category": category,
+            "weight": float(row.weight) if row.weight else None,
+            "location": mintMap.get(str(row.mint), None) if searchType == "NumismaticObject" else "TYPE",
+            "region": None if searchType == "NumismaticObject" else convertId(row.id)
+        }
+
+        result.append(result_item)
+
+    response = {"success": True, "result": result, "length": len(results)}
+    return json.dumps(response, cls=DjangoJSONEncoder).encode("utf-8")
+
+
+def current_path(json_payload, searchType, mint_labels):
+    results = QueryResult.from_sparql_json(json_payload)
+    records = search_records(results, searchType, mint_labels)
+    return dumps({"success": True, "result": records, "length": len(records)})
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Number of rows of the synthetic result set")
+    parser.add_argument("--recorded", help="A recorded SPARQL XML or JSON response of a searchCoin query")
+    parser.add_argument("--record", help="Send the query given with --query to the endpoint and store its response here")
+    parser.add_argument("--query", help="A file holding the searchCoin query to record")
+    parser.add_argument("--search-type", default="NumismaticObject")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.query:
+            parser.error("--record needs --query")
+        record(args.record, args.query)
+        args.recorded = args.record
+
+    mint_map = Helper.parse(open(MINT_MAP, "rb").read()) if os.path.exists(MINT_MAP) else {}
+
+    if args.recorded:
+        with open(args.recorded, "rb") as file:
+            payload = file.read()
+        if payload.lstrip().startswith(b"<"):
+            xml_payload, json_payload = payload, convert(payload, "json")
+        else:
+            xml_payload, json_payload = convert(payload, "xml"), payload
+        source = f"recorded result {args.recorded}"
+    else:
+        document = synthetic_result(args.rows)
+        json_payload = json.dumps(document).encode("utf-8")
+        xml_payload = convert(json_payload, "xml")
+        mint_map.update({f"http://nomisma.org/id/mint{index}": f"Mint {index}" for index in range(200)})
+        source = "synthetic result (pass --recorded for a recorded one)"
+
+    rows = len(json.loads(json_payload)["results"]["bindings"])
+
+    legacy = legacy_path(xml_payload, args.search_type, mint_map)
+    current = current_path(json_payload, args.search_type, mint_map)
+    assert json.loads(legacy) == json.loads(current), "both paths must produce the same response"
+
+    legacy_seconds = timed(lambda: legacy_path(xml_payload, args.search_type, mint_map), args.repeat)
+    current_seconds = timed(lambda: current_path(json_payload, args.search_type, mint_map), args.repeat)
+
+    print(f"{source}: {rows} rows, XML payload {len(xml_payload) / 1e6:.1f} MB, "
+          f"JSON payload {len(json_payload) / 1e6:.1f} MB, encoder {'orjson' if orjson is not None else 'json'}")
+    print(f"{'path':<10}{'seconds':>10}{'rows/s':>12}")
+    print(f"{'legacy':<10}{legacy_seconds:>10.3f}{rows / legacy_seconds:>12.0f}")
+    print(f"{'current':<10}{current_seconds:>10.3f}{rows / current_seconds:>12.0f}")
+    print(f"speedup {legacy_seconds / current_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
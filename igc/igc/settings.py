@@ -129,4 +129,113 @@ STATIC_URL = '/static/'
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Local snapshot of the NLP vocabulary lists, see `manage.py refresh_vocabulary`
+VOCABULARY_SNAPSHOT_DIR = BASE_DIR / 'newapp' / 'ressources' / 'vocabulary'
+
+# Result cache for SPARQL queries sent to the corpus-nummorum endpoint
+QUERY_CACHE = {
+    'path': BASE_DIR / 'newapp' / 'cache' / 'queries.sqlite3',
+    'max_entries': 256,
+    'ttl': 60 * 60,
+    'max_bytes': 64 * 1024 * 1024,
+    'stale_ttl': 7 * 24 * 60 * 60,
+}
+
+# HTTP transport to the SPARQL endpoint (connection pool, timeouts in seconds, retries, queue deadline
+# and circuit breaker)
+SPARQL_TRANSPORT = {
+    'pool_size': 10,
+    'max_concurrent': 8,
+    'connect_timeout': 5,
+    'read_timeout': 60,
+    'retries': 2,
+    'backoff': 0.5,
+    'queue_timeout': 10,
+    'failure_threshold': 5,
+    'reset_timeout': 30,
+}
+
+# Backend that executes the SPARQL queries: 'remote' sends them to the corpus-nummorum endpoint,
+# 'local' answers them from a store loaded from the RDF dump, see `manage.py load_rdf_dump`
+SPARQL_BACKEND = 'remote'
+
+LOCAL_STORE = {
+    'dump_dir': BASE_DIR / 'newapp' / 'ressources' / 'rdf',
+    'store_dir': BASE_DIR / 'newapp' / 'ressources' / 'rdfstore',
+    'check_interval': 30,
+    'max_concurrent': 4,
+}
+
+# Local index of the iconography descriptions that keyword constraints are resolved against,
+# rebuilt in the background after `max_age` seconds or with `manage.py refresh_lookup_tables`;
+# the query that builds it bypasses the query cache and may take up to `build_timeout` seconds
+ICONOGRAPHY_INDEX = {
+    'path': BASE_DIR / 'newapp' / 'cache' / 'iconography.json',
+    'max_age': 24 * 60 * 60,
+    'max_values': 2000,
+    'build_timeout': 10 * 60,
+}
+
+# Materialized thumbnails of the type series items, used instead of aggregating them in every type search,
+# built like the iconography index
+THUMBNAIL_TABLE = {
+    'path': BASE_DIR / 'newapp' / 'cache' / 'thumbnails.json',
+    'max_age': 24 * 60 * 60,
+    'build_timeout': 10 * 60,
+}
+
+# Mint map (nomisma mint URI -> label), read from the CSV file at startup and downloaded again
+# from nomisma.org in the background once the file is older than `max_age` seconds;
+# the download gives up after `download_timeout` seconds without progress
+MINT_MAP = {
+    'csv_path': BASE_DIR / 'newapp' / 'ressources' / 'mintMap.csv',
+    'max_age': 7 * 24 * 60 * 60,
+    'check_interval': 30,
+    'download_timeout': 60,
+}
+
+# Cache of the labels of mints that are missing from the mint map, fetched from nomisma.org
+# in batches of up to `batch_size` mints; mints without a label are retried after `negative_ttl` seconds
+MINT_RESOLVER = {
+    'max_size': 10000,
+    'ttl': 7 * 24 * 60 * 60,
+    'negative_ttl': 60 * 60,
+    'batch_size': 200,
+}
+
+# HTTP transport to the nomisma.org SPARQL endpoint, which publishes the mint URIs and their labels;
+# kept small and short, since the labels only decorate the search results
+NOMISMA_TRANSPORT = {
+    'endpoint': 'https://nomisma.org/query',
+    'pool_size': 2,
+    'max_concurrent': 2,
+    'connect_timeout': 5,
+    'read_timeout': 15,
+    'retries': 1,
+    'queue_timeout': 2,
+    'failure_threshold': 3,
+    'reset_timeout': 60,
+}
+
+# How the vocabulary tables and the mint map are held: 'memory' keeps a copy in every worker process,
+# 'shared' maps one read-only file into all of them (written on first start or by `manage.py refresh_vocabulary`,
+# and again by one of the workers once the mint map is older than its `max_age` or either source file changed)
+VOCABULARY_MODE = 'memory'
+
+SHARED_VOCABULARY = {
+    'path': BASE_DIR / 'newapp' / 'cache' / 'vocabulary.bin',
+    'check_interval': 30,
+}
+
+# Front-end event log: events are queued in memory and appended in batches of up to `batch_size` rows,
+# at the latest `flush_interval` seconds after they arrived; the file is rotated once it reaches `max_bytes`
+EVENT_LOG = {
+    'path': BASE_DIR / 'newapp' / 'logs' / 'log.csv',
+    'batch_size': 100,
+    'flush_interval': 2.0,
+    'max_bytes': 10 * 1024 * 1024,
+    'backups': 5,
+    'max_queue': 10000,
+}
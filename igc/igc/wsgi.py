@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'igc.settings')
 
 application = get_wsgi_application()
+
+# load the services of the application in the background, so the server accepts requests right away
+from newapp.registry import services  # noqa: E402
+
+services.warm()
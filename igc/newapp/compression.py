@@ -0,0 +1,85 @@
+import asyncio
+from functools import wraps
+
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MIN_SIZE = 1024
+
+
+def accepted_encodings(request):
+    """
+    Parses the Accept-Encoding header of a request.
+
+    Parameters:
+        request: The HTTP request object.
+
+    Returns:
+        set: The content codings the client accepts, without those it refused with q=0.
+    """
+    encodings = set()
+
+    for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if coding and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            encodings.add(coding.lower())
+
+    return encodings
+
+
+def compress_response(request, response):
+    """
+    Compresses the body of a response with brotli (if installed) or gzip, depending on what the client accepts.
+    Streaming responses, small bodies and responses that are already encoded are left as they are.
+
+    Parameters:
+        request: The HTTP request object.
+        response: The HTTP response object.
+
+    Returns:
+        HttpResponse: The (possibly compressed) response.
+    """
+    if response.streaming or response.has_header("Content-Encoding") or len(response.content) < MIN_SIZE:
+        return response
+
+    patch_vary_headers(response, ("Accept-Encoding",))
+    encodings = accepted_encodings(request)
+
+    if brotli is not None and "br" in encodings:
+        encoding, content = "br", brotli.compress(response.content, quality=5)
+    elif "gzip" in encodings:
+        encoding, content = "gzip", compress_string(response.content)
+    else:
+        return response
+
+    if len(content) >= len(response.content):
+        return response
+
+    response.content = content
+    response["Content-Length"] = str(len(content))
+    response["Content-Encoding"] = encoding
+
+    return response
+
+
+def compressed(view):
+    """
+    Decorates a synchronous or asynchronous view so that its responses are compressed when the client accepts it.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            return compress_response(request, await view(request, *args, **kwargs))
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return compress_response(request, view(request, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from services.LocalStore import LocalStore
+from services.QueryCache import QueryCache
+
+
+class Command(BaseCommand):
+    """
+    Loads the corpus-nummorum RDF dump into the local triple store used when SPARQL_BACKEND is 'local'.
+    Only files that were added, changed or removed since the last load are processed; cached query
+    results are dropped whenever the store changed.
+    """
+    help = "Loads the RDF dump into the local triple store"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Parse every file of the dump again")
+
+    def handle(self, *args, **options):
+        store = LocalStore(**settings.LOCAL_STORE, autoload=False)
+        changed = store.reload(force=options["force"])
+
+        if changed:
+            QueryCache(**settings.QUERY_CACHE).clear()
+            stats = store.stats()
+            self.stdout.write(self.style.SUCCESS(
+                f"Loaded {', '.join(changed)} ({stats['triples']} triples in {stats['files']} files)"
+            ))
+        else:
+            self.stdout.write("Local store is up to date.")
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from services.CoinSearchHandler import CoinSearchHandler
+from services.IconographyIndex import IconographyIndex
+from services.LocalStore import LocalStore
+from services.ThumbnailTable import ThumbnailTable
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the local lookup tables derived from the SPARQL data: the iconography index used for keyword
+    constraints and the thumbnail table used for type searches. Running processes pick up the new files when their own copy becomes stale.
+    """
+    help = "Rebuilds the local lookup tables derived from the SPARQL data"
+    requires_system_checks = []
+
+    def handle(self, *args, **options):
+        handler = CoinSearchHandler(
+            transport_options=settings.SPARQL_TRANSPORT,
+            backend=LocalStore(**settings.LOCAL_STORE) if settings.SPARQL_BACKEND == "local" else None
+        )
+
+        iconography = IconographyIndex(**settings.ICONOGRAPHY_INDEX)
+        count = iconography.build(handler.executeBulkQuery)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} iconography descriptions."))
+
+        thumbnails = ThumbnailTable(**settings.THUMBNAIL_TABLE)
+        count = thumbnails.build(handler.executeBulkQuery)
+        self.stdout.write(self.style.SUCCESS(f"Stored the thumbnails of {count} type series items."))
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from services.CustomDataFrame import Dataframes
+from services.Helper import Helper
+from services.SharedVocabulary import write
+
+
+class Command(BaseCommand):
+    """
+    Refreshes the local snapshot of the NLP vocabulary lists from the upstream repository.
+    Only tables whose ETag, Last-Modified date or checksum changed are downloaded again.
+    With VOCABULARY_MODE = 'shared', the shared vocabulary file is then written again together with the
+    mint map, which is downloaded first if it is stale; running servers map the new file on their next check.
+    """
+    help = "Refreshes the local snapshot of the NLP vocabulary lists"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Download every table regardless of the stored validators")
+
+    def handle(self, *args, **options):
+        database = Dataframes(settings.VOCABULARY_SNAPSHOT_DIR)
+        updated = database.refresh(force=options["force"])
+
+        if updated:
+            self.stdout.write(self.style.SUCCESS(f"Updated tables: {', '.join(updated)}"))
+        else:
+            self.stdout.write("Vocabulary snapshot is up to date.")
+
+        if settings.VOCABULARY_MODE == "shared":
+            helper = Helper(**settings.MINT_MAP, background_refresh=False)
+            helper.refresh()
+
+            path = settings.SHARED_VOCABULARY["path"]
+            size = write(path, database, helper.get_mint_map())
+            self.stdout.write(self.style.SUCCESS(f"Wrote the shared vocabulary to {path} ({size / 1e6:.1f} MB)"))
@@ -0,0 +1,116 @@
+import os
+import time
+
+from django.conf import settings
+
+from services.CoinSearchHandler import CoinSearchHandler
+from services.CustomDataFrame import Dataframes
+from services.EventLogSink import EventLogSink
+from services.Helper import Helper
+from services.IconographyIndex import IconographyIndex
+from services.LocalStore import LocalStore
+from services.MintResolver import MintResolver
+from services.QueryCache import QueryCache
+from services.ServiceRegistry import ServiceRegistry
+from services.SharedVocabulary import SharedVocabulary
+from services.SparqlTransport import SparqlTransport
+from services.ThumbnailTable import ThumbnailTable
+
+
+def createCoinSearchHandler():
+	"""
+	Creates the coin search handler with its cache, transport or local store and lookup tables.
+
+	Returns:
+		CoinSearchHandler: The configured handler.
+	"""
+	return CoinSearchHandler(
+		cache=QueryCache(**settings.QUERY_CACHE),
+		transport_options=settings.SPARQL_TRANSPORT,
+		backend=LocalStore(**settings.LOCAL_STORE) if settings.SPARQL_BACKEND == "local" else None,
+		iconography=IconographyIndex(**settings.ICONOGRAPHY_INDEX),
+		thumbnails=ThumbnailTable(**settings.THUMBNAIL_TABLE)
+	)
+
+
+def loadSharedSources():
+	"""
+	Loads the vocabulary snapshot and the mint map that are written into the shared vocabulary file.
+	A missing or stale mint map is downloaded first, as the Helper of the memory mode does in the background.
+
+	Returns:
+		tuple: The Dataframes and the mint map.
+	"""
+	helper = Helper(**settings.MINT_MAP, background_refresh=False)
+	helper.refresh()
+
+	return Dataframes(settings.VOCABULARY_SNAPSHOT_DIR), helper.get_mint_map()
+
+
+def sharedVocabularyOutdated(builtAt):
+	"""
+	Checks whether the shared vocabulary file has to be written again: the mint map file is missing or older
+	than the `max_age` of MINT_MAP, or the mint map or the vocabulary snapshot changed after the file was written.
+
+	Parameters:
+		builtAt (float): The time the shared vocabulary file was written.
+
+	Returns:
+		bool: Whether the file is outdated.
+	"""
+	mintMapPath = settings.MINT_MAP["csv_path"]
+	manifestPath = os.path.join(settings.VOCABULARY_SNAPSHOT_DIR, "manifest.json")
+
+	try:
+		mintMapTime = os.path.getmtime(mintMapPath)
+	except OSError:
+		return True
+
+	if time.time() - mintMapTime > settings.MINT_MAP["max_age"]:
+		return True
+
+	return mintMapTime > builtAt or (os.path.exists(manifestPath) and os.path.getmtime(manifestPath) > builtAt)
+
+
+def createSharedVocabulary():
+	"""
+	Maps the shared vocabulary file, writing it first if no process has done so yet.
+	The file is written again in the background once it is outdated.
+
+	Returns:
+		SharedVocabulary: The vocabulary tables and the mint map of the file.
+	"""
+	return SharedVocabulary.open(
+		settings.SHARED_VOCABULARY["path"],
+		loadSharedSources,
+		settings.SHARED_VOCABULARY["check_interval"],
+		sharedVocabularyOutdated
+	)
+
+
+def createMintResolver():
+	"""
+	Creates the resolver of the mints that are missing from the mint map.
+
+	Returns:
+		MintResolver: The resolver, querying the nomisma.org endpoint that publishes the mint URIs.
+	"""
+	mintMaps = services.get("database" if settings.VOCABULARY_MODE == "shared" else "helper")
+	transport = SparqlTransport(**settings.NOMISMA_TRANSPORT)
+
+	return MintResolver(transport.query, mintMaps.get_mint_map, **settings.MINT_RESOLVER)
+
+
+# the services are only constructed on first use, or by `services.warm()` once a server loads the application
+services = ServiceRegistry()
+
+# in the shared mode, the vocabulary file holds the mint map as well, so no process keeps its own copy of either
+if settings.VOCABULARY_MODE != "shared":
+	services.register("helper", lambda: Helper(**settings.MINT_MAP))
+services.register("coinSearchHandler", createCoinSearchHandler)
+services.register("mintResolver", createMintResolver)
+if settings.VOCABULARY_MODE == "shared":
+	services.register("database", createSharedVocabulary)
+else:
+	services.register("database", lambda: Dataframes(settings.VOCABULARY_SNAPSHOT_DIR))
+services.register("eventLog", lambda: EventLogSink(**settings.EVENT_LOG))
@@ -843,6 +843,39 @@ $(document).ready(function () {
     $(".tooltip-arrow-border").css({ width: calcArrowWidth() });
   }
 
+  /**
+   * Turns a columnar search result (one array per field, optionally
+   * dictionary-encoded or with a default value) back into one object per row.
+   * @param {Object} result - The columnar result sent by the searchCoin action.
+   * @returns {Array} The result rows.
+   */
+  function decodeColumnar(result) {
+    const columns = result.fields.map((field) => {
+      const column = result.columns[field];
+
+      if (Array.isArray(column)) {
+        return column;
+      }
+      if (column.dictionary) {
+        return column.codes.map((code) => column.dictionary[code]);
+      }
+      return column.values.map((value) =>
+        value === null ? column.default : value
+      );
+    });
+
+    const rows = new Array(result.length);
+    for (let i = 0; i < result.length; i++) {
+      const row = {};
+      result.fields.forEach((field, j) => {
+        row[field] = columns[j][i];
+      });
+      rows[i] = row;
+    }
+
+    return rows;
+  }
+
   /**
    * Performs a search based on the current query in the SPARQL editor.
    * @returns {void}
@@ -860,14 +893,17 @@ $(document).ready(function () {
         action: "searchCoin",
         q: editor.getValue(),
         searchType: appState.currentSearchType,
+        format: "columnar",
       },
       success: function (r) {
         $("#loadingSymbol").addClass("hidden");
-        $("#numSearchResults").html(r.result.length);
+
+        const rows = r.success ? decodeColumnar(r.result) : [];
+        $("#numSearchResults").html(rows.length);
 
         if (r.success) {
-          appState.latestCoinResult = r.result;
-          appState.sortedCoinResult = [...r.result];
+          appState.latestCoinResult = rows;
+          appState.sortedCoinResult = [...rows];
           appState.totalPages = Math.ceil(
             appState.sortedCoinResult.length / appState.resultsPerPage
           );
@@ -0,0 +1,78 @@
+from django.test import SimpleTestCase
+
+from services.BooleanQuery import coin_key, compile_expression, parse, to_nnf, tokenize
+
+
+class TokenizeTests(SimpleTestCase):
+
+    def test_splits_operators_placeholders_and_brackets(self):
+        self.assertEqual(tokenize("C1 AND NOT (C2 OR C3)"), ["C1", "AND", "NOT", "(", "C2", "OR", "C3", ")"])
+
+    def test_lowercase_placeholder_is_rejected(self):
+        with self.assertRaises(ValueError):
+            tokenize("c1")
+
+
+class ParseTests(SimpleTestCase):
+
+    def test_precedence(self):
+        self.assertEqual(
+            parse("C1 AND NOT (C2 OR C3)"),
+            ("and", [("coin", "C1"), ("not", ("or", [("coin", "C2"), ("coin", "C3")]))])
+        )
+        self.assertEqual(
+            parse("C1 OR C2 AND C3"),
+            ("or", [("coin", "C1"), ("and", [("coin", "C2"), ("coin", "C3")])])
+        )
+
+    def test_empty_expression(self):
+        self.assertIsNone(parse("  "))
+
+    def test_missing_operand(self):
+        with self.assertRaises(ValueError):
+            parse("C1 OR ")
+
+    def test_unbalanced_brackets(self):
+        with self.assertRaises(ValueError):
+            parse("(C1 OR C2")
+        with self.assertRaises(ValueError):
+            parse("C1 OR C2)")
+
+
+class NegationNormalFormTests(SimpleTestCase):
+
+    def test_de_morgan(self):
+        self.assertEqual(
+            to_nnf(parse("C1 AND NOT (C2 OR C3)")),
+            ("and", [("coin", "C1"), ("not", ("coin", "C2")), ("not", ("coin", "C3"))])
+        )
+
+    def test_nested_negations_cancel_out(self):
+        self.assertEqual(to_nnf(parse("NOT NOT C1")), ("coin", "C1"))
+        self.assertEqual(
+            to_nnf(parse("NOT (C1 AND NOT (C2 OR NOT C3))")),
+            ("or", [("not", ("coin", "C1")), ("coin", "C2"), ("not", ("coin", "C3"))])
+        )
+
+
+class CompileExpressionTests(SimpleTestCase):
+
+    def setUp(self):
+        self.coin = {"obverse": {"coin": [], "keywords": [{"text": "horse", "negated": False}]}}
+        self.other = {"obverse": {"coin": [], "keywords": [{"text": "eagle", "negated": False}]}}
+
+    def test_duplicate_branches_are_removed(self):
+        tree, coins = compile_expression("C1 OR C2", [self.coin, dict(self.coin)])
+
+        self.assertEqual(tree, ("coin", coin_key(self.coin)))
+        self.assertEqual(list(coins), [coin_key(self.coin)])
+
+    def test_equivalent_expressions_compile_to_the_same_tree(self):
+        first, _ = compile_expression("C1 AND NOT C2", [self.coin, self.other])
+        second, _ = compile_expression("NOT C1 AND C2", [self.other, self.coin])
+
+        self.assertEqual(first, second)
+
+    def test_unknown_placeholder(self):
+        with self.assertRaises(ValueError):
+            compile_expression("C1 OR C3", [self.coin, self.other])
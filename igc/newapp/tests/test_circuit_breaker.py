@@ -0,0 +1,118 @@
+import asyncio
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from services.CircuitBreaker import CircuitBreaker, CircuitOpenError
+from services.SparqlTransport import EndpointUnavailable, SparqlTransport
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+        breaker.allow()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+
+        breaker.allow()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+        self.assertEqual(breaker.snapshot()["rejected"], 1)
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, "closed")
+
+    def test_half_open_allows_a_single_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        breaker.allow()
+        self.assertEqual(breaker.state, "half-open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+    def test_trial_outcome_closes_or_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        breaker.allow()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0)
+        for _ in range(5):
+            breaker.record_failure()
+        breaker.allow()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertEqual(breaker.snapshot()["opened"], 2)
+
+    def test_release_gives_the_trial_up(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        breaker.allow()
+
+        breaker.release()
+
+        breaker.allow()
+        self.assertEqual(breaker.state, "half-open")
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class TransportTrialTests(SimpleTestCase):
+    """
+    A half-open breaker must not stay stuck when its trial call ends with an exception the retry loop does not handle.
+    """
+
+    query = "SELECT * WHERE { ?s ?p ?o }"
+
+    def setUp(self):
+        self.transport = SparqlTransport("http://127.0.0.1:9/sparql", failure_threshold=1, reset_timeout=0, retries=0)
+        self.transport.breaker.record_failure()
+
+    def test_unexpected_error_counts_as_failure(self):
+        with mock.patch.object(self.transport, "_post_once", side_effect=ValueError("unexpected")):
+            with self.assertRaises(ValueError):
+                self.transport.post(self.query)
+
+        self.assertEqual(self.transport.breaker.state, "open")
+        self.transport.breaker.allow()
+
+    def test_other_request_errors_become_endpoint_unavailable(self):
+        with mock.patch.object(self.transport, "_post_once", side_effect=requests.exceptions.ChunkedEncodingError("broken")):
+            with self.assertRaises(EndpointUnavailable):
+                self.transport.post(self.query)
+
+        self.transport.breaker.allow()
+
+    def test_interruption_releases_the_trial(self):
+        with mock.patch.object(self.transport, "_post_once", side_effect=Interrupted()):
+            with self.assertRaises(Interrupted):
+                self.transport.post(self.query)
+
+        self.assertEqual(self.transport.breaker.state, "half-open")
+        self.transport.breaker.allow()
+
+    def test_cancelled_async_trial_is_released(self):
+        async def cancel():
+            client, _ = self.transport._async_state()
+            with mock.patch.object(client, "post", side_effect=asyncio.CancelledError()):
+                await self.transport.apost(self.query)
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(cancel())
+
+        self.transport.breaker.allow()
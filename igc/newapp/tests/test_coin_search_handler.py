@@ -0,0 +1,272 @@
+import asyncio
+import json
+import re
+import threading
+
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+from rdflib import Graph, Literal, Namespace, URIRef
+from rdflib.namespace import DCTERMS, FOAF, RDF
+
+from services.CoinSearchHandler import CoinSearchHandler
+from services.QueryCache import QueryResult
+
+
+NMO = Namespace("http://nomisma.org/ontology#")
+EX = Namespace("http://example.org/")
+RDF_LI = URIRef(str(RDF) + "li")
+
+
+def coinUrl(index):
+    return f"https://www.corpus-nummorum.eu/coins?coin_id={index}"
+
+
+def coinGraph(count):
+    """
+    Builds a small dataset of coins: every even coin shows a horse on its obverse, every third one Zeus.
+    """
+    graph = Graph()
+
+    for index in range(count):
+        url = URIRef(coinUrl(index))
+        side, iconography, bag = EX[f"{index}/obverse"], EX[f"{index}/iconography"], EX[f"{index}/bag"]
+
+        graph.add((url, RDF.type, NMO.NumismaticObject))
+        graph.add((url, DCTERMS.identifier, Literal(coinUrl(index))))
+        graph.add((url, NMO.hasWeight, Literal(f"{index}.5")))
+        graph.add((url, NMO.hasObverse, side))
+        graph.add((side, FOAF.thumbnail, URIRef(f"https://img.example/{index}.jpg")))
+        graph.add((side, NMO.hasIconography, iconography))
+        graph.add((iconography, NMO.hasIconography, bag))
+        graph.add((bag, RDF.type, RDF.Bag))
+
+        subjects = ([EX.horse] if index % 2 == 0 else [EX.eagle]) + ([EX.zeus] if index % 3 == 0 else [])
+        for position, subject in enumerate(subjects):
+            description = EX[f"{index}/description{position}"]
+            graph.add((bag, RDF_LI, description))
+            graph.add((description, RDF.subject, subject))
+
+    return graph
+
+
+def coin(subject):
+    return {
+        "obverse": {"coin": [{"category": "list_animal", "item": {"link": str(subject)}}], "keywords": []},
+        "reverse": {"coin": [], "keywords": []}
+    }
+
+
+class GraphBackend():
+    """
+    Answers queries from an in-memory graph and records them. `answer` may replace the result of a query.
+    Queries are evaluated one at a time, since the SPARQL parser of rdflib is not thread-safe.
+    """
+
+    max_concurrent = 4
+
+    def __init__(self, graph, answer=None):
+        self.graph = graph
+        self.answer = answer
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def query(self, query, timeout=None, read_timeout=None):
+        with self._lock:
+            self.queries.append(query)
+            result = QueryResult.from_rdflib(self.graph.query(query))
+        return self.answer(query, result) if self.answer is not None else result
+
+    async def aquery(self, query):
+        return await asyncio.to_thread(self.query, query)
+
+    def values(self, query):
+        """
+        Returns the URIs bound with VALUES in a query.
+        """
+        block = re.search(r"VALUES \?url \{([^}]*)\}", query)
+        return re.findall(r"<([^>]+)>", block.group(1)) if block else None
+
+
+class TwoPhaseTests(SimpleTestCase):
+
+    def setUp(self):
+        self.backend = GraphBackend(coinGraph(10))
+        self.handler = CoinSearchHandler(backend=self.backend)
+        self.addCleanup(self.handler._executor.shutdown)
+
+    def enrichmentQueries(self):
+        return [query for query in self.backend.queries if self.backend.values(query) is not None]
+
+    def test_lean_query_only_selects_the_url(self):
+        query = self.handler.generateQuery([coin(EX.horse)], "C1", "NumismaticObject", lean=True)
+
+        self.assertRegex(query, r"SELECT DISTINCT \?url WHERE")
+        self.assertNotIn("?thumbnailObverse", query)
+        self.assertNotIn("OPTIONAL", query)
+
+    def test_page_is_enriched_in_batched_values_queries(self):
+        results, total = self.handler.searchTwoPhase([coin(EX.horse)], "C1", "NumismaticObject", page=1, pageSize=4, batchSize=3)
+
+        self.assertEqual(total, 5)
+        batches = sorted(self.backend.values(query) for query in self.enrichmentQueries())
+        self.assertEqual(batches, [[coinUrl(0), coinUrl(2), coinUrl(4)], [coinUrl(6)]])
+        for query in self.enrichmentQueries():
+            self.assertIn("?thumbnailObverse", query)
+        self.assertEqual(results.bindings[1]["thumbnailObverse"], "https://img.example/2.jpg")
+
+    def test_page_keeps_the_url_order(self):
+        for page, expected in ((1, [0, 2]), (2, [4, 6]), (3, [8])):
+            with self.subTest(page=page):
+                results, _ = self.handler.searchTwoPhase([coin(EX.horse)], "C1", "NumismaticObject", page=page, pageSize=2, batchSize=1)
+
+                self.assertEqual([row.url for row in results], [coinUrl(index) for index in expected])
+
+    def test_urls_without_enrichment_rows_are_left_out(self):
+        def answer(query, result):
+            if self.backend.values(query) is None:
+                return result
+            return QueryResult(result.vars, [binding for binding in result.bindings if binding["url"] != coinUrl(2)])
+        self.backend.answer = answer
+
+        results, total = self.handler.searchTwoPhase([coin(EX.horse)], "C1", "NumismaticObject", page=1, pageSize=5, batchSize=2)
+
+        self.assertEqual([row.url for row in results], [coinUrl(index) for index in (0, 4, 6, 8)])
+        self.assertEqual(total, 5)
+
+
+class FanOutTests(SimpleTestCase):
+    """
+    "C1 OR C2" runs one branch for the horse coins (0, 2, 4, 6, 8) and one for the Zeus coins (0, 3, 6, 9).
+    """
+
+    coins = [coin(EX.horse), coin(EX.zeus)]
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.backend = GraphBackend(coinGraph(10))
+        self.handler = CoinSearchHandler(backend=self.backend)
+        self.addCleanup(self.handler._executor.shutdown)
+        self.addCleanup(self.release.set)
+
+    def fail(self, subject, error=None):
+        """
+        Makes the branch that constrains `subject` raise `error`, or hang for a second at most.
+        """
+        def answer(query, result):
+            if f"<{subject}>" not in query:
+                return result
+            if error is not None:
+                raise error
+            self.release.wait(1)
+            return result
+        self.backend.answer = answer
+
+    def urls(self, results):
+        return sorted(int(row.url.split("=")[1]) for row in results)
+
+    def test_rows_found_by_several_branches_are_merged_once(self):
+        for search in (self.handler.searchFanOut, lambda *args: asyncio.run(self.handler.asearchFanOut(*args))):
+            results, reports = search(self.coins, "C1 OR C2", "NumismaticObject")
+
+            self.assertEqual(self.urls(results), [0, 2, 3, 4, 6, 8, 9])
+            self.assertEqual(sorted(report["rows"] for report in reports), [4, 5])
+            self.assertFalse(any(report["error"] for report in reports))
+
+    def test_failing_branch_only_drops_its_own_rows(self):
+        self.fail(EX.zeus, RuntimeError("branch failed"))
+
+        for search in (self.handler.searchFanOut, lambda *args: asyncio.run(self.handler.asearchFanOut(*args))):
+            results, reports = search(self.coins, "C1 OR C2", "NumismaticObject")
+
+            self.assertEqual(self.urls(results), [0, 2, 4, 6, 8])
+            self.assertEqual([report["error"] for report in reports if report["error"]], ["branch failed"])
+
+    def test_timed_out_branch_only_drops_its_own_rows(self):
+        self.fail(EX.zeus)
+
+        results, reports = self.handler.searchFanOut(self.coins, "C1 OR C2", "NumismaticObject", timeout=0.2)
+        self.assertEqual(self.urls(results), [0, 2, 4, 6, 8])
+        self.assertEqual([report["error"] for report in reports if report["error"]], ["Timed out after 0.2 seconds"])
+
+        results, reports = asyncio.run(self.handler.asearchFanOut(self.coins, "C1 OR C2", "NumismaticObject", timeout=0.2))
+        self.assertEqual(self.urls(results), [0, 2, 4, 6, 8])
+        self.assertEqual([report["error"] for report in reports if report["error"]], ["Timed out after 0.2 seconds"])
+
+    def test_response_is_marked_as_partial(self):
+        from newapp.registry import services
+        from newapp.views import callback
+        from services.MintResolver import MintResolver
+
+        resolver = MintResolver(lambda query: QueryResult([], []))
+        data = {"action": "searchCoin", "plan": "fanOut", "searchType": "NumismaticObject",
+                "coins": json.dumps(self.coins), "relationString": "C1 OR C2"}
+
+        def search():
+            request = RequestFactory().post("/callback", data)
+            with mock.patch.object(services, "get", {"coinSearchHandler": self.handler, "mintResolver": resolver}.get):
+                return json.loads(callback(request).content)
+
+        response = search()
+        self.assertFalse(response["partial"])
+        self.assertEqual(response["length"], 7)
+
+        self.fail(EX.zeus, RuntimeError("branch failed"))
+        response = search()
+        self.assertTrue(response["partial"])
+        self.assertEqual(response["length"], 5)
+        self.assertEqual(sorted(row["id"] for row in response["result"]), ["0", "2", "4", "6", "8"])
+
+
+class PaginationTests(SimpleTestCase):
+
+    query = """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    SELECT DISTINCT ?url ?id ?weight WHERE { ?url dcterms:identifier ?id ; nmo:hasWeight ?weight . }
+    """
+
+    def setUp(self):
+        self.backend = GraphBackend(coinGraph(10))
+        self.handler = CoinSearchHandler(backend=self.backend)
+        self.addCleanup(self.handler._executor.shutdown)
+
+    def test_page_wrapper(self):
+        query = self.handler.paginateQuery(self.query, 25, 50)
+
+        self.assertTrue(query.startswith("PREFIX nmo: <http://nomisma.org/ontology#>\nPREFIX dcterms: <http://purl.org/dc/terms/>\n"))
+        self.assertIn("SELECT * WHERE { SELECT DISTINCT ?url ?id ?weight WHERE", query)
+        self.assertTrue(query.endswith("} ORDER BY ?url ?id ?weight LIMIT 25 OFFSET 50"))
+
+    def test_count_wrapper(self):
+        query = self.handler.countQuery(self.query)
+
+        self.assertTrue(query.startswith("PREFIX nmo: <http://nomisma.org/ontology#>\n"))
+        self.assertIn("SELECT (COUNT(*) AS ?count) WHERE { SELECT DISTINCT ?url ?id ?weight WHERE", query)
+        self.assertEqual(int(next(iter(self.handler.executeQuery(query))).count), 10)
+
+    def test_pages_are_disjoint_and_in_a_stable_order(self):
+        pages = []
+        for page in range(1, 5):
+            results, total = self.handler.executePage(self.query, page, 3)
+            self.assertEqual(total, 10)
+            pages.append([row.url for row in results])
+
+        self.assertEqual([len(urls) for urls in pages], [3, 3, 3, 1])
+        self.assertEqual(sum(pages, []), sorted(coinUrl(index) for index in range(10)))
+        self.assertEqual(self.handler.executePage(self.query, 2, 3)[0].bindings, self.handler.executePage(self.query, 2, 3)[0].bindings)
+
+    def test_page_parameters_are_echoed(self):
+        from newapp.registry import services
+        from newapp.views import callback
+        from services.MintResolver import MintResolver
+
+        resolver = MintResolver(lambda query: QueryResult([], []))
+        data = {"action": "searchCoin", "searchType": "NumismaticObject", "q": self.query, "page": "2", "pageSize": "4"}
+
+        with mock.patch.object(services, "get", {"coinSearchHandler": self.handler, "mintResolver": resolver}.get):
+            response = json.loads(callback(RequestFactory().post("/callback", data)).content)
+
+        self.assertEqual((response["page"], response["pageSize"], response["length"]), (2, 4, 10))
+        self.assertEqual([row["id"] for row in response["result"]], ["4", "5", "6", "7"])
+        self.assertEqual([row["weight"] for row in response["result"]], [4.5, 5.5, 6.5, 7.5])
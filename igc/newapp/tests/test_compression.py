@@ -0,0 +1,89 @@
+import asyncio
+import gzip
+import zlib
+from types import SimpleNamespace
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from newapp.compression import MIN_SIZE, accepted_encodings, compressed
+
+
+BODY = b'{"result": [' + b'{"type": "NumismaticObject", "url": null}, ' * 200 + b'{}]}'
+
+# stands in for the optional brotli package, which only has to compress
+fake_brotli = SimpleNamespace(compress=lambda content, quality: b"br:" + zlib.compress(content))
+
+
+@compressed
+def view(request):
+    return HttpResponse(request.body or BODY, content_type="application/json")
+
+
+@compressed
+async def async_view(request):
+    return HttpResponse(BODY, content_type="application/json")
+
+
+class CompressionTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def get(self, accept_encoding=None, view=view):
+        headers = {} if accept_encoding is None else {"HTTP_ACCEPT_ENCODING": accept_encoding}
+        return view(self.factory.get("/callback", **headers))
+
+    def test_accepted_encodings(self):
+        request = self.factory.get("/", HTTP_ACCEPT_ENCODING="GZIP, br;q=0, deflate;q=0.5, identity; q=0.0")
+
+        self.assertEqual(accepted_encodings(request), {"gzip", "deflate"})
+        self.assertEqual(accepted_encodings(self.factory.get("/")), set())
+
+    def test_brotli_is_preferred_when_installed(self):
+        with mock.patch("newapp.compression.brotli", fake_brotli):
+            response = self.get("gzip, deflate, br")
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(zlib.decompress(response.content[3:]), BODY)
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+
+    def test_gzip_without_brotli(self):
+        with mock.patch("newapp.compression.brotli", None):
+            response = self.get("gzip, deflate, br")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), BODY)
+
+    def test_refused_encodings_are_not_used(self):
+        with mock.patch("newapp.compression.brotli", fake_brotli):
+            self.assertEqual(self.get("br;q=0, gzip")["Content-Encoding"], "gzip")
+            response = self.get("br;q=0, gzip;q=0")
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content, BODY)
+
+    def test_missing_header_means_identity(self):
+        response = self.get()
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content, BODY)
+
+    def test_vary_is_set_on_every_compressible_response(self):
+        for accept_encoding in (None, "identity", "gzip"):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(self.get(accept_encoding)["Vary"], "Accept-Encoding")
+
+    def test_small_bodies_are_left_uncompressed(self):
+        body = b"x" * (MIN_SIZE - 1)
+        response = view(self.factory.generic("GET", "/callback", body, HTTP_ACCEPT_ENCODING="gzip"))
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content, body)
+
+    def test_async_views_are_compressed(self):
+        response = asyncio.run(self.get("gzip", view=async_view))
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), BODY)
@@ -0,0 +1,52 @@
+import pandas as pd
+from django.test import SimpleTestCase
+
+from services.CustomDataFrame import CustomDataFrame
+
+
+class MultiSearchTests(SimpleTestCase):
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "id": ["1", "2", "3", "4"],
+            "name_en": ["Athena", "Zeus", "Athena Parthenos", "Nike"],
+            "name_de": ["Athene", "Zeus", "Pallas Athene", None],
+            "alternativenames_en": ["Pallas", None, "Parthenos", "Athena Nike"],
+        })
+        self.columns = ["name_en", "name_de", "alternativenames_en"]
+        self.table = CustomDataFrame(self.df, search_columns=["name_en", "name_de"])
+
+    def ids(self, results):
+        return [row["id"] for row in results]
+
+    def test_row_matching_several_columns_is_returned_once(self):
+        results = self.table.multi_search(self.columns, "athen")
+
+        self.assertEqual(sorted(self.ids(results)), ["1", "3", "4"])
+        first = next(row for row in results if row["id"] == "1")
+        self.assertEqual(first["found_in_columns"], ["name_en", "name_de"])
+
+    def test_unindexed_and_unknown_columns(self):
+        results = self.table.multi_search(["alternativenames_en", "unknown"], "pallas")
+
+        self.assertEqual(self.ids(results), ["1"])
+        self.assertEqual(results[0]["found_in_column"], "alternativenames_en")
+
+    def test_exact_matches_rank_before_prefixes_and_substrings(self):
+        self.assertEqual(self.ids(self.table.multi_search(self.columns, "athena")), ["1", "4", "3"])
+        self.assertEqual(self.ids(self.table.multi_search(self.columns, "athene")), ["1", "3"])
+
+    def test_best_matching_column_is_reported(self):
+        results = self.table.multi_search(self.columns, "parthenos")
+
+        self.assertEqual(self.ids(results), ["3"])
+        self.assertEqual(results[0]["found_in_column"], "alternativenames_en")
+        self.assertEqual(results[0]["found_in_columns"], ["name_en", "alternativenames_en"])
+
+    def test_limit_and_offset_page_through_the_ranking(self):
+        ranking = self.ids(self.table.multi_search(self.columns, "athen"))
+
+        self.assertEqual(self.ids(self.table.multi_search(self.columns, "athen", limit=1)), ranking[:1])
+        self.assertEqual(self.ids(self.table.multi_search(self.columns, "athen", limit=1, offset=1)), ranking[1:2])
+        self.assertEqual(self.ids(self.table.multi_search(self.columns, "athen", offset=2)), ranking[2:])
+        self.assertEqual(self.table.multi_search(self.columns, "athen", limit=5, offset=3), [])
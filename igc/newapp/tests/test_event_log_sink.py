@@ -0,0 +1,84 @@
+import csv
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from services.EventLogSink import EventLogSink
+
+
+class EventLogSinkTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "log.csv")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def rows(self, path=None):
+        with open(path or self.path, newline="") as file:
+            return list(csv.reader(file))
+
+    def waitFor(self, sink, written):
+        deadline = time.monotonic() + 5
+        while sink.snapshot()["written"] < written and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_full_batch_is_written_in_one_append(self):
+        sink = EventLogSink(self.path, batch_size=3, flush_interval=60)
+
+        for index in range(3):
+            self.assertTrue(sink.write(["uuid", index]))
+        self.waitFor(sink, 3)
+
+        self.assertEqual(self.rows(), [["uuid", "0"], ["uuid", "1"], ["uuid", "2"]])
+        self.assertEqual(sink.snapshot()["batches"], 1)
+
+    def test_partial_batch_is_written_after_the_flush_interval(self):
+        sink = EventLogSink(self.path, batch_size=100, flush_interval=0.05)
+
+        sink.write(["uuid", 0])
+        self.waitFor(sink, 1)
+
+        self.assertEqual(self.rows(), [["uuid", "0"]])
+
+    def test_full_queue_drops_rows(self):
+        sink = EventLogSink(self.path, max_queue=1)
+
+        with mock.patch.object(sink, "_start"):
+            self.assertTrue(sink.write(["first"]))
+            self.assertFalse(sink.write(["second"]))
+
+        self.assertEqual(sink.snapshot()["dropped"], 1)
+
+    def test_file_is_rotated_once_it_is_full(self):
+        sink = EventLogSink(self.path, max_bytes=10, backups=2)
+
+        for batch in range(4):
+            sink._queue.put([f"batch {batch}", "x" * 10])
+            sink.flush()
+
+        self.assertEqual(self.rows(), [["batch 3", "x" * 10]])
+        self.assertEqual(self.rows(f"{self.path}.1"), [["batch 2", "x" * 10]])
+        self.assertEqual(self.rows(f"{self.path}.2"), [["batch 1", "x" * 10]])
+        self.assertFalse(os.path.exists(f"{self.path}.3"))
+        self.assertEqual(sink.snapshot()["rotations"], 3)
+
+    def test_writer_survives_failed_writes(self):
+        sink = EventLogSink(self.path, batch_size=1, flush_interval=0.01)
+
+        with mock.patch.object(sink, "_append", side_effect=ValueError("broken row")):
+            sink.write(["lost"])
+            deadline = time.monotonic() + 5
+            while sink.snapshot()["errors"] < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        sink.write(["kept"])
+        self.waitFor(sink, 1)
+
+        self.assertTrue(sink._thread.is_alive())
+        self.assertEqual(self.rows(), [["kept"]])
+        self.assertEqual(sink.snapshot()["dropped"], 1)
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from services.Helper import Helper, fcntl
+
+
+OLD = b"mint,mintLabel\nhttp://nomisma.org/id/athens,Athens\n"
+NEW = b"mint,mintLabel\nhttp://nomisma.org/id/athens,Athens\nhttp://nomisma.org/id/corinth,Corinth\n"
+
+
+def download(content=NEW, status_code=200):
+    return mock.Mock(status_code=status_code, content=content)
+
+
+class HelperTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "mintMap.csv")
+
+    def write(self, content, age=0):
+        with open(self.path, "wb") as file:
+            file.write(content)
+        mtime = time.time() - age
+        os.utime(self.path, (mtime, mtime))
+
+    def read(self):
+        with open(self.path, "rb") as file:
+            return file.read()
+
+    def helper(self, **options):
+        options.setdefault("background_refresh", False)
+        return Helper(self.path, max_age=3600, check_interval=0, **options)
+
+    def test_missing_file_is_downloaded(self):
+        helper = self.helper()
+
+        with mock.patch("services.Helper.requests.get", return_value=download()) as get:
+            helper.refresh()
+
+        self.assertEqual(get.call_args.kwargs["timeout"], helper.download_timeout)
+        self.assertEqual(self.read(), NEW)
+        self.assertEqual(helper.get_mint_map()["http://nomisma.org/id/corinth"], "Corinth")
+
+    def test_fresh_file_is_not_downloaded(self):
+        self.write(OLD)
+        helper = self.helper()
+
+        with mock.patch("services.Helper.requests.get") as get:
+            helper.refresh()
+
+        get.assert_not_called()
+        self.assertEqual(helper.get_mint_map(), {"http://nomisma.org/id/athens": "Athens"})
+
+    def test_rejected_downloads_keep_the_old_file(self):
+        self.write(OLD, age=7200)
+        helper = self.helper()
+
+        for response in (download(b"mint,mintLabel\n"), download(b""), download(b"\xff\xfe"), download(NEW, 500)):
+            with self.subTest(content=response.content, status_code=response.status_code):
+                with mock.patch("services.Helper.requests.get", return_value=response):
+                    helper.refresh()
+
+                self.assertEqual(self.read(), OLD)
+                self.assertEqual(helper.get_mint_map(), {"http://nomisma.org/id/athens": "Athens"})
+
+    def test_file_is_replaced_atomically(self):
+        self.write(OLD, age=7200)
+        helper = self.helper()
+        replace = os.replace
+
+        def checked_replace(source, target):
+            # the complete download is written next to the file before it takes its place
+            self.assertEqual(target, helper.csv_path)
+            with open(source, "rb") as file:
+                self.assertEqual(file.read(), NEW)
+            self.assertEqual(self.read(), OLD)
+            replace(source, target)
+
+        with mock.patch("services.Helper.requests.get", return_value=download()), \
+                mock.patch("services.Helper.os.replace", side_effect=checked_replace) as patched:
+            helper.refresh()
+
+        patched.assert_called_once()
+        self.assertEqual(self.read(), NEW)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["mintMap.csv", "mintMap.csv.lock"])
+
+    def test_background_refresh_is_not_retried_after_a_failure(self):
+        self.write(OLD, age=7200)
+
+        with mock.patch("services.Helper.requests.get", return_value=download(b"")) as get:
+            helper = self.helper(background_refresh=True)
+            deadline = time.monotonic() + 5
+            while helper._refreshing and time.monotonic() < deadline:
+                time.sleep(0.01)
+            for _ in range(5):
+                helper.get_mint_map()
+            while helper._refreshing and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(helper.get_mint_map(), {"http://nomisma.org/id/athens": "Athens"})
+
+    def test_background_refresh_swaps_in_the_new_map(self):
+        self.write(OLD, age=7200)
+
+        with mock.patch("services.Helper.requests.get", return_value=download()):
+            helper = self.helper(background_refresh=True)
+            deadline = time.monotonic() + 5
+            while "http://nomisma.org/id/corinth" not in helper.get_mint_map() and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertIn("http://nomisma.org/id/corinth", helper.get_mint_map())
+
+    def test_file_written_by_another_process_is_loaded(self):
+        self.write(OLD)
+        helper = self.helper()
+
+        self.write(NEW, age=-10)
+
+        self.assertIn("http://nomisma.org/id/corinth", helper.get_mint_map())
+
+
+@unittest.skipIf(fcntl is None, "file locks are not available")
+class HelperLockTests(SimpleTestCase):
+    """
+    Only one process downloads the mint map at a time; the lock is held here as if by another process.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "mintMap.csv")
+        self.helper = Helper(self.path, max_age=3600, background_refresh=False)
+
+        self.lock_file = open(f"{self.path}.lock", "w")
+        self.addCleanup(self.lock_file.close)
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+
+    def test_background_refresh_skips_a_locked_download(self):
+        with mock.patch("services.Helper.requests.get", return_value=download()) as get:
+            self.helper.refresh(wait=False)
+
+        get.assert_not_called()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_waiting_refresh_uses_the_download_of_the_other_process(self):
+        with mock.patch("services.Helper.requests.get", return_value=download()) as get:
+            thread = threading.Thread(target=self.helper.refresh)
+            thread.start()
+            time.sleep(0.1)
+            self.assertTrue(thread.is_alive())
+
+            with open(self.path, "wb") as file:
+                file.write(NEW)
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            thread.join(5)
+
+        get.assert_not_called()
+        self.assertIn("http://nomisma.org/id/corinth", self.helper.get_mint_map())
@@ -0,0 +1,39 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase
+
+from services.LocalStore import LocalStore
+
+
+class LocalStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        dump_dir = os.path.join(self.directory.name, "rdf")
+        os.makedirs(dump_dir)
+
+        with open(os.path.join(dump_dir, "coins.ttl"), "w") as file:
+            file.write("@prefix nmo: <http://nomisma.org/ontology#> .\n")
+            for index in range(50):
+                file.write(f"<http://example.org/coin/{index}> nmo:hasWeight {index} .\n")
+
+        self.store = LocalStore(dump_dir, os.path.join(self.directory.name, "store"), max_concurrent=8)
+
+    def weights(self, minimum):
+        query = f"""
+        PREFIX nmo: <http://nomisma.org/ontology#>
+        SELECT ?coin ?weight WHERE {{ ?coin nmo:hasWeight ?weight FILTER (?weight >= {minimum}) }} ORDER BY ?weight
+        """
+        return [int(row.weight) for row in self.store.query(query)]
+
+    def test_queries_run_concurrently(self):
+        minimums = list(range(40)) * 3
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(self.weights, minimums))
+
+        self.assertEqual(results, [list(range(minimum, 50)) for minimum in minimums])
+        self.assertEqual(self.store.stats()["queries"], len(minimums))
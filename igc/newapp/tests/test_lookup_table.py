@@ -0,0 +1,104 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from services.CoinSearchHandler import CoinSearchHandler
+from services.LookupTable import LookupTable
+from services.QueryCache import QueryCache, QueryResult
+from services.SparqlTransport import EndpointUnavailable
+
+
+class NameTable(LookupTable):
+
+    name = "name table"
+    query = "SELECT ?name WHERE { ?s ?p ?name }"
+
+    def _row(self, row):
+        return [row.name]
+
+    def _set(self, rows):
+        self.names = [name for name, in rows]
+
+
+class StubBackend():
+
+    max_concurrent = 2
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = []
+
+    def query(self, query, timeout=None, read_timeout=None):
+        self.calls.append((query, read_timeout))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class RefreshTests(SimpleTestCase):
+
+    def refresh(self, table, execute):
+        with mock.patch("services.LookupTable.threading.Thread") as thread:
+            thread.side_effect = lambda target, **kwargs: mock.Mock(start=target)
+            table.refresh_in_background(execute)
+
+    def test_failed_build_is_not_retried_within_the_retry_interval(self):
+        table = NameTable()
+        execute = mock.Mock(side_effect=EndpointUnavailable("down"))
+
+        for _ in range(5):
+            self.refresh(table, execute)
+
+        self.assertEqual(execute.call_count, 1)
+        self.assertFalse(table.ready)
+
+        table._attempted_at -= table.RETRY_INTERVAL
+        self.refresh(table, execute)
+        self.assertEqual(execute.call_count, 2)
+
+    def test_only_one_build_runs_at_a_time(self):
+        table = NameTable()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def execute(query, read_timeout):
+            calls.append(query)
+            started.set()
+            release.wait(5)
+            return QueryResult(["name"], [{"name": "Athena"}])
+
+        table.refresh_in_background(execute)
+        self.assertTrue(started.wait(5))
+        table._attempted_at -= table.RETRY_INTERVAL
+        table.refresh_in_background(execute)
+        release.set()
+
+        self.assertEqual(len(calls), 1)
+
+
+class BulkQueryTests(SimpleTestCase):
+
+    def test_build_bypasses_the_cache_with_the_build_timeout(self):
+        cache = QueryCache(stale_ttl=60)
+        backend = StubBackend(QueryResult(["name"], [{"name": "Athena"}, {"name": "Zeus"}]))
+        handler = CoinSearchHandler(cache=cache, backend=backend)
+        table = NameTable(build_timeout=123)
+
+        self.assertEqual(table.build(handler.executeBulkQuery), 2)
+
+        self.assertEqual(table.names, ["Athena", "Zeus"])
+        self.assertEqual(backend.calls, [(NameTable.query, 123)])
+        self.assertIsNone(cache.get(NameTable.query))
+
+    def test_failed_build_does_not_fall_back_to_a_stale_result(self):
+        cache = QueryCache(ttl=-1, stale_ttl=60)
+        cache.set(NameTable.query, QueryResult(["name"], [{"name": "old"}]))
+        handler = CoinSearchHandler(cache=cache, backend=StubBackend(error=EndpointUnavailable("down")))
+        table = NameTable()
+
+        with self.assertRaises(EndpointUnavailable):
+            table.build(handler.executeBulkQuery)
+
+        self.assertFalse(table.ready)
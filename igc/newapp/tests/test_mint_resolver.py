@@ -0,0 +1,134 @@
+import re
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from services.MintResolver import MintResolver
+from services.QueryCache import QueryResult
+from services.SparqlTransport import EndpointUnavailable
+
+
+class StubEndpoint():
+    """
+    Answers label queries from a dictionary of mint URI -> list of (label, language) pairs.
+    """
+
+    def __init__(self, labels=None, error=None):
+        self.labels = labels or {}
+        self.error = error
+        self.batches = []
+
+    def __call__(self, query):
+        uris = re.findall(r"<([^>]+)>", query.split("VALUES", 1)[1])
+        self.batches.append(uris)
+        if self.error is not None:
+            raise self.error
+        bindings = [
+            {"mint": uri, "label": label, "lang": lang}
+            for uri in uris for label, lang in self.labels.get(uri, [])
+        ]
+        return QueryResult(["mint", "label", "lang"], bindings)
+
+
+class MintResolverTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("services.MintResolver.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unknown_mints_are_looked_up_in_batches(self):
+        endpoint = StubEndpoint()
+        resolver = MintResolver(endpoint, batch_size=200)
+        uris = [f"http://nomisma.org/id/mint{index}" for index in range(450)]
+
+        resolver.resolve(uris + uris[:10])
+
+        self.assertEqual([len(batch) for batch in endpoint.batches], [200, 200, 50])
+        self.assertEqual(sum(endpoint.batches, []), uris)
+
+    def test_mint_map_and_cache_are_used_first(self):
+        endpoint = StubEndpoint({"http://nomisma.org/id/corinth": [("Corinth", "en")]})
+        resolver = MintResolver(endpoint, mint_map=lambda: {"http://nomisma.org/id/athens": "Athens"})
+        uris = ["http://nomisma.org/id/athens", "http://nomisma.org/id/corinth", None, ""]
+
+        self.assertEqual(resolver.resolve(uris), {"http://nomisma.org/id/athens": "Athens", "http://nomisma.org/id/corinth": "Corinth"})
+        resolver.resolve(uris)
+
+        self.assertEqual(endpoint.batches, [["http://nomisma.org/id/corinth"]])
+        self.assertEqual(resolver.stats["hits"], 1)
+
+    def test_english_labels_are_preferred(self):
+        endpoint = StubEndpoint({
+            "http://nomisma.org/id/a": [("Athen", "de"), ("Athens", "en"), ("Athenai", None)],
+            "http://nomisma.org/id/b": [("Korinth", "de"), ("Corinthus", None)],
+            "http://nomisma.org/id/c": [("Rome", "en-GB"), ("Roma", "it")],
+            "http://nomisma.org/id/d": [("Milet", "de")],
+        })
+
+        labels = MintResolver(endpoint).resolve(sorted(endpoint.labels))
+
+        self.assertEqual(labels, {
+            "http://nomisma.org/id/a": "Athens",
+            "http://nomisma.org/id/b": "Corinthus",
+            "http://nomisma.org/id/c": "Rome",
+            "http://nomisma.org/id/d": "Milet",
+        })
+
+    def test_mints_without_label_are_looked_up_again_after_the_negative_ttl(self):
+        endpoint = StubEndpoint()
+        resolver = MintResolver(endpoint, ttl=3600, negative_ttl=60)
+        uri = "http://nomisma.org/id/unknown"
+
+        self.assertEqual(resolver.resolve([uri]), {})
+        self.now += 59
+        resolver.resolve([uri])
+        self.assertEqual(len(endpoint.batches), 1)
+        self.assertEqual(resolver.stats["negative_hits"], 1)
+
+        self.now += 2
+        resolver.resolve([uri])
+        self.assertEqual(len(endpoint.batches), 2)
+
+    def test_malformed_uris_are_never_sent(self):
+        endpoint = StubEndpoint()
+        resolver = MintResolver(endpoint)
+        malformed = ["not a uri", "http://nomisma.org/id/a> } ; DROP ALL ; {", "nomisma", "http://nomisma.org/id/{x}"]
+
+        self.assertEqual(resolver.resolve(malformed), {})
+        self.assertEqual(endpoint.batches, [])
+        self.assertEqual(len(resolver), len(malformed))
+
+    def test_failed_lookup_is_not_cached_and_does_not_fail(self):
+        endpoint = StubEndpoint(error=EndpointUnavailable("down"))
+        resolver = MintResolver(endpoint, mint_map=lambda: {"http://nomisma.org/id/athens": "Athens"})
+        uris = ["http://nomisma.org/id/athens", "http://nomisma.org/id/corinth"]
+
+        self.assertEqual(resolver.resolve(uris), {"http://nomisma.org/id/athens": "Athens"})
+        self.assertEqual(len(resolver), 0)
+        self.assertEqual(resolver.stats["failures"], 1)
+
+        endpoint.error = None
+        endpoint.labels = {"http://nomisma.org/id/corinth": [("Corinth", "en")]}
+        self.assertEqual(resolver.resolve(uris)["http://nomisma.org/id/corinth"], "Corinth")
+
+    def test_cache_is_bounded(self):
+        resolver = MintResolver(StubEndpoint(), max_size=5)
+
+        resolver.resolve([f"http://nomisma.org/id/mint{index}" for index in range(12)])
+
+        self.assertEqual(len(resolver), 5)
+
+
+class MintResolverEndpointTests(SimpleTestCase):
+
+    def test_labels_are_looked_up_at_nomisma(self):
+        from newapp.registry import createMintResolver, services
+
+        with mock.patch.object(services, "get", return_value=mock.Mock(get_mint_map=dict)):
+            resolver = createMintResolver()
+
+        self.assertEqual(resolver.execute.__self__.endpoint, settings.NOMISMA_TRANSPORT["endpoint"])
+        self.assertIn("skos:prefLabel", resolver.label_query)
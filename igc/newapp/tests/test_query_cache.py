@@ -0,0 +1,89 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from services.QueryCache import QueryCache, QueryResult
+
+
+def result(value):
+    return QueryResult(["s"], [{"s": value}])
+
+
+class QueryCacheTests(SimpleTestCase):
+    """
+    Entries expire after their time to live, stay readable as stale results for `stale_ttl` seconds
+    and are evicted least recently used first.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "queries.sqlite3")
+        self.now = 1000.0
+        patcher = mock.patch("services.QueryCache.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def values(self, cached):
+        return None if cached is None else [row.s for row in cached]
+
+    def test_entry_expires_after_its_ttl(self):
+        cache = QueryCache(ttl=10)
+        cache.set("SELECT 1", result("a"))
+
+        self.now += 9
+        self.assertEqual(self.values(cache.get("SELECT 1")), ["a"])
+        self.now += 1
+        self.assertIsNone(cache.get("SELECT 1"))
+        self.assertEqual(cache.stats["memory_hits"], 1)
+        self.assertEqual(cache.stats["misses"], 1)
+
+    def test_expired_entry_is_served_as_stale_within_stale_ttl(self):
+        cache = QueryCache(ttl=10, stale_ttl=20)
+        cache.set("SELECT 1", result("a"))
+
+        self.now += 15
+        self.assertIsNone(cache.get("SELECT 1"))
+        self.assertEqual(self.values(cache.get("SELECT 1", allow_stale=True)), ["a"])
+        self.now += 15
+        self.assertIsNone(cache.get("SELECT 1", allow_stale=True))
+        self.assertEqual(cache.stats["stale_hits"], 1)
+
+    def test_least_recently_used_entry_is_evicted_from_memory(self):
+        cache = QueryCache(max_entries=2)
+        for value in ("a", "b"):
+            cache.set(f"SELECT {value}", result(value))
+        cache.get("SELECT a")
+        cache.set("SELECT c", result("c"))
+
+        self.assertIsNone(cache.get("SELECT b"))
+        self.assertEqual(self.values(cache.get("SELECT a")), ["a"])
+        self.assertEqual(self.values(cache.get("SELECT c")), ["c"])
+        self.assertEqual(cache.stats["memory_evictions"], 1)
+
+    def test_disk_tier_is_shared_and_trimmed_to_max_bytes(self):
+        size = len(result("a").to_json())
+        cache = QueryCache(self.path, max_entries=1, max_bytes=2 * size)
+        for value in ("a", "b"):
+            self.now += 1
+            cache.set(f"SELECT {value}", result(value))
+        self.now += 1
+        cache.get("SELECT a")
+        self.now += 1
+        cache.set("SELECT c", result("c"))
+
+        other = QueryCache(self.path)
+        self.assertEqual(self.values(other.get("SELECT a")), ["a"])
+        self.assertEqual(self.values(other.get("SELECT c")), ["c"])
+        self.assertIsNone(other.get("SELECT b"))
+        self.assertEqual(cache.stats["disk_evictions"], 1)
+
+    def test_normalized_queries_share_an_entry(self):
+        cache = QueryCache()
+        cache.set("SELECT ?s WHERE { ?s ?p ?o }", result("a"))
+
+        self.assertEqual(self.values(cache.get("SELECT ?s\n  WHERE {\n ?s ?p ?o\n}")), ["a"])
@@ -0,0 +1,39 @@
+import pandas as pd
+from django.test import SimpleTestCase
+
+from services.SearchIndex import NGramIndex, fold
+
+
+class NGramIndexTests(SimpleTestCase):
+    """
+    A lookup in the n-gram index finds the same rows as a substring scan with `str.contains`.
+    """
+
+    values = ["Athena", "Athens", "Héraklès", "HERAKLES", None, "", "Zeus and Athena", "Apollo", "a", "Nike"]
+
+    def setUp(self):
+        self.df = pd.DataFrame({"name": self.values, "other": ["x"] * len(self.values)})
+        self.index = NGramIndex(self.df, ["name", "missing"], n=3)
+
+    def scan(self, query):
+        folded = self.df["name"].map(lambda value: None if pd.isna(value) else fold(value))
+        mask = folded.str.contains(fold(query), regex=False, na=False)
+        return mask.to_numpy().nonzero()[0].tolist()
+
+    def test_lookup_matches_a_substring_scan(self):
+        for query in ("a", "at", "ath", "athen", "ATHENA", "herakles", "Héra", "us and", "o", "zz", "nikes", "e"):
+            with self.subTest(query=query):
+                self.assertEqual(self.index.lookup("name", query), self.scan(query))
+
+    def test_lookup_is_case_and_diacritic_insensitive(self):
+        self.assertEqual(self.index.lookup("name", "herakles"), [2, 3])
+        self.assertEqual(self.index.lookup("name", "HÉRAKLÈS"), [2, 3])
+
+    def test_empty_query_matches_every_present_cell(self):
+        self.assertEqual(self.index.lookup("name", ""), [0, 1, 2, 3, 5, 6, 7, 8, 9])
+        self.assertEqual(self.index.lookup("name", ""), self.scan(""))
+
+    def test_columns_that_are_not_indexed(self):
+        self.assertNotIn("other", self.index.texts)
+        self.assertNotIn("missing", self.index.texts)
+        self.assertEqual(self.index.lookup("other", "x"), [])
@@ -0,0 +1,71 @@
+from django.test import SimpleTestCase
+
+from services.QueryCache import QueryResult
+from services.SearchResults import FIELDS, NO_IMAGE, _encode, search_columnar, search_records
+
+
+def decode(document):
+    """
+    Rebuilds the row-wise records from a columnar document, the way the frontend does.
+    """
+    columns = {}
+    for field, column in document["columns"].items():
+        if isinstance(column, dict) and "dictionary" in column:
+            columns[field] = [column["dictionary"][code] for code in column["codes"]]
+        elif isinstance(column, dict):
+            columns[field] = [column["default"] if value is None else value for value in column["values"]]
+        else:
+            columns[field] = column
+
+    return [{field: columns[field][position] for field in document["fields"]} for position in range(document["length"])]
+
+
+def coins(count):
+    bindings = []
+    for index in range(count):
+        binding = {
+            "url": f"https://www.corpus-nummorum.eu/coins?coin_id={index}",
+            "id": f"https://www.corpus-nummorum.eu/coins?coin_id={index}",
+            "type": f"https://www.corpus-nummorum.eu/types/{index % 3}",
+            "mint": f"http://nomisma.org/id/mint{index % 4}",
+            "descriptionObverse": f"Head of Zeus {index}",
+        }
+        if index % 5:
+            binding["thumbnailObverse"] = f"https://img.example/{index}_obv.jpg"
+        if index % 2:
+            binding["weight"] = f"{index}.5"
+        bindings.append(binding)
+    return QueryResult(["url", "id", "type", "mint", "descriptionObverse", "thumbnailObverse", "weight"], bindings)
+
+
+class ColumnarTests(SimpleTestCase):
+
+    mint_labels = {"http://nomisma.org/id/mint0": "Athens", "http://nomisma.org/id/mint1": "Corinth"}
+
+    def test_columnar_document_decodes_to_the_records(self):
+        for searchType in ("NumismaticObject", "TypeSeriesItem"):
+            results = coins(40)
+            with self.subTest(searchType=searchType):
+                document = search_columnar(results, searchType, self.mint_labels)
+
+                self.assertEqual(document["fields"], list(FIELDS))
+                self.assertEqual(decode(document), search_records(results, searchType, self.mint_labels))
+
+    def test_every_encoding_is_used(self):
+        columns = search_columnar(coins(40), "NumismaticObject", self.mint_labels)["columns"]
+
+        self.assertEqual(columns["type"], {"dictionary": ["NumismaticObject"], "codes": [0] * 40})
+        self.assertEqual(columns["location"]["dictionary"], ["Athens", "Corinth", None])
+        self.assertEqual(columns["thumbnailObverse"]["default"], NO_IMAGE)
+        self.assertIsInstance(columns["descriptionObverse"], list)
+
+    def test_default_is_not_used_for_columns_with_nulls(self):
+        values = ["a", "b", None, "x", "x", "c"]
+
+        self.assertEqual(_encode(values), values)
+
+    def test_empty_result(self):
+        document = search_columnar(QueryResult(["url"], []), "NumismaticObject", {})
+
+        self.assertEqual(document["length"], 0)
+        self.assertEqual(decode(document), [])
@@ -0,0 +1,145 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import reverse
+
+from services.ServiceRegistry import ServiceRegistry
+
+
+class ServiceRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = ServiceRegistry()
+
+    def test_services_are_constructed_on_first_use(self):
+        factory = mock.Mock(return_value="instance")
+        self.registry.register("service", factory)
+
+        factory.assert_not_called()
+        self.assertIsNone(self.registry.peek("service"))
+        self.assertEqual(self.registry.status()["service"]["state"], "pending")
+
+        self.assertEqual(self.registry.get("service"), "instance")
+        self.assertEqual(self.registry.get("service"), "instance")
+        factory.assert_called_once()
+        self.assertEqual(self.registry.peek("service"), "instance")
+        self.assertIsNone(self.registry.peek("unknown"))
+
+    def test_concurrent_callers_share_one_construction(self):
+        def factory():
+            time.sleep(0.05)
+            return object()
+        factory = mock.Mock(side_effect=factory)
+        self.registry.register("service", factory)
+
+        instances = []
+        threads = [threading.Thread(target=lambda: instances.append(self.registry.get("service"))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        factory.assert_called_once()
+        self.assertEqual(len(set(map(id, instances))), 1)
+
+    def test_failed_service_is_constructed_again(self):
+        factory = mock.Mock(side_effect=[OSError("snapshot missing"), "instance"])
+        self.registry.register("service", factory)
+
+        with self.assertRaises(OSError):
+            self.registry.get("service")
+        self.assertEqual(self.registry.status()["service"]["state"], "failed")
+        self.assertEqual(self.registry.status()["service"]["error"], "OSError: snapshot missing")
+        self.assertFalse(self.registry.ready)
+
+        self.assertEqual(self.registry.get("service"), "instance")
+        self.assertEqual(self.registry.status()["service"]["state"], "ready")
+        self.assertIsNone(self.registry.status()["service"]["error"])
+        self.assertTrue(self.registry.ready)
+
+    def test_warm_up_constructs_every_service_and_reports_failures(self):
+        self.registry.register("first", lambda: "first")
+        self.registry.register("broken", mock.Mock(side_effect=[RuntimeError("down"), "broken"]))
+        self.registry.register("last", lambda: "last")
+
+        self.registry.warm().join(5)
+
+        self.assertEqual({name: status["state"] for name, status in self.registry.status().items()},
+                         {"first": "ready", "broken": "failed", "last": "ready"})
+        self.assertEqual(self.registry.get("broken"), "broken")
+        self.assertTrue(self.registry.ready)
+
+    def test_importing_the_application_constructs_nothing(self):
+        script = (
+            "import django; django.setup(); import newapp.urls, json; from newapp.registry import services; "
+            "print(json.dumps({name: status['state'] for name, status in services.status().items()}))"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="igc.settings")
+        output = subprocess.run([sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, timeout=60, check=True).stdout
+
+        states = json.loads(output.splitlines()[-1])
+        self.assertIn("coinSearchHandler", states)
+        self.assertEqual(set(states.values()), {"pending"})
+
+
+class HealthTests(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = ServiceRegistry()
+        self.release = threading.Event()
+        self.registry.register("fast", lambda: "fast")
+        self.registry.register("slow", lambda: self.release.wait(5) and "slow")
+        self.addCleanup(self.release.set)
+
+        patcher = mock.patch("newapp.views.services", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def health(self):
+        from newapp.views import health
+
+        response = health(RequestFactory().get(reverse("health")))
+        return response.status_code, json.loads(response.content)
+
+    def test_health_is_503_until_every_service_is_ready(self):
+        status, body = self.health()
+        self.assertEqual(status, 503)
+        self.assertFalse(body["ready"])
+        self.assertEqual(body["services"]["slow"]["state"], "pending")
+
+        warming = self.registry.warm()
+        deadline = time.monotonic() + 5
+        while self.registry.status()["slow"]["state"] != "loading" and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        status, body = self.health()
+        self.assertEqual(status, 503)
+        self.assertEqual(body["services"]["fast"]["state"], "ready")
+        self.assertEqual(body["services"]["slow"]["state"], "loading")
+
+        self.release.set()
+        warming.join(5)
+
+        status, body = self.health()
+        self.assertEqual(status, 200)
+        self.assertTrue(body["ready"])
+
+    def test_health_is_503_while_a_service_failed(self):
+        self.registry.register("broken", mock.Mock(side_effect=[RuntimeError("down"), "broken"]))
+        self.release.set()
+        self.registry.warm().join(5)
+
+        status, body = self.health()
+        self.assertEqual(status, 503)
+        self.assertEqual(body["services"]["broken"], {"state": "failed", "error": "RuntimeError: down", "seconds": mock.ANY})
+
+        self.registry.get("broken")
+        self.assertEqual(self.health()[0], 200)
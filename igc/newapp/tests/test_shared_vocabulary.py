@@ -0,0 +1,73 @@
+import os
+import tempfile
+from unittest import mock
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from services.CustomDataFrame import Dataframes
+from services.SharedVocabulary import SharedVocabulary, write
+
+
+NAMES = ["Athena", "Athene", "Héraklès", "Herakles", None, "Zeus", "Pallas Athena", "Nike", "Ödipus", ""]
+
+
+def table(name, columns):
+    data = {"id": list(range(len(NAMES))), "weight": [float(index) / 2 for index in range(len(NAMES))]}
+    for offset, column in enumerate(columns):
+        data[column] = NAMES[offset:] + NAMES[:offset]
+    data["link"] = [f"http://example.org/{name}/{index}" for index in range(len(NAMES))]
+    return pd.DataFrame(data)
+
+
+class SharedVocabularyParityTests(SimpleTestCase):
+    """
+    The memory-mapped vocabulary answers lookups exactly like the in-memory tables it was written from.
+    """
+
+    queries = ["a", "at", "athen", "ATHENA", "herakles", "héra", "ödi", "odi", "s a", "", "zz", "pallas athena"]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with mock.patch.object(Dataframes, "_fetch", side_effect=lambda name: table(name, Dataframes.column_mapping[name])):
+            cls.memory = Dataframes()
+        cls.mint_map = {"http://nomisma.org/id/athens": "Athens", "http://nomisma.org/id/corinth": "Korinth"}
+
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "vocabulary.bin")
+        write(cls.path, cls.memory, cls.mint_map)
+        cls.shared = SharedVocabulary(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_records_are_identical(self):
+        for name in Dataframes.tablenames:
+            memory, shared = self.memory.get(name), self.shared.get(name)
+            with self.subTest(table=name):
+                self.assertEqual(len(shared), len(memory))
+                self.assertEqual(list(shared.records), memory.records)
+
+    def test_search_and_multi_search_are_identical(self):
+        for name in Dataframes.tablenames:
+            memory, shared = self.memory.get(name), self.shared.get(name)
+            columns = Dataframes.column_mapping[name]
+            for query in self.queries:
+                with self.subTest(table=name, query=query):
+                    self.assertEqual(shared.search(columns[0], query), memory.search(columns[0], query))
+                    self.assertEqual(shared.search("link", query), memory.search("link", query))
+                    self.assertEqual(shared.multi_search(columns, query), memory.multi_search(columns, query))
+                    self.assertEqual(
+                        shared.multi_search(columns, query, limit=2, offset=1),
+                        memory.multi_search(columns, query, limit=2, offset=1)
+                    )
+
+    def test_mint_map_is_identical(self):
+        mint_map = self.shared.get_mint_map()
+
+        self.assertEqual(dict(mint_map), self.mint_map)
+        self.assertNotIn("http://nomisma.org/id/rome", mint_map)
+        self.assertIsNone(mint_map.get("http://nomisma.org/id/rome"))
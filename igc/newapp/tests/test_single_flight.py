@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from services.SingleFlight import SingleFlight
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.1)
+            return "result"
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats, {"calls": 5, "executions": 1, "coalesced": 4})
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError):
+            flight.do("key", fail)
+
+        self.assertEqual(flight.do("key", lambda: "again"), "again")
+        self.assertEqual(flight.stats["executions"], 2)
+
+    def test_async_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def run():
+            return await asyncio.gather(*(flight.ado("key", work) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def run():
+            leader = asyncio.ensure_future(flight.ado("key", work))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.ado("key", work))
+            await asyncio.sleep(0)
+
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        self.assertEqual(asyncio.run(run()), "result")
+        self.assertEqual(flight.stats["executions"], 1)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_async_errors_reach_every_caller(self):
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        async def run():
+            return await asyncio.gather(flight.ado("key", fail), flight.ado("key", fail), return_exceptions=True)
+
+        errors = asyncio.run(run())
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
@@ -0,0 +1,100 @@
+from io import BytesIO
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from services.SparqlTransport import EndpointUnavailable, SparqlTransport
+
+
+def fakeResponse(status_code=200, body=b""):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = BytesIO(body)
+    return response
+
+
+class StreamSlotTests(SimpleTestCase):
+    """
+    A streamed request keeps its concurrency slot until its response is closed.
+    """
+
+    query = "SELECT * WHERE { ?s ?p ?o }"
+
+    def setUp(self):
+        self.transport = SparqlTransport("http://127.0.0.1:9/sparql", max_concurrent=1, retries=0, queue_timeout=0)
+
+    def test_streamed_response_holds_the_slot_until_closed(self):
+        with mock.patch.object(self.transport.session, "post", return_value=fakeResponse()):
+            response = self.transport.post(self.query, stream=True)
+
+            self.assertEqual(self.transport.stats()["in_flight"], 1)
+            self.assertFalse(self.transport._slots.acquire(blocking=False))
+
+            response.close()
+            response.close()
+
+        self.assertEqual(self.transport.stats()["in_flight"], 0)
+        self.assertTrue(self.transport._slots.acquire(blocking=False))
+
+    def test_buffered_response_releases_the_slot_right_away(self):
+        with mock.patch.object(self.transport.session, "post", return_value=fakeResponse()):
+            self.transport.post(self.query)
+
+        self.assertTrue(self.transport._slots.acquire(blocking=False))
+
+    def test_rejected_stream_releases_the_slot(self):
+        with mock.patch.object(self.transport.session, "post", return_value=fakeResponse(400, b"bad query")):
+            with self.assertRaises(requests.HTTPError) as raised:
+                self.transport.post(self.query, stream=True)
+
+        self.assertEqual(raised.exception.response.content, b"bad query")
+        self.assertTrue(self.transport._slots.acquire(blocking=False))
+
+    def test_stream_sends_the_query_right_away(self):
+        with mock.patch.object(self.transport.session, "post", return_value=fakeResponse(400, b"bad query")) as post:
+            with self.assertRaises(requests.HTTPError):
+                self.transport.stream(self.query)
+
+        post.assert_called_once()
+
+    def test_closing_an_unread_stream_releases_the_slot(self):
+        body = b'<sparql xmlns="http://www.w3.org/2005/sparql-results#"><head><variable name="s"/></head><results/></sparql>'
+        with mock.patch.object(self.transport.session, "post", return_value=fakeResponse(200, body)):
+            rows = self.transport.stream(self.query)
+
+        self.assertFalse(self.transport._slots.acquire(blocking=False))
+        rows.close()
+        self.assertTrue(self.transport._slots.acquire(blocking=False))
+
+
+class DeadlineTests(SimpleTestCase):
+    """
+    A per-request timeout bounds the timeouts of the request and the retries that are started.
+    """
+
+    query = "SELECT * WHERE { ?s ?p ?o }"
+
+    def setUp(self):
+        self.transport = SparqlTransport("http://127.0.0.1:9/sparql", connect_timeout=5, read_timeout=60, retries=3, backoff=10)
+
+    def test_request_timeouts_are_shortened(self):
+        with mock.patch.object(self.transport.session, "post", return_value=fakeResponse()) as post:
+            self.transport.post(self.query, timeout=2)
+
+        connect, read = post.call_args.kwargs["timeout"]
+        self.assertLessEqual(connect, 2)
+        self.assertLessEqual(read, 2)
+
+    def test_no_retry_is_started_past_the_deadline(self):
+        with mock.patch.object(self.transport.session, "post", side_effect=requests.ConnectionError("refused")) as post:
+            with self.assertRaises(EndpointUnavailable):
+                self.transport.post(self.query, timeout=2)
+
+        post.assert_called_once()
+
+    def test_read_timeout_can_be_raised_for_bulk_queries(self):
+        with mock.patch.object(self.transport.session, "post", return_value=fakeResponse()) as post:
+            self.transport.post(self.query, read_timeout=600)
+
+        self.assertEqual(post.call_args.kwargs["timeout"], (5, 600))
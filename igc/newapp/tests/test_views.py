@@ -0,0 +1,27 @@
+from django.test import RequestFactory, SimpleTestCase
+
+from newapp.views import InvalidParameter, intParameter
+
+
+class IntParameterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def parameter(self, value, **limits):
+        request = self.factory.post("/callback", {"limit": value} if value is not None else {})
+        return intParameter(request, "limit", 50, **limits)
+
+    def test_missing_or_empty_values_use_the_default(self):
+        self.assertEqual(self.parameter(None), 50)
+        self.assertEqual(self.parameter(""), 50)
+
+    def test_values_are_clamped(self):
+        self.assertEqual(self.parameter("-5", minimum=1, maximum=500), 1)
+        self.assertEqual(self.parameter("100000", minimum=1, maximum=500), 500)
+        self.assertEqual(self.parameter("20", minimum=1, maximum=500), 20)
+
+    def test_invalid_values_are_rejected(self):
+        for value in ("abc", "1.5", "1e3"):
+            with self.assertRaises(InvalidParameter):
+                self.parameter(value)
@@ -9,4 +9,6 @@ def format_path(prefix, route):
 urlpatterns = [
     path(format_path(subroute, ""), newapp.views.index, name='index'),
     path(format_path(subroute, "callback"), newapp.views.callback, name='callback'),
+    path(format_path(subroute, "callback/async"), newapp.views.async_callback, name='async_callback'),
+    path(format_path(subroute, "health"), newapp.views.health, name='health'),
 ]
\ No newline at end of file
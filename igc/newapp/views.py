@@ -1,26 +1,38 @@
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.template import loader
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 
-from services.CoinSearchHandler import CoinSearchHandler
-from services.CustomDataFrame import Dataframes
-from services.Helper import Helper
+from asgiref.sync import sync_to_async
+
+from services.CircuitBreaker import CircuitOpenError
+from services.SearchResults import search_columnar, search_records
+from services.SparqlTransport import EndpointUnavailable
+from services.FastJson import dumps
+from newapp.compression import compressed
+from newapp.registry import services
 
 import json
 import csv
+import requests
+from itertools import islice
 
 import pandas as pd
 
-database = Dataframes()
-coinSearchHandler = CoinSearchHandler()
-helper = Helper("newapp/ressources/mintMap.csv")
+try:
+	import httpx
+except ImportError:
+	httpx = None
 
-#mintMap_df = pd.read_csv("newapp/ressources/mintMap.csv")
-#mintMap_df = mintMap_df.set_index('mint')
-#mintMap = mintMap_df['mintLabel'].to_dict()
+RECOMMENDATION_LIMIT = 50
+RECOMMENDATION_MAX_LIMIT = 500
+SEARCH_PAGE_SIZE = 100
+SEARCH_MAX_PAGE_SIZE = 1000
+SEARCH_BRANCH_TIMEOUT = 30
 
-mintMap = helper.get_mint_map()
+# the errors of a query the endpoint rejected with a 4xx response, from the sync and the async transport
+REJECTED_QUERY_ERRORS = (requests.HTTPError,) + ((httpx.HTTPStatusError,) if httpx is not None else ())
 
 
 def index(request):
@@ -40,41 +52,30 @@ def index(request):
 	return HttpResponse(template.render())
 
 
-def getRecommendations(q, scope):
+def getRecommendations(q, scope, limit=None, offset=0):
 	"""
 	Fetches recommendations based on a query and scope from the dataframes.
 
 	Parameters:
 		q (str): The search query.
 		scope (dict): A dictionary indicating which tables to search in.
+		limit (int): The maximum number of ranked results per table, or None for all of them.
+		offset (int): The number of top-ranked results to skip per table.
 
 	Returns:
-		dict: A dictionary containing search results from different dataframes.
+		dict: A dictionary containing the ranked search results from different dataframes.
 	
 	Author: Danilo Pantic
 	"""
 	out = {}
-
-	column_mapping = {
-		'list_animal': ['name_en', 'name_ger', 'alternativenames_en', 'alternativenames_ger'],
-		'list_obj': ['name_en', 'name_ger', 'alternativenames_en', 'alternativenames_ger'],
-		'list_person': ['name', 'name_german', 'alternativenames'],
-		'list_plant': ['name_en', 'name_ger', 'alternativenames_en', 'alternativenames_ger'],
-		'list_verb': ['name_en', 'name_ger', 'alternativenames_en', 'alternativenames_ger'],
-		'hierarchy': ['class']
-	}
+	database = services.get("database")
 
 	for table in scope.keys():
 		if scope[table]:
 			df = database.get(table)
 			if df is not None:
-				search_columns = column_mapping.get(table, [])
-				search_results = []
-				for column in search_columns:
-					results = df.search(column, q)
-					for result in results:
-						search_results.append(result)
-				out[table] = search_results
+				search_columns = database.column_mapping.get(table, [])
+				out[table] = df.multi_search(search_columns, q, limit, offset)
 
 				print(table, out.keys())
 			else:
@@ -82,6 +83,41 @@ def getRecommendations(q, scope):
 	return out
 
 
+class InvalidParameter(Exception):
+	"""
+	Raised when a request parameter is not a valid integer; the callbacks answer it with status 400.
+	"""
+
+
+def intParameter(request, name, default, minimum=0, maximum=None):
+	"""
+	Reads an integer parameter of a POST request and clamps it to the allowed range.
+
+	Parameters:
+		request: The HTTP request object.
+		name (str): The name of the parameter.
+		default (int): The value used if the parameter is missing or empty.
+		minimum (int): The smallest allowed value.
+		maximum (int): The largest allowed value, or None for no limit.
+
+	Returns:
+		int: The clamped value.
+
+	Raises:
+		InvalidParameter: If the parameter is not an integer.
+	"""
+	value = request.POST.get(name, "")
+	if value == "":
+		return default
+
+	try:
+		value = max(int(value), minimum)
+	except ValueError:
+		raise InvalidParameter(f"The parameter {name} must be an integer, not {value[:20]!r}") from None
+
+	return min(value, maximum) if maximum is not None else value
+
+
 def MultiValueDict2Dict(key, mvd):
 	"""
 	Converts a MultiValueDict to a regular dictionary filtering by a specific key.
@@ -124,9 +160,135 @@ def convertId(id_str):
 		return id_str
 
 
+def mintLabels(mints):
+	"""
+	Returns the labels of the mints of a result page. Mints missing from the mint map are resolved together
+	in one batched query.
+
+	Parameters:
+		mints (iterable): The mint IDs of the rows of the page; unbound mints are skipped.
+
+	Returns:
+		dict: A dictionary mapping the mint IDs of the page to their labels.
+	"""
+	return services.get("mintResolver").resolve(str(mint) for mint in mints if mint)
+
+
+def resultMintLabels(results, searchType):
+	"""
+	Returns the labels of the mints of a search result. Only coin searches show the location of a row,
+	so the mints of other searches are not resolved at all.
+
+	Parameters:
+		results (QueryResult): The results of the search query.
+		searchType (str): The type of search that was performed.
+
+	Returns:
+		dict: A dictionary mapping the mint IDs of the result to their labels.
+	"""
+	if searchType != "NumismaticObject":
+		return {}
+	return mintLabels(binding.get("mint") for binding in results.bindings)
+
+
+def searchResultsToJson(results, searchType):
+	"""
+	Converts the rows of a coin search into the dictionaries sent to the frontend.
+
+	Parameters:
+		results (QueryResult): The results of the search query.
+		searchType (str): The type of search that was performed.
+
+	Returns:
+		list: A list of dictionaries, one per result row.
+	"""
+	return search_records(results, searchType, resultMintLabels(results, searchType))
+
+
+def searchResultsToColumns(results, searchType):
+	"""
+	Converts the rows of a coin search into the columnar, dictionary-encoded format requested with `format=columnar`.
+
+	Parameters:
+		results (QueryResult): The results of the search query.
+		searchType (str): The type of search that was performed.
+
+	Returns:
+		dict: The field names, the number of rows and one (possibly encoded) array per field.
+	"""
+	return search_columnar(results, searchType, resultMintLabels(results, searchType))
+
+
+def jsonResponse(data, status=200):
+	"""
+	Creates a JSON response, serialized with orjson when it is installed.
+
+	Parameters:
+		data: The object to serialize.
+		status (int): The HTTP status code.
+
+	Returns:
+		HttpResponse: The JSON response.
+	"""
+	return HttpResponse(dumps(data), content_type="application/json", status=status)
+
+
+class Echo:
+	"""
+	A file-like object whose write method returns the written value instead of buffering it,
+	so csv.writer can be used to produce the chunks of a streaming response.
+	"""
+	def write(self, value):
+		return value
+
+
+def searchResultsToCsv(rows, searchType):
+	"""
+	Formats the rows of a coin search as CSV lines, one at a time.
+
+	Parameters:
+		rows (iterable): The rows of the search query.
+		searchType (str): The type of search that was performed.
+
+	Yields:
+		str: The header line followed by one line per row.
+	"""
+	writer = csv.writer(Echo())
+	rows = iter(rows)
+	batchSize = services.get("mintResolver").batch_size
+
+	yield writer.writerow([
+		"Type", "URL", "Thumbnail Obverse", "Thumbnail Reverse", "ID", 
+		"Weight", "Obverse Description", "Reverse Description", 
+		"Date", "Max Diameter", "Location", "Region"
+	])
+
+	# mints are resolved once per batch of rows, so unknown mints cost one query per batch instead of one per row
+	while batch := list(islice(rows, batchSize)):
+		mintMap = mintLabels(row.mint for row in batch)
+
+		for row in batch:
+			yield writer.writerow([
+				searchType,
+				str(row.url) if row.url else "",
+				str(row.thumbnailObverse) if row.thumbnailObverse else "static/no_image.jpg",
+				str(row.thumbnailReverse) if row.thumbnailReverse else "static/no_image.jpg",
+				convertId(str(row.id)),
+				f"{row.weight} g" if row.weight else "",
+				str(row.descriptionObverse) if row.descriptionObverse else "",
+				str(row.descriptionReverse) if row.descriptionReverse else "",
+				str(row.date) if row.date else "",
+				f"{row.maxDiameter} mm" if row.maxDiameter else "",
+				mintMap.get(str(row.mint), "") if row.mint else "",
+				""
+			])
+
+
 def download_search_results(request):
 	"""
 	Handles the downloading of search results in various formats.
+	CSV exports are streamed: rows are written while the SPARQL result is still being received.
+	Streaming needs a WSGI server; `async_callback` buffers the export instead, see `download_buffered`.
 
 	Parameters:
 		request: The HTTP request object.
@@ -140,35 +302,20 @@ def download_search_results(request):
 		fileType = request.POST["fileType"]
 		searchType = request.POST["searchType"]
 		query = request.POST["q"]
-
-		results = coinSearchHandler.executeQuery(query)
 		
 		if fileType == "csv":
-			response = HttpResponse(content_type='text/csv')
-			response['Content-Disposition'] = f'attachment; filename="{searchType}_search_results.csv"'
+			coinSearchHandler = services.get("coinSearchHandler")
 
-			writer = csv.writer(response)
-			writer.writerow([
-				"Type", "URL", "Thumbnail Obverse", "Thumbnail Reverse", "ID", 
-				"Weight", "Obverse Description", "Reverse Description", 
-				"Date", "Max Diameter", "Location", "Region"
-			])
+			# the query is sent before the response starts, so a failing endpoint gets an error status instead of a truncated file
+			try:
+				rows = coinSearchHandler.withThumbnails(coinSearchHandler.streamQuery(query), searchType)
+			except (EndpointUnavailable, CircuitOpenError) as error:
+				return JsonResponse({"success": False, "error": str(error)}, status=503)
+			except REJECTED_QUERY_ERRORS as error:
+				return JsonResponse({"success": False, "error": str(error)}, status=400)
 
-			for row in results:
-				writer.writerow([
-					searchType,
-					str(row.url) if row.url else "",
-					str(row.thumbnailObverse) if row.thumbnailObverse else "static/no_image.jpg",
-					str(row.thumbnailReverse) if row.thumbnailReverse else "static/no_image.jpg",
-					convertId(str(row.id)),
-					f"{row.weight} g" if row.weight else "",
-					str(row.descriptionObverse) if row.descriptionObverse else "",
-					str(row.descriptionReverse) if row.descriptionReverse else "",
-					str(row.date) if row.date else "",
-					f"{row.maxDiameter} mm" if row.maxDiameter else "",
-					mintMap.get(str(row.mint), "") if row.mint else "",
-					""
-				])
+			response = StreamingHttpResponse(searchResultsToCsv(rows, searchType), content_type='text/csv')
+			response['Content-Disposition'] = f'attachment; filename="{searchType}_search_results.csv"'
 
 			return response
 		else:
@@ -177,10 +324,65 @@ def download_search_results(request):
 		return HttpResponse(status=405)
 
 
+def loadedDatasets():
+	"""
+	Describes the datasets of the services that are loaded, without loading the others.
+
+	Returns:
+		dict: The number of rows of every vocabulary table, the size of the mint map and the state of the
+			lookup tables and of the local store. Datasets of services that are not loaded yet are None.
+	"""
+	database = services.peek("database")
+	mintMaps = services.peek("database" if settings.VOCABULARY_MODE == "shared" else "helper")
+	coinSearchHandler = services.peek("coinSearchHandler")
+	mintResolver = services.peek("mintResolver")
+
+	datasets = {
+		"vocabulary": {table: len(df) for table, df in database.dataframes.items()} if database is not None else None,
+		"mintMap": len(mintMaps.get_mint_map()) if mintMaps is not None else None,
+		"mintResolver": mintResolver.snapshot() if mintResolver is not None else None,
+		"iconographyIndex": None,
+		"thumbnailTable": None,
+		"localStore": None,
+		"eventLog": services.peek("eventLog").snapshot() if services.peek("eventLog") is not None else None
+	}
+
+	if coinSearchHandler is not None:
+		for key, table in (("iconographyIndex", coinSearchHandler.iconography), ("thumbnailTable", coinSearchHandler.thumbnails)):
+			if table is not None:
+				datasets[key] = {"ready": table.ready, "built_at": table.built_at, "stale": table.is_stale()}
+		if settings.SPARQL_BACKEND == "local":
+			datasets["localStore"] = coinSearchHandler.transport.stats()
+
+	return datasets
+
+
+def health(request):
+	"""
+	Reports whether the services of the application are loaded, for load balancers and deployment checks.
+	The response has status 200 once every service is ready and 503 before. With `?verbose=1`, the metrics
+	of the search backend are included.
+
+	Parameters:
+		request: The HTTP request object.
+
+	Returns:
+		HttpResponse: The state of every service.
+	"""
+	response = {"ready": services.ready, "services": services.status(), "datasets": loadedDatasets()}
+
+	if request.GET.get("verbose"):
+		coinSearchHandler = services.peek("coinSearchHandler")
+		response["search"] = coinSearchHandler.stats() if coinSearchHandler is not None else None
+
+	return jsonResponse(response, status=200 if response["ready"] else 503)
+
+
 @csrf_exempt
 def log(request):
 	"""
 	Endpoint for logging events from the front end.
+	The event is only queued; the event log sink appends the queued events to the log file in batches.
 
 	Parameters:
 		request: The HTTP request object.
@@ -199,9 +401,8 @@ def log(request):
 			log_data = data.get('data')
 			timestamp = data.get('timestamp')
 
-			with open("newapp/logs/log.csv", "a+", newline='') as f:
-				writer = csv.writer(f)
-				writer.writerow([uuid, design, event, log_data, timestamp])
+			if not services.get("eventLog").write([uuid, design, event, log_data, timestamp]):
+				return JsonResponse({"success": False, "message": "Log queue is full"})
 
 			return JsonResponse({"success": True, "message": "Log saved"})
 		except json.JSONDecodeError:
@@ -213,6 +414,7 @@ def log(request):
 
 
 @csrf_exempt
+@compressed
 def callback(request):
 	"""
 	The main callback endpoint for handling various actions from the frontend.
@@ -231,7 +433,12 @@ def callback(request):
 			a = request.POST["action"]
 			if a == "getRecommendations":
 				scope = MultiValueDict2Dict("scope", dict(request.POST))
-				json_result = getRecommendations(request.POST["q"], scope)
+				try:
+					limit = intParameter(request, "limit", RECOMMENDATION_LIMIT, 1, RECOMMENDATION_MAX_LIMIT)
+					offset = intParameter(request, "offset", 0)
+				except InvalidParameter as error:
+					return jsonResponse({"success": False, "error": str(error)}, status=400)
+				json_result = getRecommendations(request.POST["q"], scope, limit, offset)
 
 				response["result"] = json_result
 				response["success"] = True
@@ -242,39 +449,164 @@ def callback(request):
 
 				print(relationString)
 
-				response["result"] = coinSearchHandler.generateQuery(coins, relationString, searchType)
-				response["success"] = True
+				try:
+					response["result"] = services.get("coinSearchHandler").generateQuery(coins, relationString, searchType)
+					response["success"] = True
+				except ValueError as error:
+					response["error"] = str(error)
 			elif a == "searchCoin":
+				try:
+					coinSearchHandler = services.get("coinSearchHandler")
+					searchType = request.POST["searchType"]
+
+					if request.POST.get("plan") == "twoPhase":
+						page = intParameter(request, "page", 1, 1)
+						pageSize = intParameter(request, "pageSize", SEARCH_PAGE_SIZE, 1, SEARCH_MAX_PAGE_SIZE)
+						coins = json.loads(request.POST["coins"])
+						results, total = coinSearchHandler.searchTwoPhase(coins, request.POST["relationString"], searchType, page, pageSize)
+
+						response["page"] = page
+						response["pageSize"] = pageSize
+					elif request.POST.get("plan") == "fanOut":
+						coins = json.loads(request.POST["coins"])
+						results, branches = coinSearchHandler.searchFanOut(coins, request.POST["relationString"], searchType, SEARCH_BRANCH_TIMEOUT)
+						total = len(results)
+
+						response["branches"] = branches
+						response["partial"] = any(branch["error"] for branch in branches)
+					elif "pageSize" in request.POST:
+						page = intParameter(request, "page", 1, 1)
+						pageSize = intParameter(request, "pageSize", SEARCH_PAGE_SIZE, 1, SEARCH_MAX_PAGE_SIZE)
+						results, total = coinSearchHandler.executePage(request.POST["q"], page, pageSize)
+
+						response["page"] = page
+						response["pageSize"] = pageSize
+					else:
+						results = coinSearchHandler.executeQuery(request.POST["q"])
+						total = len(results)
+
+					toResult = searchResultsToColumns if request.POST.get("format") == "columnar" else searchResultsToJson
+
+					response["success"] = True
+					response["result"] = toResult(coinSearchHandler.withThumbnails(results, searchType), searchType)
+					response["length"] = total
+				except ValueError as error:
+					# an invalid relation string of the twoPhase and fanOut plans
+					response["error"] = str(error)
+				except (InvalidParameter, *REJECTED_QUERY_ERRORS) as error:
+					return jsonResponse({"success": False, "error": str(error)}, status=400)
+				except (EndpointUnavailable, CircuitOpenError) as error:
+					return jsonResponse({"success": False, "error": str(error)}, status=503)
+			elif a == "download":
+				return download_search_results(request)
+
+	return jsonResponse(response)
+
+
+def download_buffered(request):
+	"""
+	Handles a download like `download_search_results`, but writes the whole export into one response.
+	The ASGI handler of Django 4.1 iterates a streaming response on the event loop, where every row read
+	from the endpoint would block all other requests, so ASGI deployments build the export in a worker thread.
+
+	Parameters:
+		request: The HTTP request object.
+
+	Returns:
+		HttpResponse: A response object with the file download or an error message.
+	"""
+	response = download_search_results(request)
+	if not response.streaming:
+		return response
+
+	try:
+		buffered = HttpResponse(b"".join(response.streaming_content), content_type=response["Content-Type"])
+	finally:
+		response.close()
+	buffered["Content-Disposition"] = response["Content-Disposition"]
+
+	return buffered
+
+
+@compressed
+async def async_callback(request):
+	"""
+	An asynchronous variant of the callback endpoint for ASGI deployments.
+	`searchCoin` awaits the SPARQL endpoint without holding a worker thread, `getRecommendations` is
+	answered directly from memory and `download` is buffered in a worker thread, since streaming responses
+	are only served without blocking under WSGI. Every other action is delegated to the synchronous callback.
+
+	Parameters:
+		request: The HTTP request object.
+
+	Returns:
+		JsonResponse: A response object with the result of the action or an error message.
+	"""
+	response = {"success": False}
+	if request.method == "POST" and "action" in request.POST:
+		a = request.POST["action"]
+		if a == "getRecommendations":
+			scope = MultiValueDict2Dict("scope", dict(request.POST))
+			try:
+				limit = intParameter(request, "limit", RECOMMENDATION_LIMIT, 1, RECOMMENDATION_MAX_LIMIT)
+				offset = intParameter(request, "offset", 0)
+			except InvalidParameter as error:
+				return jsonResponse({"success": False, "error": str(error)}, status=400)
+
+			# the vocabulary may still be loading, which must not block the event loop
+			await sync_to_async(services.get, thread_sensitive=False)("database")
+			response["result"] = getRecommendations(request.POST["q"], scope, limit, offset)
+			response["success"] = True
+		elif a == "searchCoin":
+			try:
+				coinSearchHandler = await sync_to_async(services.get, thread_sensitive=False)("coinSearchHandler")
 				searchType = request.POST["searchType"]
-				results = coinSearchHandler.executeQuery(request.POST["q"])
-
-				result = []
-				
-				for row in results:
-					category = row.type if searchType == "NumismaticObject" else "TYPE" if searchType == "TypeSeriesItem" else None
-
-					result_item = {
-						"type": searchType,
-						"url": str(row.url) if row.url else None,
-						"thumbnailObverse": str(row.thumbnailObverse) if row.thumbnailObverse else "static/no_image.jpg",
-						"thumbnailReverse": str(row.thumbnailReverse) if row.thumbnailReverse else "static/no_image.jpg",
-						"descriptionObverse": str(row.descriptionObverse) if row.descriptionObverse else None,
-						"descriptionReverse": str(row.descriptionReverse) if row.descriptionReverse else None,
-						"date": str(row.date) if row.date else None,
-						"maxDiameter": float(row.maxDiameter) if row.maxDiameter else None,
-						"id": convertId(row.id),
-						"category": category,
-						"weight": float(row.weight) if row.weight else None,
-						"location": mintMap.get(str(row.mint), None) if searchType == "NumismaticObject" else "TYPE",
-						"region": None if searchType == "NumismaticObject" else convertId(row.id)
-					}
-
-					result.append(result_item)
+
+				if request.POST.get("plan") == "twoPhase":
+					page = intParameter(request, "page", 1, 1)
+					pageSize = intParameter(request, "pageSize", SEARCH_PAGE_SIZE, 1, SEARCH_MAX_PAGE_SIZE)
+					coins = json.loads(request.POST["coins"])
+					results, total = await sync_to_async(coinSearchHandler.searchTwoPhase, thread_sensitive=False)(coins, request.POST["relationString"], searchType, page, pageSize)
+
+					response["page"] = page
+					response["pageSize"] = pageSize
+				elif request.POST.get("plan") == "fanOut":
+					coins = json.loads(request.POST["coins"])
+					results, branches = await coinSearchHandler.asearchFanOut(coins, request.POST["relationString"], searchType, SEARCH_BRANCH_TIMEOUT)
+					total = len(results)
+
+					response["branches"] = branches
+					response["partial"] = any(branch["error"] for branch in branches)
+				elif "pageSize" in request.POST:
+					page = intParameter(request, "page", 1, 1)
+					pageSize = intParameter(request, "pageSize", SEARCH_PAGE_SIZE, 1, SEARCH_MAX_PAGE_SIZE)
+					results, total = await coinSearchHandler.aexecutePage(request.POST["q"], page, pageSize)
+
+					response["page"] = page
+					response["pageSize"] = pageSize
+				else:
+					results = await coinSearchHandler.aexecuteQuery(request.POST["q"])
+					total = len(results)
+
+				toResult = searchResultsToColumns if request.POST.get("format") == "columnar" else searchResultsToJson
 
 				response["success"] = True
-				response["result"] = result
-				response["length"] = len(results)
-			elif a == "download":
-				return download_search_results(request)
+				# resolving unknown mints may query the endpoint, which must not block the event loop
+				response["result"] = await sync_to_async(toResult, thread_sensitive=False)(coinSearchHandler.withThumbnails(results, searchType), searchType)
+				response["length"] = total
+			except ValueError as error:
+				# an invalid relation string of the twoPhase and fanOut plans
+				response["error"] = str(error)
+			except (InvalidParameter, *REJECTED_QUERY_ERRORS) as error:
+				return jsonResponse({"success": False, "error": str(error)}, status=400)
+			except (EndpointUnavailable, CircuitOpenError) as error:
+				return jsonResponse({"success": False, "error": str(error)}, status=503)
+		elif a == "download":
+			return await sync_to_async(download_buffered, thread_sensitive=False)(request)
+		else:
+			return await sync_to_async(callback)(request)
+
+	return jsonResponse(response)
 
-	return JsonResponse(response, safe=False)
\ No newline at end of file
+# csrf_exempt only wraps coroutine views correctly from Django 5.0 on
+async_callback.csrf_exempt = True
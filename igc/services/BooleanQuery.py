@@ -0,0 +1,219 @@
+import hashlib
+import json
+import re
+
+
+_TOKEN_PATTERN = re.compile(r"\s*(?:(C\d+)|(AND|OR|NOT)\b|(\()|(\)))")
+
+
+def tokenize(text):
+    """
+    Splits a relation string such as "C1 AND NOT (C2 OR C3)" into tokens.
+
+    Parameters:
+        text (str): The relation string.
+
+    Returns:
+        list: The tokens, each one a placeholder ("C1"), an operator ("AND", "OR", "NOT") or a bracket.
+    """
+    tokens = []
+    position = 0
+    text = text.rstrip()
+
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if not match:
+            raise ValueError(f"Unexpected input at position {position}: {text[position:position + 10]!r}")
+        tokens.append(next(group for group in match.groups() if group))
+        position = match.end()
+
+    return tokens
+
+
+def parse(text):
+    """
+    Parses a relation string into an abstract syntax tree.
+
+    Nodes are tuples: ("coin", placeholder), ("not", node), ("and", [nodes]) and ("or", [nodes]).
+    NOT binds strongest, then AND, then OR.
+
+    Parameters:
+        text (str): The relation string.
+
+    Returns:
+        tuple: The root node, or None for an empty relation string.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take(expected=None):
+        nonlocal position
+        token = peek()
+        if token is None or (expected is not None and token != expected):
+            raise ValueError(f"Expected {expected or 'an operand'} but found {token or 'the end of the expression'}")
+        position += 1
+        return token
+
+    def parse_or():
+        children = [parse_and()]
+        while peek() == "OR":
+            take("OR")
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def parse_and():
+        children = [parse_not()]
+        while peek() == "AND":
+            take("AND")
+            children.append(parse_not())
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def parse_not():
+        if peek() == "NOT":
+            take("NOT")
+            return ("not", parse_not())
+        if peek() == "(":
+            take("(")
+            node = parse_or()
+            take(")")
+            return node
+        token = take()
+        if not token.startswith("C"):
+            raise ValueError(f"Expected a coin placeholder but found {token}")
+        return ("coin", token)
+
+    root = parse_or()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {tokens[position]} after the end of the expression")
+
+    return root
+
+
+def to_nnf(node, negated=False):
+    """
+    Converts a tree into negation normal form in a single pass: negations are pushed down to the
+    coins with De Morgan's laws, double negations cancel out and nested operators of the same kind
+    are flattened.
+
+    Parameters:
+        node (tuple): The root of the tree.
+        negated (bool): Whether the node appears under an odd number of negations.
+
+    Returns:
+        tuple: The equivalent tree in which ("not", ...) only wraps coins.
+    """
+    kind = node[0]
+
+    if kind == "coin":
+        return ("not", node) if negated else node
+    if kind == "not":
+        return to_nnf(node[1], not negated)
+
+    if negated:
+        kind = "or" if kind == "and" else "and"
+
+    children = []
+    for child in node[1]:
+        child = to_nnf(child, negated)
+        if child[0] == kind:
+            children.extend(child[1])
+        else:
+            children.append(child)
+
+    return (kind, children)
+
+
+def coin_key(coin):
+    """
+    Computes a content key for a coin description, so identical coins are recognized
+    regardless of their placeholder.
+
+    Parameters:
+        coin (dict): The coin description.
+
+    Returns:
+        str: A short hex digest of the coin's canonical JSON form.
+    """
+    return hashlib.sha1(json.dumps(coin, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def canonicalize(node, coins):
+    """
+    Rewrites an NNF tree into its canonical form: placeholders are replaced by the content keys of
+    their coins, identical operands are removed and the operands of AND/OR are sorted.
+    Equivalent expressions over identical coins therefore produce the same tree.
+
+    Parameters:
+        node (tuple): The root of an NNF tree.
+        coins (dict): Maps each placeholder ("C1") to its coin description.
+
+    Returns:
+        tuple: The canonical tree, with ("coin", key) leaves.
+    """
+    kind = node[0]
+
+    if kind == "coin":
+        if node[1] not in coins:
+            raise ValueError(f"Unknown coin placeholder {node[1]}")
+        return ("coin", coin_key(coins[node[1]]))
+    if kind == "not":
+        return ("not", canonicalize(node[1], coins))
+
+    children = {}
+    for child in node[1]:
+        child = canonicalize(child, coins)
+        children.setdefault(to_string(child), child)
+
+    if len(children) == 1:
+        return next(iter(children.values()))
+
+    return (kind, [children[key] for key in sorted(children)])
+
+
+def to_string(node):
+    """
+    Serializes a tree into a compact string, e.g. "or(and(a1b2,not(c3d4)),e5f6)".
+
+    Parameters:
+        node (tuple): The root of the tree.
+
+    Returns:
+        str: The string form of the tree.
+    """
+    kind = node[0]
+
+    if kind == "coin":
+        return node[1]
+    if kind == "not":
+        return f"not({to_string(node[1])})"
+
+    return f"{kind}({','.join(to_string(child) for child in node[1])})"
+
+
+def compile_expression(text, coins):
+    """
+    Parses a relation string and returns its canonical NNF tree together with the coins it uses.
+
+    Parameters:
+        text (str): The relation string.
+        coins (list): The coin descriptions; the first one is referenced as C1.
+
+    Returns:
+        tuple: The canonical tree (None for an empty expression) and a dict mapping content keys to coins.
+    """
+    placeholders = {f"C{i+1}": coin for i, coin in enumerate(coins)}
+    root = parse(text)
+
+    if root is None:
+        return None, {}
+
+    tree = canonicalize(to_nnf(root), placeholders)
+    by_key = {coin_key(coin): coin for coin in coins}
+
+    return tree, by_key
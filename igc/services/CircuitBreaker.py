@@ -0,0 +1,97 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency while its circuit breaker is open.
+    """
+
+
+class CircuitBreaker():
+    """
+    A circuit breaker for a remote dependency.
+
+    The breaker is closed while the dependency works. After `failure_threshold` consecutive failures it opens
+    and rejects every call for `reset_timeout` seconds. Then it becomes half-open and lets a single trial call
+    through: a success closes it again, a failure opens it for another `reset_timeout` seconds.
+
+    Attributes:
+        failure_threshold (int): The number of consecutive failures that open the breaker.
+        reset_timeout (float): The number of seconds the breaker stays open before a trial call is allowed.
+        state (str): "closed", "open" or "half-open".
+        stats (dict): The number of failures, of rejected calls and of times the breaker opened.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """
+        Initializes a closed breaker.
+
+        Parameters:
+            failure_threshold (int): The number of consecutive failures that open the breaker.
+            reset_timeout (float): The number of seconds the breaker stays open before a trial call is allowed.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.stats = {"failures": 0, "rejected": 0, "opened": 0}
+
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Checks whether a call may go through, switching an expired open breaker to half-open.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with its trial call still running.
+        """
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                self._trial = False
+
+            if self.state == "closed":
+                return
+            if self.state == "half-open" and not self._trial:
+                self._trial = True
+                return
+
+            self.stats["rejected"] += 1
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+        raise CircuitOpenError(f"The endpoint is unavailable, retrying in {retry_in:.0f} seconds")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial = False
+            self.state = "closed"
+
+    def release(self):
+        """
+        Gives up a half-open trial call whose outcome is unknown, e.g. because it was cancelled,
+        so that the next call can try again.
+        """
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self.stats["failures"] += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def snapshot(self):
+        """
+        Returns the state of the breaker together with its counters.
+        """
+        with self._lock:
+            return dict(self.stats, state=self.state, consecutive_failures=self._failures)
@@ -1,6 +1,14 @@
-from rdflib import Graph
-from rdflib.plugins.stores import sparqlstore
+import asyncio
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from services.BooleanQuery import compile_expression
+from services.CircuitBreaker import CircuitOpenError
+from services.QueryCache import QueryResult
+from services.SingleFlight import SingleFlight
+from services.SparqlTransport import EndpointUnavailable, SparqlTransport
+from services.SparqlUtils import query_key, split_prologue
 
 class CoinSearchHandler():
     """
@@ -9,20 +17,34 @@ class CoinSearchHandler():
 
     Attributes:
         endpoint (str): SPARQL endpoint URL.
-        store (SPARQLStore): The SPARQL store connected to the endpoint.
-        g (Graph): RDFLib Graph connected to the SPARQL store.
+        transport (SparqlTransport or LocalStore): The backend that executes the queries, by default
+            the pooled HTTP transport connected to the endpoint.
+        cache (QueryCache): The result cache consulted before querying the endpoint, or None.
+        iconography (IconographyIndex): The index used to resolve keyword constraints locally, or None.
+        thumbnails (ThumbnailTable): The materialized thumbnails of the type series items, or None.
         _query_head (str): Common prefixes and initial part of the SPARQL query.
     """
 
-    def __init__(self):
+    def __init__(self, cache=None, transport_options=None, backend=None, iconography=None, thumbnails=None):
         """
         Initializes the CoinSearchHandler with a specific SPARQL endpoint.
 
+        Parameters:
+            cache (QueryCache): The result cache consulted before querying the endpoint, or None.
+            transport_options (dict): Keyword arguments for the SparqlTransport (pool size, timeouts, retries).
+            backend (LocalStore): A local store to execute the queries with instead of the remote endpoint, or None.
+            iconography (IconographyIndex): The index used to resolve keyword constraints locally, or None.
+            thumbnails (ThumbnailTable): The materialized thumbnails of the type series items, or None.
+
         Author: Danilo Pantic
         """
+        self.cache = cache
+        self.iconography = iconography
+        self.thumbnails = thumbnails
         self.endpoint = "https://data.corpus-nummorum.eu/sparql"
-        self.store = sparqlstore.SPARQLStore(self.endpoint)
-        self.g = Graph(self.store)
+        self.transport = backend if backend is not None else SparqlTransport(self.endpoint, **(transport_options or {}))
+        self._inflight = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=self.transport.max_concurrent, thread_name_prefix="sparql")
         self._query_head = """
         PREFIX nmo: <http://nomisma.org/ontology#>
         PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
@@ -30,21 +52,263 @@ class CoinSearchHandler():
         PREFIX dcterms: <http://purl.org/dc/terms/>
         """
 
-    def executeQuery(self, query):
+    def executeQuery(self, query, timeout=None):
         """
         Executes a SPARQL query against the configured endpoint and returns the results.
+        Results are served from the cache when an equivalent query ran recently, and concurrent
+        callers with an equivalent query share one execution instead of each sending their own.
+        While the endpoint is unavailable, an expired cached result is returned if there is one.
         
         Parameters:
             query (str): The SPARQL query to be executed.
+            timeout (float): The number of seconds the request to the endpoint may take, or None for no limit.
 
         Returns:
-            list: A list of results obtained from the query execution.
+            QueryResult: The results obtained from the query execution.
         
         Author: Danilo Pantic
         """
-        return self.g.query(query)
-    
-    def generateCoinQuery(self, id, coin, searchType, isNegated=False):
+        if self.cache is not None:
+            result = self.cache.get(query)
+            if result is not None:
+                return result
+
+        try:
+            return self._inflight.do(query_key(query), lambda: self._fetch(query, timeout))
+        except (EndpointUnavailable, CircuitOpenError) as error:
+            return self._stale(query, error)
+
+    def executeBulkQuery(self, query, read_timeout=None):
+        """
+        Executes a long-running query that reads a whole dataset, e.g. to build a lookup table, directly on the backend.
+        Its result is neither taken from nor stored in the cache, so it does not push out search results,
+        and it is never replaced by a stale result.
+
+        Parameters:
+            query (str): The SPARQL query to be executed.
+            read_timeout (float): The read timeout of the request in seconds, or None for the one of the transport.
+
+        Returns:
+            QueryResult: The results obtained from the query execution.
+        """
+        return self.transport.query(query, read_timeout=read_timeout)
+
+    def _stale(self, query, error):
+        """
+        Returns the stale cached result of a query that the endpoint could not answer, or re-raises the error.
+        """
+        result = self.cache.get(query, allow_stale=True) if self.cache is not None else None
+        if result is None:
+            raise error
+        return result
+
+    def _fetch(self, query, timeout=None):
+        """
+        Sends a query to the backend and caches its result.
+        """
+        result = self.transport.query(query, timeout)
+
+        if self.cache is not None:
+            self.cache.set(query, result)
+
+        return result
+
+    async def aexecuteQuery(self, query):
+        """
+        Executes a SPARQL query like `executeQuery`, but awaits the endpoint without blocking the event loop.
+        The cache is read and written in worker threads, since it locks and does disk I/O.
+
+        Parameters:
+            query (str): The SPARQL query to be executed.
+
+        Returns:
+            QueryResult: The results obtained from the query execution.
+        """
+        if self.cache is not None:
+            result = await asyncio.to_thread(self.cache.get, query)
+            if result is not None:
+                return result
+
+        try:
+            return await self._inflight.ado(query_key(query), lambda: self._afetch(query))
+        except (EndpointUnavailable, CircuitOpenError) as error:
+            return await asyncio.to_thread(self._stale, query, error)
+
+    async def _afetch(self, query):
+        """
+        Sends a query to the backend without blocking the event loop and caches its result.
+        """
+        result = await self.transport.aquery(query)
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, query, result)
+
+        return result
+
+    def stats(self):
+        """
+        Returns the metrics of the backend, the result cache and the coalescing of identical queries.
+
+        Returns:
+            dict: The metrics, grouped by component.
+        """
+        return {
+            "backend": self.transport.stats(),
+            "cache": dict(self.cache.stats) if self.cache is not None else None,
+            "coalescing": dict(self._inflight.stats, in_flight=self._inflight.in_flight())
+        }
+
+    def streamQuery(self, query):
+        """
+        Executes a SPARQL query and returns an iterator over its rows as they arrive from the endpoint.
+        A cached result is replayed instead; streamed results are not cached, so memory stays flat.
+        The query is sent before this method returns, so callers can report a failing endpoint before
+        they start writing the rows.
+
+        Parameters:
+            query (str): The SPARQL query to be executed.
+
+        Returns:
+            iterator: The rows (QueryRow) of the result.
+
+        Raises:
+            EndpointUnavailable, CircuitOpenError: If the endpoint could not answer and nothing is cached.
+            requests.HTTPError: If the endpoint rejected the query.
+        """
+        if self.cache is not None:
+            result = self.cache.get(query)
+            if result is not None:
+                return iter(result)
+
+        try:
+            return self.transport.stream(query)
+        except (EndpointUnavailable, CircuitOpenError) as error:
+            return iter(self._stale(query, error))
+
+    def withThumbnails(self, rows, searchType):
+        """
+        Fills in the thumbnails of type search rows from the materialized thumbnail table.
+        Rows that already carry thumbnails, e.g. from a query generated before the table was built, are kept as they are.
+        A QueryResult is returned as a QueryResult, so the result conversions keep working on its bindings.
+
+        Parameters:
+            rows (QueryResult or iterable): The rows of a search query.
+            searchType (str): The type of search that was performed.
+
+        Returns:
+            QueryResult or iterator: The rows, with thumbnails where the table has them.
+        """
+        if searchType != "TypeSeriesItem" or self.thumbnails is None or not self.thumbnails.ready:
+            return rows
+
+        if isinstance(rows, QueryResult):
+            vars = rows.vars + [var for var in ("thumbnailObverse", "thumbnailReverse") if var not in rows.vars]
+            return QueryResult(vars, [self._withThumbnail(binding) for binding in rows.bindings])
+
+        return (row.replace(**self._withThumbnail(row.asdict())) for row in rows)
+
+    def _withThumbnail(self, binding):
+        """
+        Adds the thumbnails of the table to the binding of a type search row that has none.
+        """
+        if binding.get("thumbnailObverse") or binding.get("thumbnailReverse"):
+            return binding
+
+        binding = dict(binding)
+        obverse, reverse = self.thumbnails.get(binding.get("url"))
+        if obverse:
+            binding["thumbnailObverse"] = obverse
+        if reverse:
+            binding["thumbnailReverse"] = reverse
+        return binding
+
+    def paginateQuery(self, query, limit, offset=0):
+        """
+        Wraps a SELECT query so that it returns one page of its results in a stable order.
+
+        Parameters:
+            query (str): The SPARQL SELECT query.
+            limit (int): The maximum number of rows to return.
+            offset (int): The number of rows to skip.
+
+        Returns:
+            str: The paginated SPARQL query.
+        """
+        prefixes, body = split_prologue(query)
+        prologue = "\n".join(f"PREFIX {prefix} <{iri}>" for prefix, iri in prefixes)
+
+        projection = re.match(r"SELECT\s+(?:DISTINCT\s+|REDUCED\s+)?((?:\?\w+\s*)+)(?:WHERE\b|\{)", body, re.IGNORECASE)
+        order = ["?url"]
+        if projection:
+            order += [var for var in projection.group(1).split() if var != "?url"]
+
+        return f"{prologue}\nSELECT * WHERE {{ {body} }} ORDER BY {' '.join(order)} LIMIT {int(limit)} OFFSET {int(offset)}"
+
+    def countQuery(self, query):
+        """
+        Wraps a SELECT query so that it only returns the number of its result rows.
+
+        Parameters:
+            query (str): The SPARQL SELECT query.
+
+        Returns:
+            str: The SPARQL count query, binding the total to ?count.
+        """
+        prefixes, body = split_prologue(query)
+        prologue = "\n".join(f"PREFIX {prefix} <{iri}>" for prefix, iri in prefixes)
+
+        return f"{prologue}\nSELECT (COUNT(*) AS ?count) WHERE {{ {body} }}"
+
+    def executePage(self, query, page, pageSize):
+        """
+        Executes one page of a SELECT query and, in parallel, a count query for the total number of rows.
+
+        Parameters:
+            query (str): The SPARQL SELECT query.
+            page (int): The 1-based number of the page.
+            pageSize (int): The number of rows per page.
+
+        Returns:
+            tuple: The QueryResult of the page and the total number of rows.
+        """
+        offset = (max(page, 1) - 1) * pageSize
+
+        count = self._executor.submit(self.executeQuery, self.countQuery(query))
+        results = self.executeQuery(self.paginateQuery(query, pageSize, offset))
+
+        return results, self._total(count.result())
+
+    async def aexecutePage(self, query, page, pageSize):
+        """
+        Executes one page of a SELECT query like `executePage`, awaiting both queries concurrently.
+
+        Parameters:
+            query (str): The SPARQL SELECT query.
+            page (int): The 1-based number of the page.
+            pageSize (int): The number of rows per page.
+
+        Returns:
+            tuple: The QueryResult of the page and the total number of rows.
+        """
+        offset = (max(page, 1) - 1) * pageSize
+
+        results, count = await asyncio.gather(
+            self.aexecuteQuery(self.paginateQuery(query, pageSize, offset)),
+            self.aexecuteQuery(self.countQuery(query))
+        )
+
+        return results, self._total(count)
+
+    @staticmethod
+    def _total(count):
+        """
+        Extracts the total from the result of a count query.
+        """
+        for row in count:
+            return int(row.count)
+        return 0
+
+    def generateCoinQuery(self, id, coin, searchType, isNegated=False, enrich=True, urls=None):
         """
         Generates a SPARQL query part for a specific coin based on its attributes.
         
@@ -53,6 +317,9 @@ class CoinSearchHandler():
             coin (dict): A dictionary containing attributes of the coin to construct the query part.
             searchType (str): The type of search to be performed.
             isNegated (bool): A flag indicating whether the query part should be negated.
+            enrich (bool): Whether to fetch the display fields (thumbnails, descriptions, weight, ...)
+                or only the constraints that decide which ?url match.
+            urls (list): Restricts ?url to these URIs with a VALUES block, or None for no restriction.
 
         Returns:
             str: A SPARQL query part specific to the provided coin attributes.
@@ -61,6 +328,10 @@ class CoinSearchHandler():
         """
         obverse_part = ""
         reverse_part = ""
+        values_part = ""
+
+        if urls is not None:
+            values_part = "VALUES ?url { " + " ".join(f"<{url}>" for url in urls) + " }"
 
         id_part = "?url dcterms:identifier ?id ."
 
@@ -109,21 +380,26 @@ class CoinSearchHandler():
         keywords_part = ""
 
         for kw in coin["obverse"]["keywords"]:
-            if kw["negated"]:
-                keywords_part += f"FILTER NOT EXISTS {{ ?obverseIconography dcterms:description ?obvDesc . FILTER regex(?obvDesc, \"{kw['text']}\", \"i\") }}\n"
-            else:
-                keywords_part += f"?obverseIconography dcterms:description ?obvDesc . FILTER regex(?obvDesc, \"{kw['text']}\")\n"
+            keywords_part += self._create_keyword_part("obverse", kw)
 
         for kw in coin["reverse"]["keywords"]:
-            if kw["negated"]:
-                keywords_part += f"FILTER NOT EXISTS {{ ?reverseIconography dcterms:description ?revDesc . FILTER regex(?revDesc, \"{kw['text']}\", \"i\") }}\n"
-            else:
-                keywords_part += f"?reverseIconography dcterms:description ?revDesc . FILTER regex(?revDesc, \"{kw['text']}\")\n"
+            keywords_part += self._create_keyword_part("reverse", kw)
+
+        # only types with at least one coin are found
+        objects_part = "FILTER EXISTS { ?numismaticObject nmo:hasTypeSeriesItem ?url ; rdf:type nmo:NumismaticObject . }" if searchType == "TypeSeriesItem" else ""
 
-        if searchType == "TypeSeriesItem":
+        if searchType == "TypeSeriesItem" and self.thumbnails is not None:
+            self.thumbnails.refresh_in_background(self.executeBulkQuery)
+
+        if searchType == "TypeSeriesItem" and self.thumbnails is not None and self.thumbnails.ready:
+            # the thumbnails are filled in from the materialized table by `withThumbnails`
+            thumbnail_obverse_part = ""
+            thumbnail_reverse_part = ""
+        elif searchType == "TypeSeriesItem":
             thumbnail_obverse_part = """
             {
             SELECT ?url (SAMPLE(?obvThumbnail) AS ?thumbnailObverse) (SAMPLE(?revThumbnail) AS ?thumbnailReverse) WHERE {
+                """ + values_part + """
                 ?numismaticObject nmo:hasTypeSeriesItem ?url ;
                                 rdf:type nmo:NumismaticObject .
                 OPTIONAL {
@@ -148,6 +424,9 @@ class CoinSearchHandler():
             }"""
 
             thumbnail_reverse_part = ""
+            if enrich:
+                # the subquery only yields types with coins, which makes the filter redundant
+                objects_part = ""
         else:
             thumbnail_obverse_part = """
             OPTIONAL {
@@ -173,10 +452,25 @@ class CoinSearchHandler():
             }
             """
 
+        if not enrich:
+            return f"""
+        {{
+        {values_part}
+        ?url rdf:type nmo:{searchType} .
+        {objects_part}
+        {id_part}
+        {design_part if keywords_part else ""}
+        {obverse_part}
+        {reverse_part}
+        {keywords_part}
+        }}
+        """
 
         query = f"""
         {{
+        {values_part}
         ?url rdf:type nmo:{searchType} .
+        {objects_part}
         {id_part}
         {design_part}
         {location_part}
@@ -195,6 +489,41 @@ class CoinSearchHandler():
         """
         return query
 
+    def _create_keyword_part(self, side, kw):
+        """
+        Creates the SPARQL part for a keyword constraint on the iconography of one side.
+
+        If the iconography index is available, the keyword is resolved locally to the matching iconography
+        URIs, which are bound with VALUES (or excluded with FILTER NOT EXISTS for negated keywords).
+        Otherwise the endpoint filters the descriptions with a regex. Both ignore case; only the index
+        also ignores diacritics.
+
+        Parameters:
+            side (str): The side of the coin, "obverse" or "reverse".
+            kw (dict): The keyword, with its "text" and whether it is "negated".
+
+        Returns:
+            str: The SPARQL part of the keyword.
+        """
+        description = "?obvDesc" if side == "obverse" else "?revDesc"
+        uris = None
+
+        if self.iconography is not None:
+            self.iconography.refresh_in_background(self.executeBulkQuery)
+            uris = self.iconography.match(kw["text"])
+
+        if uris is None:
+            if kw["negated"]:
+                return f"FILTER NOT EXISTS {{ ?{side}Iconography dcterms:description {description} . FILTER regex({description}, \"{kw['text']}\", \"i\") }}\n"
+            return f"?{side}Iconography dcterms:description {description} . FILTER regex({description}, \"{kw['text']}\", \"i\")\n"
+
+        has_side = "nmo:hasObverse" if side == "obverse" else "nmo:hasReverse"
+        values = " ".join(f"<{uri}>" for uri in uris)
+
+        if kw["negated"]:
+            return f"FILTER NOT EXISTS {{ ?url {has_side} ?{side}Excluded . ?{side}Excluded nmo:hasIconography ?{side}IconographyExcluded . VALUES ?{side}IconographyExcluded {{ {values} }} }}\n"
+        return f"?url {has_side} ?{side} . ?{side} nmo:hasIconography ?{side}Iconography . VALUES ?{side}Iconography {{ {values} }}\n"
+
     def _extract_spo(self, coin_side):
         """
         Extracts subject, predicate, and object from a coin side specification.
@@ -268,72 +597,258 @@ class CoinSearchHandler():
         
         return sparql_part
 
-    def _eliminate_not_brackets(self, expression):
+    def _emitExpression(self, node, coins, ids, searchType, enrich):
         """
-        Eliminates NOT brackets from a boolean term and returns the resulting expression.
+        Emits the SPARQL group graph pattern of a canonical NNF expression tree.
+        AND operands are joined into one group, OR operands become UNION branches and
+        negated coins are generated with their negated description patterns.
 
         Parameters:
-            expression (str): A boolean expression to be transformed.
-        
+            node (tuple): A node of the tree returned by `compile_expression`.
+            coins (dict): Maps the content key of each coin to its description.
+            ids (dict): Maps content keys to the numeric ids already used in the query; filled while emitting.
+            searchType (str): The type of search to be performed.
+            enrich (bool): Whether the coin parts fetch the display fields.
+
         Returns:
-            str: The transformed boolean expression with eliminated NOT brackets.
-        
-        Author: Mohammed Sayed Mahmod
+            str: The SPARQL pattern of the node, enclosed in braces.
         """
-        while "NOT (" in expression:
-            pattern = r"NOT \(([^)]+)\)"
-
-            def replace_negated_expression(match):
-                inner_expression = match.group(1)
-                transformed = re.sub(r"\bAND\b", " TEMP_AND ", inner_expression)
-                transformed = re.sub(r"\bOR\b", " AND ", transformed)
-                transformed = re.sub(r" TEMP_AND ", " OR ", transformed)
-                transformed = re.sub(r"(\bC\d+\b)", r"NOT \1", transformed)
-                transformed = re.sub(r"NOT NOT ", "", transformed)
-                return f"({transformed})"
+        kind = node[0]
 
-            booleanTerm = re.sub(pattern, replace_negated_expression, booleanTerm)
-            booleanTerm = re.sub(r"NOT NOT ", "", booleanTerm)
-            expression = booleanTerm
+        if kind in ("coin", "not"):
+            key = node[1][1] if kind == "not" else node[1]
+            id = ids.setdefault(key, len(ids) + 1)
+            return self.generateCoinQuery(id, coins[key], searchType, isNegated=kind == "not", enrich=enrich)
 
-        expression = re.sub(r"\s+", " ", expression).strip()
+        parts = [self._emitExpression(child, coins, ids, searchType, enrich) for child in node[1]]
+        separator = " UNION " if kind == "or" else "\n"
 
-        return expression
+        return "{ " + separator.join(parts) + " }"
 
-    def generateQuery(self, coins, booleanTerm, searchType):
+    def generateQuery(self, coins, booleanTerm, searchType, lean=False):
         """
         Generates a complete SPARQL query based on a list of coins and a boolean term combining them.
-        
+
+        The boolean term is parsed into a tree, converted to negation normal form and canonicalized
+        (identical coins and operands are merged, operands are sorted), so equivalent terms produce
+        the same query text and therefore share their cache entries.
+
         Parameters:
             coins (list): A list of dictionaries, each representing attributes of a coin.
-            booleanTerm (str): A boolean expression combining the coins.
+            booleanTerm (str): A boolean expression combining the coins, e.g. "C1 AND (C2 OR NOT C3)".
             searchType (str): The type of search to be performed.
+            lean (bool): Whether to only select the matching ?url, without any display fields.
 
         Returns:
             str: A complete SPARQL query constructed from the provided coins and boolean term.
-        
+
+        Raises:
+            ValueError: If the boolean term is malformed or references an unknown coin.
+
         Author: Mohammed Sayed Mahmod
         """
-        booleanTerm = self._eliminate_not_brackets(booleanTerm)
-        booleanTerm = booleanTerm.replace("(", "{").replace(")", "}")
+        tree, coins_by_key = compile_expression(booleanTerm, coins)
+        pattern = self._emitExpression(tree, coins_by_key, {}, searchType, not lean) if tree is not None else ""
+
+        return self._selectQuery(pattern, lean)
+
+    def generateBranchQueries(self, coins, booleanTerm, searchType):
+        """
+        Generates one independent query per top-level OR operand of the boolean term.
+        The union of their results equals the result of `generateQuery`; a term without a
+        top-level OR yields a single query.
+
+        Parameters:
+            coins (list): A list of dictionaries, each representing attributes of a coin.
+            booleanTerm (str): A boolean expression combining the coins.
+            searchType (str): The type of search to be performed.
+
+        Returns:
+            list: The SPARQL queries of the branches, in canonical order.
+        """
+        tree, coins_by_key = compile_expression(booleanTerm, coins)
 
-        coin_dict = {f"C{i+1}": (i+1, coin) for i, coin in enumerate(coins)}
+        if tree is None:
+            return [self._selectQuery("", False)]
 
-        for placeholder, (id, coin_data) in coin_dict.items():
-            isNegated = "NOT " + placeholder in booleanTerm
-            coinQueryPart = self.generateCoinQuery(id, coin_data, searchType, isNegated)
-            booleanTerm = booleanTerm.replace("NOT " + placeholder if isNegated else placeholder, coinQueryPart)
+        branches = tree[1] if tree[0] == "or" else [tree]
 
+        return [self._selectQuery(self._emitExpression(branch, coins_by_key, {}, searchType, True), False) for branch in branches]
 
-        operators = {
-            "AND": "",
-            "OR": "UNION"
-        }
+    def _selectQuery(self, pattern, lean):
+        """
+        Wraps a group graph pattern into the SELECT query used for coin searches.
+        """
+        combined_query = self._query_head
+
+        if lean:
+            return combined_query + f"SELECT DISTINCT ?url WHERE {{ {pattern} }}"
+
+        combined_query += f"SELECT DISTINCT ?url ?thumbnailObverse ?thumbnailReverse ?descriptionObverse ?descriptionReverse ?date ?maxDiameter ?id ?weight ?type ?mint WHERE {{ {pattern} }}"
 
-        for operator, sparql_operator in operators.items():
-            booleanTerm = booleanTerm.replace(operator, sparql_operator)
+        return combined_query
+
+    def generateEnrichmentQuery(self, urls, searchType):
+        """
+        Generates a query that fetches the display fields of the given result URIs.
+
+        Parameters:
+            urls (list): The URIs of the matching coins or types.
+            searchType (str): The type of search that was performed.
+
+        Returns:
+            str: A SPARQL query selecting the same fields as `generateQuery`, restricted to `urls`.
+        """
+        empty_coin = {
+            "obverse": {"coin": [], "keywords": []},
+            "reverse": {"coin": [], "keywords": []}
+        }
+        coinQueryPart = self.generateCoinQuery(0, empty_coin, searchType, urls=urls)
 
         combined_query = self._query_head
-        combined_query += f"SELECT DISTINCT ?url ?thumbnailObverse ?thumbnailReverse ?descriptionObverse ?descriptionReverse ?date ?maxDiameter ?id ?weight ?type ?mint WHERE {{ {booleanTerm} }}"
+        combined_query += f"SELECT DISTINCT ?url ?thumbnailObverse ?thumbnailReverse ?descriptionObverse ?descriptionReverse ?date ?maxDiameter ?id ?weight ?type ?mint WHERE {{ {coinQueryPart} }}"
+
+        return combined_query
+
+    def searchTwoPhase(self, coins, booleanTerm, searchType, page=1, pageSize=100, batchSize=50):
+        """
+        Searches in two phases: a lean query computes one page of matching ?url values (and, in parallel,
+        their total), then the display fields of just those URIs are fetched in batched VALUES queries.
 
-        return combined_query
\ No newline at end of file
+        Parameters:
+            coins (list): A list of dictionaries, each representing attributes of a coin.
+            booleanTerm (str): A boolean expression combining the coins.
+            searchType (str): The type of search to be performed.
+            page (int): The 1-based number of the page.
+            pageSize (int): The number of matching URIs per page.
+            batchSize (int): The maximum number of URIs per enrichment query.
+
+        Returns:
+            tuple: A QueryResult with the enriched rows of the page, in ?url order, and the total number of matches.
+        """
+        leanQuery = self.generateQuery(coins, booleanTerm, searchType, lean=True)
+        matches, total = self.executePage(leanQuery, page, pageSize)
+
+        urls = [row.url for row in matches]
+        batches = [urls[start:start + batchSize] for start in range(0, len(urls), batchSize)]
+        futures = [self._executor.submit(self.executeQuery, self.generateEnrichmentQuery(batch, searchType)) for batch in batches]
+
+        rows_by_url = {}
+        vars = []
+        for future in futures:
+            result = future.result()
+            vars = result.vars
+            for binding in result.bindings:
+                rows_by_url.setdefault(binding.get("url"), []).append(binding)
+
+        bindings = [binding for url in urls for binding in rows_by_url.get(url, [])]
+
+        return QueryResult(vars, bindings), total
+
+    def searchFanOut(self, coins, booleanTerm, searchType, timeout=None):
+        """
+        Searches by running the top-level OR branches of the boolean term as independent queries
+        on the bounded thread pool and merging their results locally. A failing or slow branch
+        only loses its own rows instead of the whole search. The timeout is passed on to the request
+        of every branch, so a branch that is given up does not keep its connection and pool thread.
+
+        Parameters:
+            coins (list): A list of dictionaries, each representing attributes of a coin.
+            booleanTerm (str): A boolean expression combining the coins.
+            searchType (str): The type of search to be performed.
+            timeout (float): The number of seconds to wait for all branches, or None to wait indefinitely.
+
+        Returns:
+            tuple: The merged QueryResult, de-duplicated by ?url, and one report per branch
+                with its number of rows, its duration in seconds and its error, if any.
+        """
+        queries = self.generateBranchQueries(coins, booleanTerm, searchType)
+        futures = [self._executor.submit(self._timedQuery, query, timeout) for query in queries]
+        done, _ = wait(futures, timeout=timeout)
+
+        outcomes = []
+        for future in futures:
+            if future not in done:
+                future.cancel()
+                outcomes.append((None, None, f"Timed out after {timeout} seconds"))
+            elif future.exception() is not None:
+                outcomes.append((None, None, str(future.exception())))
+            else:
+                outcomes.append(future.result() + (None,))
+
+        return self._mergeBranches(outcomes)
+
+    async def asearchFanOut(self, coins, booleanTerm, searchType, timeout=None):
+        """
+        Searches like `searchFanOut`, awaiting the branches concurrently on the event loop.
+
+        Parameters:
+            coins (list): A list of dictionaries, each representing attributes of a coin.
+            booleanTerm (str): A boolean expression combining the coins.
+            searchType (str): The type of search to be performed.
+            timeout (float): The number of seconds to wait for each branch, or None to wait indefinitely.
+
+        Returns:
+            tuple: The merged QueryResult, de-duplicated by ?url, and one report per branch.
+        """
+        async def run(query):
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(self.aexecuteQuery(query), timeout)
+            except asyncio.TimeoutError:
+                return None, None, f"Timed out after {timeout} seconds"
+            except Exception as error:
+                return None, None, str(error)
+            return result, time.monotonic() - started, None
+
+        queries = self.generateBranchQueries(coins, booleanTerm, searchType)
+        outcomes = await asyncio.gather(*(run(query) for query in queries))
+
+        return self._mergeBranches(outcomes)
+
+    def _timedQuery(self, query, timeout=None):
+        """
+        Executes a query and returns its result together with its duration in seconds.
+        """
+        started = time.monotonic()
+        result = self.executeQuery(query, timeout)
+        return result, time.monotonic() - started
+
+    @staticmethod
+    def _mergeBranches(outcomes):
+        """
+        Merges the results of the fan-out branches. Every ?url keeps the rows of the first
+        branch that matched it, so coins matched by several branches are not duplicated.
+
+        Parameters:
+            outcomes (list): One (QueryResult or None, seconds or None, error or None) tuple per branch.
+
+        Returns:
+            tuple: The merged QueryResult and the branch reports.
+        """
+        vars = []
+        bindings = []
+        seen = set()
+        reports = []
+
+        for branch, (result, seconds, error) in enumerate(outcomes):
+            reports.append({
+                "branch": branch,
+                "rows": len(result) if result is not None else 0,
+                "seconds": round(seconds, 3) if seconds is not None else None,
+                "error": error
+            })
+            if result is None:
+                continue
+
+            vars = vars or result.vars
+            claimed = set()
+            for binding in result.bindings:
+                url = binding.get("url")
+                if url in seen:
+                    continue
+                claimed.add(url)
+                bindings.append(binding)
+            seen |= claimed
+
+        return QueryResult(vars, bindings), reports
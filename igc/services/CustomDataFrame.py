@@ -1,29 +1,66 @@
+import hashlib
+import heapq
+import json
+import os
+import time
 import requests
 import pandas as pd
 from io import BytesIO
 
+from services.SearchIndex import NGramIndex, fold
+
 class CustomDataFrame():
     """
     A custom wrapper for pandas DataFrame to facilitate specific search and filtering operations.
 
     Attributes:
         df (pd.DataFrame): The underlying pandas DataFrame.
+        columns (list): The names of the columns.
+        index (NGramIndex): The n-gram index over the searchable columns.
+        records (list): One JSON-ready dictionary per row, with missing values mapped to None.
     
     Author: Danilo Pantic
     """
         
-    def __init__(self, pd_df):
+    def __init__(self, pd_df, search_columns=()):
         """
-        Initializes the CustomDataFrame with a pandas DataFrame.
+        Initializes the CustomDataFrame with a pandas DataFrame, indexes its searchable columns
+        and prebuilds the serialized record of every row.
 
         Parameters:
             pd_df (pd.DataFrame): The pandas DataFrame to wrap.
+            search_columns (list): The columns that are indexed for `search`.
         """
         self.df = pd_df
+        self.columns = list(pd_df.columns)
+        self.index = NGramIndex(pd_df, search_columns)
+        self.records = pd_df.astype(object).where(pd.notnull(pd_df), None).to_dict(orient='records')
+
+    def __len__(self):
+        return len(self.records)
+
+    def _positions(self, column, query):
+        """
+        Returns the positions of the rows where `query` is found in `column`.
+        Indexed columns are answered from the n-gram index, other columns fall back to a plain substring scan.
+
+        Parameters:
+            column (str): The column to search in.
+            query (str): The string to search for in the specified column.
+
+        Returns:
+            list: The ascending positions of the matching rows.
+        """
+        if column in self.index.texts:
+            return self.index.lookup(column, query)
+
+        mask = self.df[column].str.contains(query, case=False, na=False, regex=False)
+        return mask.to_numpy().nonzero()[0].tolist()
 
     def search(self, column, query):
         """
         Searches for rows where `query` is found in the specified `column` and returns a list of dictionaries.
+        The match is case- and diacritic-insensitive.
 
         Parameters:
             column (str): The column to search in.
@@ -33,40 +70,245 @@ class CustomDataFrame():
             list: A list of dictionaries representing the rows where the query was found, 
                   with additional information about the found column.
         """
-        df_filtered = self.df[self.df[column].str.contains(query, case=False, na=False)].copy()
+        records = self.records
+
+        return [dict(records[position], found_in_column=column) for position in self._positions(column, query)]
+
+    def _rank(self, column, position, folded_query):
+        """
+        Computes the relevance of a matching cell: exact matches first, then prefixes, then substrings,
+        with shorter values ahead within each group.
+
+        Parameters:
+            column (str): The column of the cell.
+            position (int): The row position of the cell.
+            folded_query (str): The folded search string.
 
-        df_filtered['found_in_column'] = column
+        Returns:
+            tuple: A sort key, smaller is more relevant.
+        """
+        texts = self.index.texts.get(column)
+        text = texts[position] if texts is not None else fold(self.df[column].iat[position])
 
-        for col in df_filtered.columns:
-            if pd.api.types.is_numeric_dtype(df_filtered[col]):
-                df_filtered[col] = df_filtered[col].apply(lambda x: None if pd.isna(x) else x).copy()
+        if text == folded_query:
+            tier = 0
+        elif text.startswith(folded_query):
+            tier = 1
+        else:
+            tier = 2
 
-        df_filtered = df_filtered.where(pd.notnull(df_filtered), None)
+        return (tier, len(text))
 
-        return df_filtered.to_dict(orient='records')
+    def multi_search(self, columns, query, limit=None, offset=0):
+        """
+        Searches several columns at once and returns every matching row exactly once, ranked by relevance.
+
+        Parameters:
+            columns (list): The columns to search in, in order of preference.
+            query (str): The string to search for.
+            limit (int): The maximum number of rows to return, or None for all of them.
+            offset (int): The number of top-ranked rows to skip.
+
+        Returns:
+            list: A list of dictionaries representing the matching rows, most relevant first. `found_in_columns`
+                  lists every column that matched, `found_in_column` holds the best-matching one.
+        """
+        folded_query = fold(query)
+        matches = {}
+
+        for column in columns:
+            if column not in self.columns:
+                continue
+            for position in self._positions(column, query):
+                rank = self._rank(column, position, folded_query) + (position,)
+                match = matches.get(position)
+                if match is None:
+                    matches[position] = [rank, column, [column]]
+                else:
+                    if rank < match[0]:
+                        match[0] = rank
+                        match[1] = column
+                    match[2].append(column)
+
+        if limit is None:
+            ranked = sorted(matches.values(), key=lambda match: match[0])[offset:]
+        else:
+            ranked = heapq.nsmallest(offset + limit, matches.values(), key=lambda match: match[0])[offset:]
+
+        records = self.records
+
+        return [
+            dict(records[rank[-1]], found_in_column=column, found_in_columns=found_in)
+            for rank, column, found_in in ranked
+        ]
 
 class Dataframes():
     """
     Manages the loading and accessing of multiple dataframes from specified sources.
 
+    When a snapshot directory is given, every table is stored there as a pickled DataFrame next to a
+    `manifest.json` recording its ETag, Last-Modified date and checksum. Startup then only reads the
+    snapshot; contacting the upstream repository is left to `refresh`.
+
     Attributes:
         dataframes (dict): A dictionary containing the loaded dataframes.
+        column_mapping (dict): The searchable columns of each table.
+        snapshot_dir (str): The directory holding the local snapshot, or None to always download.
+        manifest (dict): The snapshot manifest with one entry per table.
     """
 
-    def __init__(self):
+    source_url = "https://raw.githubusercontent.com/Frankfurt-BigDataLab/NLP-on-multilingual-coin-datasets/main/lists/csv/nlp_{table}.csv"
+    snapshot_version = 1
+
+    tablenames = ["hierarchy", "list_animal", 
+                  "list_obj", "list_person", 
+                  "list_plant", "list_verb"]
+
+    column_mapping = {
+        'list_animal': ['name_en', 'name_ger', 'alternativenames_en', 'alternativenames_ger'],
+        'list_obj': ['name_en', 'name_ger', 'alternativenames_en', 'alternativenames_ger'],
+        'list_person': ['name', 'name_german', 'alternativenames'],
+        'list_plant': ['name_en', 'name_ger', 'alternativenames_en', 'alternativenames_ger'],
+        'list_verb': ['name_en', 'name_ger', 'alternativenames_en', 'alternativenames_ger'],
+        'hierarchy': ['class']
+    }
+
+    def __init__(self, snapshot_dir=None):
         """
-        Initializes the Dataframes object, loading data from predefined URLs.
+        Initializes the Dataframes object, loading every table from the local snapshot if possible and
+        from the predefined URLs otherwise, and indexing the searchable columns.
+
+        Parameters:
+            snapshot_dir (str): The directory holding the local snapshot, or None to always download.
         """
         self.dataframes = {}
-         
-        tablenames = ["hierarchy", "list_animal", 
-                      "list_obj", "list_person", 
-                      "list_plant", "list_verb"]
-        
-        for table in tablenames:
-            res = requests.get(f"https://raw.githubusercontent.com/Frankfurt-BigDataLab/NLP-on-multilingual-coin-datasets/main/lists/csv/nlp_{table}.csv").content
-            self.dataframes[table] = CustomDataFrame(pd.read_csv(BytesIO(res)))
-                   
+        self.snapshot_dir = snapshot_dir
+        self.manifest = self._read_manifest()
+
+        for table in self.tablenames:
+            pd_df = self._load_snapshot(table)
+            if pd_df is None:
+                pd_df = self._fetch(table)
+            self._set(table, pd_df)
+
+    def _set(self, table, pd_df):
+        """
+        Wraps and indexes a freshly loaded table.
+        """
+        self.dataframes[table] = CustomDataFrame(pd_df, self.column_mapping.get(table, []))
+
+    def _manifest_path(self):
+        return os.path.join(self.snapshot_dir, "manifest.json")
+
+    def _snapshot_path(self, table):
+        return os.path.join(self.snapshot_dir, f"nlp_{table}.pkl")
+
+    def _read_manifest(self):
+        """
+        Reads the snapshot manifest. A missing manifest or one of another format version counts as empty.
+
+        Returns:
+            dict: The manifest with a `tables` entry.
+        """
+        empty = {"version": self.snapshot_version, "tables": {}}
+
+        if self.snapshot_dir is None or not os.path.exists(self._manifest_path()):
+            return empty
+
+        with open(self._manifest_path(), "r") as file:
+            manifest = json.load(file)
+
+        return manifest if manifest.get("version") == self.snapshot_version else empty
+
+    def _write_manifest(self):
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _load_snapshot(self, table):
+        """
+        Loads a table from the local snapshot.
+
+        Returns:
+            pd.DataFrame: The table, or None if there is no usable snapshot for it.
+        """
+        if self.snapshot_dir is None or table not in self.manifest["tables"]:
+            return None
+        if not os.path.exists(self._snapshot_path(table)):
+            return None
+
+        return pd.read_pickle(self._snapshot_path(table))
+
+    def _fetch(self, table, conditional=False):
+        """
+        Downloads a table from the upstream repository and stores it in the snapshot.
+
+        Parameters:
+            table (str): The name of the table.
+            conditional (bool): Whether to send the stored ETag/Last-Modified validators.
+
+        Returns:
+            pd.DataFrame: The downloaded table, or None if the upstream copy is unchanged.
+        """
+        entry = self.manifest["tables"].get(table, {})
+        headers = {}
+
+        if conditional:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = requests.get(self.source_url.format(table=table), headers=headers, timeout=30)
+
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        checksum = hashlib.sha256(response.content).hexdigest()
+        if conditional and checksum == entry.get("sha256"):
+            return None
+
+        pd_df = pd.read_csv(BytesIO(response.content))
+
+        if self.snapshot_dir is not None:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            tmp_path = self._snapshot_path(table) + ".tmp"
+            pd_df.to_pickle(tmp_path)
+            os.replace(tmp_path, self._snapshot_path(table))
+
+            self.manifest["tables"][table] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": checksum,
+                "rows": len(pd_df),
+                "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            }
+            self._write_manifest()
+
+        return pd_df
+
+    def refresh(self, force=False):
+        """
+        Checks the upstream repository for newer versions of the tables and reloads the changed ones.
+
+        Parameters:
+            force (bool): Whether to download every table regardless of the stored validators.
+
+        Returns:
+            list: The names of the tables that were updated.
+        """
+        updated = []
+
+        for table in self.tablenames:
+            pd_df = self._fetch(table, conditional=not force)
+            if pd_df is not None:
+                self._set(table, pd_df)
+                updated.append(table)
+
+        return updated
+
     def get(self, tablename):
         """
         Retrieves the dataframe object for the specified tablename.
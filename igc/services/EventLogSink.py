@@ -0,0 +1,187 @@
+import atexit
+import csv
+import os
+import queue
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class EventLogSink():
+    """
+    An append-only CSV log written in batches by a background thread.
+
+    `write` only puts the row into an in-memory queue. The writer thread appends the queued rows once
+    `batch_size` of them are waiting or `flush_interval` seconds after the first one arrived, with one open,
+    lock and write per batch. Appends are serialized across processes with an exclusive flock, and once the
+    file has reached `max_bytes` it is rotated to `<path>.1` ... `<path>.<backups>`. When the queue is full,
+    new rows are dropped and counted rather than blocking the request.
+
+    Attributes:
+        path (str): The path of the CSV file.
+        batch_size (int): The number of queued rows that triggers a write.
+        flush_interval (float): The maximum number of seconds a row waits in the queue.
+        max_bytes (int): The size after which the file is rotated, or 0 to never rotate.
+        backups (int): The number of rotated files that are kept.
+        stats (dict): The number of queued, written and dropped rows, of batches and of rotations.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=2.0, max_bytes=10 * 1024 * 1024, backups=5, max_queue=10000):
+        """
+        Initializes the sink. The writer thread is started with the first row.
+
+        Parameters:
+            path (str): The path of the CSV file.
+            batch_size (int): The number of queued rows that triggers a write.
+            flush_interval (float): The maximum number of seconds a row waits in the queue.
+            max_bytes (int): The size after which the file is rotated, or 0 to never rotate.
+            backups (int): The number of rotated files that are kept.
+            max_queue (int): The maximum number of rows waiting in the queue.
+        """
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "rotations": 0, "errors": 0}
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = threading.Event()
+        self._full = threading.Event()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+        atexit.register(self.flush)
+
+    def write(self, row):
+        """
+        Queues a row without touching the disk.
+
+        Parameters:
+            row (list): The values of the row.
+
+        Returns:
+            bool: Whether the row was queued; False if the queue was full and the row was dropped.
+        """
+        if self._thread is None:
+            self._start()
+
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count("dropped")
+            return False
+
+        self._count("queued")
+        self._pending.set()
+        if self._queue.qsize() >= self.batch_size:
+            self._full.set()
+        return True
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            # wait for the first row, then give the batch up to `flush_interval` seconds to fill up
+            self._pending.wait()
+            self._full.wait(self.flush_interval)
+            self._pending.clear()
+            self._full.clear()
+            # the thread must outlive any error, or every later row would stay in the queue until it is full
+            try:
+                self.flush()
+            except Exception as error:
+                self._count("errors")
+                print(f"Could not flush the event log {self.path}: {error}")
+
+    def flush(self):
+        """
+        Writes every queued row right away, e.g. before the process exits.
+        """
+        with self._write_lock:
+            rows = []
+            while True:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not rows:
+                return
+
+            try:
+                self._append(rows)
+            except Exception as error:
+                with self._stats_lock:
+                    self.stats["errors"] += 1
+                    self.stats["dropped"] += len(rows)
+                print(f"Could not write {len(rows)} rows to {self.path}: {error}")
+                return
+
+            with self._stats_lock:
+                self.stats["written"] += len(rows)
+                self.stats["batches"] += 1
+
+    def _open_locked(self):
+        """
+        Opens the file for appending and locks it. If another process rotated the file while this one was
+        waiting for the lock, the new file is opened instead.
+        """
+        while True:
+            file = open(self.path, "a", newline="")
+            if fcntl is None:
+                return file
+
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                if os.fstat(file.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return file
+            except FileNotFoundError:
+                pass
+            file.close()
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._count("rotations")
+
+    def _append(self, rows):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        file = self._open_locked()
+        try:
+            if self.max_bytes and os.fstat(file.fileno()).st_size >= self.max_bytes:
+                # the old file stays locked until it is closed, so nobody appends to it after the rename
+                self._rotate()
+                file.close()
+                file = self._open_locked()
+
+            csv.writer(file).writerows(rows)
+            file.flush()
+        finally:
+            file.close()
+
+    def snapshot(self):
+        """
+        Returns the counters of the sink together with the number of rows waiting in the queue.
+        """
+        with self._stats_lock:
+            return dict(self.stats, pending=self._queue.qsize())
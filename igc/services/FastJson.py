@@ -0,0 +1,36 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """
+    Serializes an object to JSON, with orjson if it is installed.
+
+    Parameters:
+        obj: The object to serialize.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """
+    Parses a JSON document, with orjson if it is installed.
+
+    Parameters:
+        data (bytes or str): The JSON document.
+
+    Returns:
+        The parsed object.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,15 +1,52 @@
-import requests
-import pandas as pd
+import csv
+import io
 import os
+import threading
+import time
 import urllib.parse
 
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 
 class Helper:
-    def __init__(self, csv_path='../newapp/ressources/mintMap.csv'):
+    """
+    Holds the mint map, a dictionary mapping nomisma mint URIs to their English labels.
+
+    The map is a cached artifact: it is read from its CSV file when the Helper is created and swapped for a newer
+    version once another process has rewritten the file. Once the file is older than `max_age`, one process
+    downloads it again from nomisma.org in a background thread, so startup never waits for the download.
+
+    Attributes:
+        csv_path (str): The path of the mint map CSV file.
+        max_age (float): The age in seconds after which the file is downloaded again.
+        check_interval (float): The minimum number of seconds between two checks of the file.
+        download_timeout (float): The connect and read timeout of the download in seconds.
+    """
+
+    # the minimum number of seconds between two download attempts of the same process
+    RETRY_INTERVAL = 15 * 60
+
+    def __init__(self, csv_path='../newapp/ressources/mintMap.csv', max_age=7 * 24 * 60 * 60, check_interval=30, download_timeout=60, background_refresh=True):
         """
-        Initializes the Helper
+        Initializes the Helper and loads the mint map from its file.
+
+        Parameters:
+            csv_path (str): The path of the mint map CSV file.
+            max_age (float): The age in seconds after which the file is downloaded again.
+            check_interval (float): The minimum number of seconds between two checks of the file.
+            download_timeout (float): The connect and read timeout of the download in seconds.
+            background_refresh (bool): Whether a stale file is downloaded in the background; otherwise
+                the caller refreshes it with `refresh`.
         """
-        self.csv_path = csv_path
+        self.csv_path = str(csv_path)
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.download_timeout = download_timeout
         self.mint_query = """
             PREFIX rdf:	<http://www.w3.org/1999/02/22-rdf-syntax-ns#>
             PREFIX bio:	<http://purl.org/vocab/bio/0.1/>
@@ -37,38 +74,165 @@ class Helper:
             }
         """
 
-        self.downloadMintMapFromNomisma()
+        self._mint_map = {}
+        self._loaded_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._attempted_at = None
+        self._background_refresh = background_refresh
+
+        self.load()
+        if background_refresh:
+            self.refresh_in_background()
+
+    def _mtime(self):
+        try:
+            return os.path.getmtime(self.csv_path)
+        except OSError:
+            return None
+
+    def is_stale(self):
+        mtime = self._mtime()
+        return mtime is None or time.time() - mtime > self.max_age
+
+    @staticmethod
+    def parse(content):
+        """
+        Parses the CSV returned by the mint query.
+
+        Parameters:
+            content (bytes): The CSV document with the columns mint and mintLabel.
+
+        Returns:
+            dict: A dictionary mapping mint IDs to mint labels.
+        """
+        reader = csv.DictReader(io.StringIO(content.decode("utf-8")))
+        return {row["mint"]: row["mintLabel"] for row in reader if row.get("mint")}
+
+    def load(self):
+        """
+        Loads the mint map from its file if the file changed since it was last loaded.
+        The new map replaces the previous one in a single assignment, so readers never see a partial map.
+
+        Returns:
+            bool: Whether the map was (re)loaded.
+        """
+        mtime = self._mtime()
+        if mtime is None:
+            print("MintMap csv file does not exist.")
+            return False
+        if mtime == self._loaded_mtime:
+            return False
+
+        with open(self.csv_path, "rb") as file:
+            self._mint_map = self.parse(file.read())
+        self._loaded_mtime = mtime
+        return True
 
     def downloadMintMapFromNomisma(self):
         """
         Downloads the mint map CSV from the Nomisma SPARQL endpoint and saves it to the specified path.
+        The file is only replaced by a download that parses into a non-empty map.
+
+        Returns:
+            bool: Whether the file was replaced.
         """
         print("Downloading MintMap file from Nomisma... (This may take a while)")
 
         encoded_query = urllib.parse.quote(self.mint_query)
         url = f"http://nomisma.org/query?query={encoded_query}&output=csv"
 
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            with open(self.csv_path, 'wb') as file:
-                file.write(response.content)
-            print("MintMap file downloaded and saved successfully.")
-        else:
+        # without a timeout, a stalled connection would keep the refresh (and its lock) forever
+        response = requests.get(url, timeout=self.download_timeout)
+
+        if response.status_code != 200:
             print(f"Failed to download the MintMap file, status code: {response.status_code}")
-    
+            return False
+
+        try:
+            if not self.parse(response.content):
+                print("Failed to download the MintMap file: the result is empty")
+                return False
+        except (UnicodeDecodeError, csv.Error, KeyError) as error:
+            print(f"Failed to download the MintMap file: {error}")
+            return False
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.csv_path)), exist_ok=True)
+        tmp_path = f"{self.csv_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(response.content)
+        os.replace(tmp_path, self.csv_path)
+
+        print("MintMap file downloaded and saved successfully.")
+        return True
+
+    def refresh(self, wait=True):
+        """
+        Downloads a missing or stale mint map and loads the new file. Only one process downloads at a time.
+
+        Parameters:
+            wait (bool): Whether to wait for a download of another process instead of returning right away.
+        """
+        if not self.is_stale():
+            return
+
+        lock_file = open(f"{self.csv_path}.lock", "w")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+
+            # another process may have finished a download while this one was waiting for its turn
+            if self.is_stale():
+                self.downloadMintMapFromNomisma()
+            self.load()
+        except Exception as error:
+            print(f"Could not refresh the MintMap file: {error}")
+        finally:
+            lock_file.close()
+
+    def _refresh(self):
+        try:
+            self.refresh(wait=False)
+        finally:
+            self._refreshing = False
+
+    def refresh_in_background(self):
+        """
+        Downloads a missing or stale mint map in a daemon thread. At most one download runs at a time,
+        and a failed download is not retried for RETRY_INTERVAL seconds.
+        """
+        if not self.is_stale():
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if self._refreshing or (self._attempted_at is not None and now - self._attempted_at < self.RETRY_INTERVAL):
+                return
+            self._refreshing = True
+            self._attempted_at = now
+
+        threading.Thread(target=self._refresh, name="mint-map-refresh", daemon=True).start()
+
     def get_mint_map(self):
         """
-        Loads the mint map from the saved CSV file and converts it to a dictionary.
+        Returns the current mint map. At most every `check_interval` seconds, a file rewritten by another process
+        is loaded and a stale file is refreshed in the background.
 
         Returns:
         dict: A dictionary mapping mint IDs to mint labels.
         """
-        if os.path.exists(self.csv_path):
-            df = pd.read_csv(self.csv_path)
-            df = df.set_index('mint')
-            mint_map = df['mintLabel'].to_dict()
-            return mint_map
-        else:
-            print("MintMap csv file does not exist.")
-            return {}
\ No newline at end of file
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                self.load()
+            except (OSError, UnicodeDecodeError, csv.Error) as error:
+                print(f"Could not load the MintMap file: {error}")
+            if self._background_refresh:
+                self.refresh_in_background()
+
+        return self._mint_map
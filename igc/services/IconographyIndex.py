@@ -0,0 +1,71 @@
+import pandas as pd
+
+from services.LookupTable import LookupTable
+from services.SearchIndex import NGramIndex
+
+
+class IconographyIndex(LookupTable):
+    """
+    A local full-text index over the `dcterms:description` texts of all obverse and reverse iconographies.
+
+    Keyword constraints are resolved against this index to the set of matching iconography URIs, which
+    `CoinSearchHandler` then injects into the query as VALUES bindings instead of asking the endpoint to
+    scan every description with a regex.
+
+    Attributes:
+        max_values (int): The maximum number of URIs a keyword may resolve to before the regex filter is used instead.
+        uris (list): The iconography URI of every indexed description.
+        index (NGramIndex): The n-gram index over the descriptions.
+    """
+
+    name = "iconography index"
+    query = """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    SELECT DISTINCT ?iconography ?description WHERE {
+        ?side nmo:hasIconography ?iconography .
+        ?iconography dcterms:description ?description .
+    }
+    """
+
+    def __init__(self, path=None, max_age=24 * 60 * 60, max_values=2000, build_timeout=10 * 60):
+        """
+        Initializes the index from its file, if there is one.
+
+        Parameters:
+            path (str): The path of the JSON file holding the indexed descriptions, or None for a memory-only index.
+            max_age (float): The age in seconds after which the index is rebuilt.
+            max_values (int): The maximum number of URIs a keyword may resolve to.
+            build_timeout (float): The read timeout in seconds of the query that builds the index.
+        """
+        self.max_values = max_values
+        self.uris = []
+        self.index = None
+
+        super().__init__(path, max_age, build_timeout)
+
+    def _row(self, row):
+        return [row.iconography, row.description]
+
+    def _set(self, rows):
+        pd_df = pd.DataFrame(rows, columns=["iconography", "description"])
+        self.uris = pd_df["iconography"].tolist()
+        self.index = NGramIndex(pd_df, ["description"])
+
+    def match(self, text):
+        """
+        Resolves a keyword to the iconographies whose description contains it, ignoring case and diacritics.
+
+        Parameters:
+            text (str): The keyword.
+
+        Returns:
+            list: The sorted URIs of the matching iconographies, or None if the index is not ready
+                or the keyword matches more than `max_values` of them.
+        """
+        if self.index is None:
+            return None
+
+        uris = sorted({self.uris[position] for position in self.index.lookup("description", text)})
+
+        return uris if len(uris) <= self.max_values else None
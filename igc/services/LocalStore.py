@@ -0,0 +1,319 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from rdflib import Dataset, URIRef
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.util import guess_format
+
+from services.QueryCache import QueryResult
+
+
+# the SPARQL parser of rdflib is not thread-safe, so queries are parsed one at a time and only evaluated concurrently
+_parse_lock = threading.Lock()
+
+
+class _ReadWriteLock():
+    """
+    A lock shared by any number of readers or held by a single writer. A waiting writer blocks new readers,
+    so a reload is not starved by a steady stream of queries.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def reading(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class LocalStore():
+    """
+    A local triple store that answers SPARQL queries in-process instead of sending them to the remote endpoint.
+    It exposes the same `query`, `aquery`, `stream` and `stats` methods as SparqlTransport, so a
+    CoinSearchHandler can use either one as its backend.
+
+    Every file of the RDF dump is loaded into its own named graph of an rdflib Dataset whose default graph is
+    the union of all of them. The loaded dataset is kept as a pickled snapshot next to a manifest recording the
+    size, modification time and checksum of each file, so a reload only re-parses the files that changed.
+    Processes that serve queries pick up a snapshot written by another process (e.g. `manage.py load_rdf_dump`)
+    the next time they check the manifest. Dump files may be gzip-compressed, e.g. `coins.ttl.gz`.
+
+    Up to `max_concurrent` queries are evaluated at the same time, after being parsed one at a time; reloads and
+    snapshot switches wait for the running queries and hold back new ones while they change the dataset.
+
+    Attributes:
+        dump_dir (str): The directory containing the RDF dump files.
+        store_dir (str): The directory holding the snapshot and its manifest.
+        check_interval (float): The minimum number of seconds between two checks for a newer snapshot.
+        max_concurrent (int): The number of queries that can run at the same time.
+        dataset (rdflib.Dataset): The loaded triples.
+        manifest (dict): The files contained in the loaded snapshot.
+    """
+
+    snapshot_version = 1
+
+    def __init__(self, dump_dir, store_dir, check_interval=30, max_concurrent=4, autoload=True):
+        """
+        Initializes the store from its snapshot.
+
+        Parameters:
+            dump_dir (str): The directory containing the RDF dump files.
+            store_dir (str): The directory holding the snapshot and its manifest.
+            check_interval (float): The minimum number of seconds between two checks for a newer snapshot.
+            max_concurrent (int): The number of queries that can run at the same time.
+            autoload (bool): Whether to load the dump right away if there is no snapshot yet.
+        """
+        self.dump_dir = str(dump_dir)
+        self.store_dir = str(store_dir)
+        self.check_interval = check_interval
+        self.max_concurrent = max_concurrent
+
+        self._lock = threading.Lock()
+        self._dataset_lock = _ReadWriteLock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._checked_at = time.monotonic()
+        self._stats = {"queries": 0, "query_seconds": 0.0, "reloads": 0}
+        self._manifest_mtime = None
+
+        if not self._load_snapshot():
+            self.dataset = Dataset(default_union=True)
+            self.manifest = {"version": self.snapshot_version, "files": {}}
+            if autoload:
+                self.reload()
+
+    def _manifest_path(self):
+        return os.path.join(self.store_dir, "manifest.json")
+
+    def _snapshot_path(self):
+        return os.path.join(self.store_dir, "dataset.pkl")
+
+    def _load_snapshot(self):
+        """
+        Loads the snapshot and its manifest from disk.
+
+        Returns:
+            bool: False if there is no usable snapshot.
+        """
+        try:
+            with open(self._manifest_path(), "r") as file:
+                manifest = json.load(file)
+            with open(self._snapshot_path(), "rb") as file:
+                dataset = pickle.load(file)
+        except (OSError, ValueError, pickle.UnpicklingError):
+            return False
+
+        if manifest.get("version") != self.snapshot_version:
+            return False
+
+        self.dataset = dataset
+        self.manifest = manifest
+        self._manifest_mtime = os.path.getmtime(self._manifest_path())
+        return True
+
+    def _write_snapshot(self):
+        """
+        Writes the snapshot and then the manifest, each one atomically, so readers never see a partial file.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+
+        for path, write in (
+            (self._snapshot_path(), lambda file: pickle.dump(self.dataset, file, protocol=pickle.HIGHEST_PROTOCOL)),
+            (self._manifest_path(), lambda file: file.write(json.dumps(self.manifest, indent=2).encode("utf-8")))
+        ):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as file:
+                write(file)
+            os.replace(tmp_path, path)
+
+        self._manifest_mtime = os.path.getmtime(self._manifest_path())
+
+    def _dump_files(self):
+        """
+        Lists the RDF files of the dump with a format rdflib can parse, compressed or not.
+
+        Returns:
+            dict: Maps each file name to its path and rdflib format.
+        """
+        files = {}
+
+        for path in sorted(Path(self.dump_dir).glob("*")):
+            rdf_format = guess_format(path.name[:-len(".gz")] if path.name.endswith(".gz") else path.name)
+            if path.is_file() and rdf_format is not None:
+                files[path.name] = (path, rdf_format)
+
+        return files
+
+    @staticmethod
+    def _sha256(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def reload(self, force=False):
+        """
+        Brings the store in line with the dump: graphs of removed files are dropped and only new or changed
+        files are parsed again. A file whose size or modification time changed but whose checksum did not
+        is left alone.
+
+        Parameters:
+            force (bool): Whether to re-parse every file.
+
+        Returns:
+            list: The names of the files that were loaded or removed.
+        """
+        with self._dataset_lock.writing():
+            changed = []
+            touched = False
+            files = self._dump_files()
+            known = self.manifest["files"]
+
+            for name in [name for name in known if name not in files]:
+                self.dataset.remove_graph(URIRef(known.pop(name)["graph"]))
+                changed.append(name)
+
+            for name, (path, rdf_format) in files.items():
+                stat = path.stat()
+                entry = known.get(name)
+
+                if not force and entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                    continue
+
+                sha256 = self._sha256(path)
+                if not force and entry is not None and entry["sha256"] == sha256:
+                    entry["mtime"] = stat.st_mtime
+                    touched = True
+                    continue
+
+                graph_id = URIRef(path.resolve().as_uri())
+                self.dataset.remove_graph(graph_id)
+                if path.name.endswith(".gz"):
+                    with gzip.open(path, "rb") as file:
+                        self.dataset.graph(graph_id).parse(file, format=rdf_format)
+                else:
+                    self.dataset.graph(graph_id).parse(str(path), format=rdf_format)
+
+                known[name] = {
+                    "graph": str(graph_id),
+                    "format": rdf_format,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "sha256": sha256,
+                    "triples": len(self.dataset.graph(graph_id)),
+                    "loaded_at": time.time()
+                }
+                changed.append(name)
+
+            if changed or touched or not os.path.exists(self._snapshot_path()):
+                self._write_snapshot()
+            with self._lock:
+                self._stats["reloads"] += 1
+
+            return changed
+
+    def _check_snapshot(self):
+        """
+        Switches to a snapshot written by another process, at most once every `check_interval` seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+
+        try:
+            mtime = os.path.getmtime(self._manifest_path())
+        except OSError:
+            return
+
+        if mtime != self._manifest_mtime:
+            with self._dataset_lock.writing():
+                self._load_snapshot()
+
+    def stats(self):
+        """
+        Returns the usage counters of the store together with its size.
+
+        Returns:
+            dict: A snapshot of the counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(max_concurrent=self.max_concurrent, files=len(self.manifest["files"]), triples=sum(entry["triples"] for entry in self.manifest["files"].values()))
+        return stats
+
+    def query(self, query, timeout=None, read_timeout=None):
+        """
+        Executes a SELECT query against the local dataset and returns its results.
+
+        Parameters:
+            query (str): The SPARQL query.
+            timeout (float): Accepted for compatibility with SparqlTransport; an rdflib evaluation cannot be interrupted.
+            read_timeout (float): Accepted for compatibility with SparqlTransport.
+
+        Returns:
+            QueryResult: The results of the query.
+        """
+        self._check_snapshot()
+
+        with _parse_lock:
+            prepared = prepareQuery(query)
+
+        with self._slots, self._dataset_lock.reading():
+            started = time.monotonic()
+            result = QueryResult.from_rdflib(self.dataset.query(prepared))
+
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["query_seconds"] += time.monotonic() - started
+
+        return result
+
+    async def aquery(self, query):
+        """
+        Executes a SELECT query like `query` in a worker thread, so the event loop is not blocked.
+        """
+        return await asyncio.to_thread(self.query, query)
+
+    def stream(self, query):
+        """
+        Executes a SELECT query and returns an iterator over its rows. The local store evaluates the query in one go.
+        """
+        return iter(self.query(query))
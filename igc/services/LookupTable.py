@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class LookupTable(ABC):
+    """
+    The base class of the local tables that are derived from the SPARQL data once and then used to avoid
+    expensive patterns in the search queries.
+
+    A table is built from the result of its `query`, stored as a JSON file and rebuilt in a background thread
+    once it is older than `max_age`. Subclasses define the query and how its rows are indexed in `_set`.
+
+    Attributes:
+        path (str): The path of the JSON file holding the rows of the table, or None for a memory-only table.
+        max_age (float): The age in seconds after which the table is rebuilt.
+        build_timeout (float): The read timeout in seconds of the query that builds the table.
+        built_at (float): The time the rows were fetched, or None if the table is empty.
+    """
+
+    query = None
+    name = "lookup table"
+
+    # the minimum number of seconds between two build attempts of the same process
+    RETRY_INTERVAL = 15 * 60
+
+    def __init__(self, path=None, max_age=24 * 60 * 60, build_timeout=10 * 60):
+        """
+        Initializes the table from its file, if there is one.
+
+        Parameters:
+            path (str): The path of the JSON file holding the rows of the table, or None for a memory-only table.
+            max_age (float): The age in seconds after which the table is rebuilt.
+            build_timeout (float): The read timeout in seconds of the query that builds the table.
+        """
+        self.path = str(path) if path is not None else None
+        self.max_age = max_age
+        self.build_timeout = build_timeout
+        self.built_at = None
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._attempted_at = None
+
+        self.load()
+
+    @property
+    def ready(self):
+        return self.built_at is not None
+
+    def is_stale(self):
+        return self.built_at is None or time.time() - self.built_at > self.max_age
+
+    @abstractmethod
+    def _row(self, row):
+        """
+        Converts a row of the query result into the list stored in the file.
+        """
+
+    @abstractmethod
+    def _set(self, rows):
+        """
+        Indexes the stored rows.
+        """
+
+    def load(self):
+        """
+        Loads the rows from the file if they are newer than the ones in memory.
+
+        Returns:
+            bool: Whether the table was (re)loaded.
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return False
+
+        with open(self.path, "r") as file:
+            data = json.load(file)
+
+        if self.built_at is not None and data["built_at"] <= self.built_at:
+            return False
+
+        self._set(data["rows"])
+        self.built_at = data["built_at"]
+        return True
+
+    def build(self, execute):
+        """
+        Runs the query of the table, rebuilds it and writes its rows to the file.
+
+        Parameters:
+            execute (callable): A function executing a SPARQL query with a read timeout and returning a QueryResult,
+                e.g. `CoinSearchHandler.executeBulkQuery`.
+
+        Returns:
+            int: The number of rows in the table.
+        """
+        built_at = time.time()
+        rows = [self._row(row) for row in execute(self.query, self.build_timeout)]
+
+        if self.path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as file:
+                json.dump({"built_at": built_at, "rows": rows}, file)
+            os.replace(tmp_path, self.path)
+
+        self._set(rows)
+        self.built_at = built_at
+        return len(rows)
+
+    def refresh_in_background(self, execute):
+        """
+        Rebuilds a stale table in a daemon thread. A newer file written by another process is picked up
+        instead, at most one rebuild runs at a time, and a failed rebuild is not retried for RETRY_INTERVAL seconds.
+
+        Parameters:
+            execute (callable): A function executing a SPARQL query with a read timeout and returning a QueryResult.
+        """
+        if not self.is_stale():
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if self._refreshing or (self._attempted_at is not None and now - self._attempted_at < self.RETRY_INTERVAL):
+                return
+            self._refreshing = True
+            self._attempted_at = now
+
+        def refresh():
+            try:
+                if not self.load() or self.is_stale():
+                    self.build(execute)
+            except Exception as error:
+                print(f"Could not refresh the {self.name}: {error}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name=self.name.replace(" ", "-"), daemon=True).start()
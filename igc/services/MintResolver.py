@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class MintResolver():
+    """
+    Resolves the labels of mint URIs that are missing from the mint map.
+
+    The unknown mints of a result page are collected and their labels fetched with a single query that binds
+    them with VALUES, in batches of `batch_size` URIs. Labels are kept in a bounded LRU cache. Mints without
+    a label are cached as well, for `negative_ttl` seconds, so they are not looked up again for every page.
+
+    Attributes:
+        execute (callable): A function executing a SPARQL query and returning a QueryResult.
+        mint_map (callable): A function returning the current mint map.
+        max_size (int): The maximum number of cached mints.
+        ttl (float): The number of seconds a resolved label is kept.
+        negative_ttl (float): The number of seconds a mint without a label is not looked up again.
+        batch_size (int): The maximum number of mints bound in one query.
+        stats (dict): The number of cache hits, of mints looked up, of queries and of failed queries.
+    """
+
+    label_query = """
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+
+        SELECT ?mint ?label (LANG(?label) AS ?lang) WHERE {{
+            VALUES ?mint {{ {values} }}
+            ?mint skos:prefLabel ?label .
+        }}
+    """
+
+    _iri = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:[^\s<>\"{}|\\^`]*$")
+
+    def __init__(self, execute, mint_map=dict, max_size=10000, ttl=7 * 24 * 60 * 60, negative_ttl=60 * 60, batch_size=200):
+        """
+        Initializes the resolver with an empty cache.
+
+        Parameters:
+            execute (callable): A function executing a SPARQL query and returning a QueryResult,
+                e.g. the `query` of a SparqlTransport connected to nomisma.org.
+            mint_map (callable): A function returning the current mint map, e.g. `Helper.get_mint_map`.
+            max_size (int): The maximum number of cached mints.
+            ttl (float): The number of seconds a resolved label is kept.
+            negative_ttl (float): The number of seconds a mint without a label is not looked up again.
+            batch_size (int): The maximum number of mints bound in one query.
+        """
+        self.execute = execute
+        self.mint_map = mint_map
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.batch_size = batch_size
+        self.stats = {"hits": 0, "negative_hits": 0, "lookups": 0, "queries": 0, "failures": 0}
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cached(self, uri, now):
+        """
+        Returns (True, label) for a cached mint, with None as the label of a negative entry, or (False, None).
+        """
+        entry = self._entries.get(uri)
+        if entry is None:
+            return False, None
+
+        label, expires_at = entry
+        if expires_at < now:
+            del self._entries[uri]
+            return False, None
+
+        self._entries.move_to_end(uri)
+        self.stats["negative_hits" if label is None else "hits"] += 1
+        return True, label
+
+    def _store(self, labels, now):
+        with self._lock:
+            for uri, label in labels.items():
+                self._entries[uri] = (label, now + (self.negative_ttl if label is None else self.ttl))
+                self._entries.move_to_end(uri)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _pick(labels):
+        """
+        Picks the English label of a mint, else one without a language tag, else any.
+        """
+        for label, lang in labels:
+            if lang and lang.lower().startswith("en"):
+                return label
+        for label, lang in labels:
+            if not lang:
+                return label
+        return labels[0][0]
+
+    def _lookup(self, uris):
+        """
+        Fetches the labels of mints with one query per batch.
+
+        Returns:
+            dict: Maps every mint that was looked up to its label, or to None if it has none.
+                Mints of a batch whose query failed are left out, so they are not cached.
+        """
+        found = {}
+        for start in range(0, len(uris), self.batch_size):
+            batch = uris[start:start + self.batch_size]
+            query = self.label_query.format(values=" ".join(f"<{uri}>" for uri in batch))
+
+            self.stats["queries"] += 1
+            try:
+                results = self.execute(query)
+            except Exception as error:
+                # the labels are only decoration, a failed lookup must not fail the search
+                self.stats["failures"] += 1
+                print(f"Could not resolve {len(batch)} mint labels: {error}")
+                continue
+
+            labels = {uri: [] for uri in batch}
+            for row in results.bindings:
+                if row.get("mint") in labels and row.get("label"):
+                    labels[row["mint"]].append((row["label"], row.get("lang")))
+
+            found.update((uri, self._pick(values) if values else None) for uri, values in labels.items())
+
+        return found
+
+    def resolve(self, uris):
+        """
+        Returns the labels of the given mints: from the mint map, from the cache, or fetched in one batched query.
+
+        Parameters:
+            uris (iterable): The mint URIs of a result page. Duplicates and empty values are ignored.
+
+        Returns:
+            dict: Maps each mint with a known label to it. Mints without a label are left out.
+        """
+        mint_map = self.mint_map()
+        labels = {}
+        missing = []
+        now = time.time()
+
+        with self._lock:
+            for uri in dict.fromkeys(uris):
+                if not uri or uri in labels:
+                    continue
+                if uri in mint_map:
+                    labels[uri] = mint_map[uri]
+                    continue
+
+                cached, label = self._cached(uri, now)
+                if not cached:
+                    missing.append(uri)
+                elif label is not None:
+                    labels[uri] = label
+
+        if missing:
+            invalid = [uri for uri in missing if not self._iri.match(uri)]
+            valid = [uri for uri in missing if self._iri.match(uri)]
+
+            self.stats["lookups"] += len(valid)
+            found = self._lookup(valid) if valid else {}
+            found.update(dict.fromkeys(invalid))
+
+            self._store(found, now)
+            labels.update((uri, label) for uri, label in found.items() if label is not None)
+
+        return labels
+
+    def snapshot(self):
+        """
+        Returns the counters of the resolver together with the size of its cache.
+        """
+        with self._lock:
+            return dict(self.stats, size=len(self._entries), max_size=self.max_size)
@@ -0,0 +1,272 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from services.FastJson import dumps, loads
+from services.SparqlUtils import query_key
+
+
+class QueryRow():
+    """
+    A single solution of a SPARQL SELECT query with plain string values.
+    Like rdflib's ResultRow, variables can be accessed as attributes, by name or by position,
+    and unbound variables evaluate to None.
+    """
+
+    __slots__ = ("_vars", "_binding")
+
+    def __init__(self, vars, binding):
+        self._vars = vars
+        self._binding = binding
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._binding.get(name)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            key = self._vars[key]
+        return self._binding.get(key)
+
+    def asdict(self):
+        return dict(self._binding)
+
+    def replace(self, **values):
+        """
+        Returns a copy of the row with the given variables bound to new values; None leaves a variable unbound.
+        """
+        binding = dict(self._binding)
+        vars = list(self._vars)
+        for name, value in values.items():
+            if name not in vars:
+                vars.append(name)
+            if value is None:
+                binding.pop(name, None)
+            else:
+                binding[name] = value
+        return QueryRow(vars, binding)
+
+
+class QueryResult():
+    """
+    The result of a SPARQL SELECT query, detached from rdflib so it can be cached and shared.
+
+    Attributes:
+        vars (list): The projected variable names.
+        bindings (list): One dictionary per solution, mapping each bound variable to its string value.
+    """
+
+    def __init__(self, vars, bindings):
+        self.vars = list(vars)
+        self.bindings = bindings
+
+    @classmethod
+    def from_rdflib(cls, result):
+        """
+        Converts an rdflib query result into a QueryResult.
+
+        Parameters:
+            result (rdflib.query.Result): The rdflib result of a SELECT query.
+
+        Returns:
+            QueryResult: The converted result.
+        """
+        vars = [str(var) for var in result.vars]
+        bindings = [
+            {var: str(value) for var, value in zip(vars, row) if value is not None}
+            for row in result
+        ]
+        return cls(vars, bindings)
+
+    @classmethod
+    def from_sparql_json(cls, payload):
+        """
+        Decodes a SPARQL JSON results document straight into plain string values.
+
+        Parameters:
+            payload (bytes): The application/sparql-results+json document of a SELECT query.
+
+        Returns:
+            QueryResult: The decoded result.
+        """
+        data = loads(payload)
+        bindings = [
+            {var: term["value"] for var, term in binding.items()}
+            for binding in data["results"]["bindings"]
+        ]
+        return cls(data["head"].get("vars", []), bindings)
+
+    def to_json(self):
+        return dumps({"vars": self.vars, "bindings": self.bindings}).decode("utf-8")
+
+    @classmethod
+    def from_json(cls, payload):
+        data = loads(payload)
+        return cls(data["vars"], data["bindings"])
+
+    def __len__(self):
+        return len(self.bindings)
+
+    def __iter__(self):
+        vars = self.vars
+        return (QueryRow(vars, binding) for binding in self.bindings)
+
+
+class QueryCache():
+    """
+    A two-tier cache for SPARQL query results, keyed by a hash of the normalized query text.
+
+    The first tier is an in-process LRU dictionary, the second an sqlite database on disk that is shared
+    between processes. Entries expire after `ttl` seconds; the disk tier is trimmed to `max_bytes` by
+    evicting the least recently used entries. Expired entries are kept for another `stale_ttl` seconds,
+    so a stale result can still be served while the endpoint is unavailable.
+
+    Attributes:
+        path (str): The path of the sqlite database, or None for a memory-only cache.
+        max_entries (int): The maximum number of results kept in memory.
+        ttl (float): The time to live of an entry in seconds.
+        max_bytes (int): The maximum total payload size of the disk tier.
+        stale_ttl (float): The number of seconds an expired entry is kept for stale reads.
+        stats (dict): Hit, miss and eviction counters.
+    """
+
+    def __init__(self, path=None, max_entries=256, ttl=3600, max_bytes=64 * 1024 * 1024, stale_ttl=0):
+        """
+        Initializes the cache and creates the sqlite database if necessary.
+
+        Parameters:
+            path (str): The path of the sqlite database, or None for a memory-only cache.
+            max_entries (int): The maximum number of results kept in memory.
+            ttl (float): The time to live of an entry in seconds.
+            max_bytes (int): The maximum total payload size of the disk tier.
+            stale_ttl (float): The number of seconds an expired entry is kept for stale reads.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "stale_hits": 0, "misses": 0, "memory_evictions": 0, "disk_evictions": 0}
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            """)
+            self._db.commit()
+
+    def get(self, query, allow_stale=False):
+        """
+        Looks up the cached result of a query.
+
+        Parameters:
+            query (str): The SPARQL query.
+            allow_stale (bool): Whether an expired entry that is still within `stale_ttl` may be returned.
+
+        Returns:
+            QueryResult: The cached result, or None if there is no fresh (or, with `allow_stale`, stale) entry.
+        """
+        key = query_key(query)
+        now = time.time()
+        oldest = now - self.stale_ttl if allow_stale else now
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires, result = entry
+                if expires > oldest:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits" if expires > now else "stale_hits"] += 1
+                    return result
+                if expires + self.stale_ttl <= now:
+                    del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT payload, expires FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > oldest:
+                    self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    result = QueryResult.from_json(row[0])
+                    self._remember(key, row[1], result)
+                    self.stats["disk_hits" if row[1] > now else "stale_hits"] += 1
+                    return result
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, query, result):
+        """
+        Stores the result of a query in both tiers.
+
+        Parameters:
+            query (str): The SPARQL query.
+            result (QueryResult): The result to store.
+        """
+        key = query_key(query)
+        now = time.time()
+        expires = now + self.ttl
+
+        with self._lock:
+            self._remember(key, expires, result)
+
+            if self._db is not None:
+                payload = result.to_json()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, payload, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), expires, now)
+                )
+                self._evict_disk(now)
+                self._db.commit()
+
+    def clear(self):
+        """
+        Removes every entry from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def _remember(self, key, expires, result):
+        """
+        Puts an entry into the memory tier and evicts the least recently used entries beyond `max_entries`.
+        """
+        self._memory[key] = (expires, result)
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def _evict_disk(self, now):
+        """
+        Deletes entries past their stale period and then the least recently used ones until the disk tier fits into `max_bytes`.
+        """
+        deleted = self._db.execute("DELETE FROM results WHERE expires <= ?", (now - self.stale_ttl,)).rowcount
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+        if total > self.max_bytes:
+            for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                total -= size
+                deleted += 1
+
+        self.stats["disk_evictions"] += deleted
@@ -0,0 +1,114 @@
+import unicodedata
+import pandas as pd
+
+
+def fold(text):
+    """
+    Folds a string for case- and diacritic-insensitive matching.
+
+    Parameters:
+        text (str): The string to fold.
+
+    Returns:
+        str: The lower-cased string with all combining marks removed.
+    """
+    decomposed = unicodedata.normalize("NFKD", str(text).casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+class NGramIndex():
+    """
+    An in-memory n-gram index over the searchable columns of a pandas DataFrame.
+
+    Every cell is folded once when the index is built. Each column keeps a posting list
+    per n-gram (lengths 1 to `n`) holding the positions of the rows that contain it, so a
+    substring lookup only touches the rows sharing the query's n-grams instead of
+    scanning the whole column.
+
+    Attributes:
+        n (int): The maximum n-gram length stored in the index.
+        texts (dict): Maps each indexed column to its list of folded cell values (None for empty cells).
+        postings (dict): Maps each indexed column to a dict of n-gram -> ascending list of row positions.
+    """
+
+    def __init__(self, pd_df, columns, n=3):
+        """
+        Builds the index for the given columns of a DataFrame.
+
+        Parameters:
+            pd_df (pd.DataFrame): The DataFrame to index.
+            columns (list): The columns to index. Columns missing from the DataFrame are skipped.
+            n (int): The maximum n-gram length.
+        """
+        self.n = n
+        self.texts = {}
+        self.postings = {}
+
+        for column in columns:
+            if column in pd_df.columns:
+                self._index_column(column, pd_df[column])
+
+    def _index_column(self, column, series):
+        """
+        Folds the values of a column and fills its posting lists.
+
+        Parameters:
+            column (str): The name of the column.
+            series (pd.Series): The values of the column.
+        """
+        texts = [None if pd.isna(value) else fold(value) for value in series]
+        postings = {}
+
+        for position, text in enumerate(texts):
+            if not text:
+                continue
+            grams = set()
+            for size in range(1, self.n + 1):
+                for start in range(len(text) - size + 1):
+                    grams.add(text[start:start + size])
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+
+        self.texts[column] = texts
+        self.postings[column] = postings
+
+    def lookup(self, column, query):
+        """
+        Returns the positions of all rows whose value in `column` contains `query`.
+
+        Parameters:
+            column (str): The column to search in.
+            query (str): The (unfolded) string to search for.
+
+        Returns:
+            list: The ascending row positions of all matching rows.
+        """
+        texts = self.texts.get(column)
+        if texts is None:
+            return []
+
+        folded = fold(query)
+        if not folded:
+            return [position for position, text in enumerate(texts) if text is not None]
+
+        postings = self.postings[column]
+
+        if len(folded) <= self.n:
+            return postings.get(folded, [])
+
+        grams = {folded[start:start + self.n] for start in range(len(folded) - self.n + 1)}
+        lists = []
+        for gram in grams:
+            posting = postings.get(gram)
+            if not posting:
+                return []
+            lists.append(posting)
+
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+
+        return [position for position in sorted(candidates) if folded in texts[position]]
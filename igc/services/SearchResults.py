@@ -0,0 +1,132 @@
+from services.QueryCache import QueryResult
+
+
+NO_IMAGE = "static/no_image.jpg"
+
+FIELDS = (
+    "type", "url", "thumbnailObverse", "thumbnailReverse", "descriptionObverse", "descriptionReverse",
+    "date", "maxDiameter", "id", "category", "weight", "location", "region"
+)
+
+
+def _bindings(results):
+    """
+    Returns the bindings of a QueryResult, or of any iterable of QueryRow objects, as plain dictionaries.
+    """
+    if isinstance(results, QueryResult):
+        return results.bindings
+    return [row.asdict() for row in results]
+
+
+def _floats(values):
+    return [float(value) if value else None for value in values]
+
+
+def _ids(values):
+    return [value.split("coin_id=")[1] if "coin_id=" in value else value for value in values]
+
+
+def search_columns(results, searchType, mint_labels):
+    """
+    Converts the rows of a coin search into one list of display values per field.
+    Every field is converted in a single pass over its column instead of field by field for every row.
+
+    Parameters:
+        results (QueryResult): The results of the search query, or an iterable of QueryRow objects.
+        searchType (str): The type of search that was performed.
+        mint_labels (dict): Maps mint URIs to their labels.
+
+    Returns:
+        dict: Maps each name in FIELDS to the list of its values, in row order.
+    """
+    bindings = _bindings(results)
+    count = len(bindings)
+
+    def column(name):
+        return [binding.get(name) for binding in bindings]
+
+    ids = _ids(column("id"))
+    is_coin = searchType == "NumismaticObject"
+
+    if is_coin:
+        category = column("type")
+    else:
+        category = ["TYPE" if searchType == "TypeSeriesItem" else None] * count
+
+    return {
+        "type": [searchType] * count,
+        "url": [value or None for value in column("url")],
+        "thumbnailObverse": [value or NO_IMAGE for value in column("thumbnailObverse")],
+        "thumbnailReverse": [value or NO_IMAGE for value in column("thumbnailReverse")],
+        "descriptionObverse": [value or None for value in column("descriptionObverse")],
+        "descriptionReverse": [value or None for value in column("descriptionReverse")],
+        "date": [value or None for value in column("date")],
+        "maxDiameter": _floats(column("maxDiameter")),
+        "id": ids,
+        "category": category,
+        "weight": _floats(column("weight")),
+        "location": [mint_labels.get(value) for value in column("mint")] if is_coin else ["TYPE"] * count,
+        "region": [None] * count if is_coin else ids
+    }
+
+
+def search_records(results, searchType, mint_labels):
+    """
+    Converts the rows of a coin search into the dictionaries sent to the frontend.
+
+    Parameters:
+        results (QueryResult): The results of the search query, or an iterable of QueryRow objects.
+        searchType (str): The type of search that was performed.
+        mint_labels (dict): Maps mint URIs to their labels.
+
+    Returns:
+        list: One dictionary per row, with the keys in FIELDS.
+    """
+    columns = search_columns(results, searchType, mint_labels)
+
+    return [dict(zip(FIELDS, values)) for values in zip(*(columns[field] for field in FIELDS))]
+
+
+def _encode(values):
+    """
+    Encodes a column compactly. Columns with at most half as many distinct values as rows are
+    dictionary-encoded. Otherwise a value that fills at least a tenth of a column without unbound
+    values (such as the image placeholder) is sent once as `default` and replaced by null in the rows.
+    """
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+
+    if len(counts) * 2 <= len(values):
+        codes = {value: code for code, value in enumerate(counts)}
+        return {"dictionary": list(counts), "codes": [codes[value] for value in values]}
+
+    default = max(counts, key=counts.get, default=None)
+    if default is not None and None not in counts and counts[default] * 10 >= len(values):
+        return {"default": default, "values": [None if value == default else value for value in values]}
+
+    return values
+
+
+def search_columnar(results, searchType, mint_labels):
+    """
+    Converts the rows of a coin search into a columnar document: one array per field instead of one
+    dictionary per row. Columns of repeated values (search type, categories, mint labels) are dictionary-encoded
+    as a list of distinct values and one index per row; a frequent value in an otherwise distinct column
+    (the image placeholder) is sent once as the column's default.
+
+    Parameters:
+        results (QueryResult): The results of the search query, or an iterable of QueryRow objects.
+        searchType (str): The type of search that was performed.
+        mint_labels (dict): Maps mint URIs to their labels.
+
+    Returns:
+        dict: The field names, the number of rows and the (possibly encoded) column of every field.
+    """
+    columns = search_columns(results, searchType, mint_labels)
+
+    return {
+        "fields": list(FIELDS),
+        "length": len(columns["type"]),
+        "columns": {field: _encode(columns[field]) for field in FIELDS}
+    }
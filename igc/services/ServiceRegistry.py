@@ -0,0 +1,148 @@
+import threading
+import time
+
+
+class LazyService():
+    """
+    A service that is constructed on first use or by a background warm-up, whichever comes first.
+    The factory runs at most once at a time; callers arriving while it runs wait for it.
+    A failed construction is retried by the next caller.
+
+    Attributes:
+        name (str): The name of the service.
+        factory (callable): The function constructing the service, without arguments.
+        state (str): "pending", "loading", "ready" or "failed".
+        error (str): The error of the last failed construction, or None.
+        seconds (float): The duration of the last construction, or None.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.state = "pending"
+        self.error = None
+        self.seconds = None
+
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def peek(self):
+        """
+        Returns the instance if it is constructed, without constructing it.
+        """
+        return self._instance
+
+    def get(self):
+        """
+        Returns the instance, constructing it first if necessary.
+
+        Returns:
+            The instance of the service.
+        """
+        if self._instance is not None:
+            return self._instance
+
+        with self._lock:
+            if self._instance is None:
+                self.state = "loading"
+                started = time.monotonic()
+                try:
+                    instance = self.factory()
+                except Exception as error:
+                    self.state = "failed"
+                    self.error = f"{type(error).__name__}: {error}"
+                    raise
+                finally:
+                    self.seconds = round(time.monotonic() - started, 3)
+
+                self._instance = instance
+                self.state = "ready"
+                self.error = None
+
+        return self._instance
+
+    def status(self):
+        return {"state": self.state, "error": self.error, "seconds": self.seconds}
+
+
+class ServiceRegistry():
+    """
+    The lazily constructed services of the application. Registering a service only records its factory,
+    so importing the modules that use it costs nothing; `warm` constructs the services in a background
+    thread so that they are usually ready before the first request needs them.
+
+    Attributes:
+        services (dict): Maps the name of every registered service to its LazyService.
+    """
+
+    def __init__(self):
+        self.services = {}
+        self._warming = None
+
+    def register(self, name, factory):
+        """
+        Registers the factory of a service.
+
+        Parameters:
+            name (str): The name of the service.
+            factory (callable): The function constructing the service, without arguments.
+        """
+        self.services[name] = LazyService(name, factory)
+
+    def get(self, name):
+        """
+        Returns a service, constructing it first if necessary.
+
+        Parameters:
+            name (str): The name of the service.
+
+        Returns:
+            The instance of the service.
+        """
+        return self.services[name].get()
+
+    def peek(self, name):
+        """
+        Returns a service if it is registered and constructed, else None.
+        """
+        service = self.services.get(name)
+        return service.peek() if service is not None else None
+
+    def warm(self):
+        """
+        Constructs every registered service, in registration order, in a daemon thread.
+        A service that fails is reported in `status` and constructed again on its first use.
+
+        Returns:
+            threading.Thread: The warm-up thread.
+        """
+        if self._warming is not None:
+            return self._warming
+
+        def run():
+            for service in self.services.values():
+                try:
+                    service.get()
+                except Exception as error:
+                    print(f"Could not load the service {service.name}: {error}")
+
+        self._warming = threading.Thread(target=run, name="service-warm-up", daemon=True)
+        self._warming.start()
+        return self._warming
+
+    @property
+    def ready(self):
+        return all(service.ready for service in self.services.values())
+
+    def status(self):
+        """
+        Returns the state of every service.
+
+        Returns:
+            dict: Maps the name of every service to its state, last error and construction time.
+        """
+        return {name: service.status() for name, service in self.services.items()}
@@ -0,0 +1,531 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+from services.CustomDataFrame import CustomDataFrame, Dataframes
+from services.SearchIndex import fold
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+MAGIC = b"IGCVOC01"
+NONE = 0xFFFFFFFF
+
+
+def _align(size):
+    return (size + 7) // 8 * 8
+
+
+class _StringTable():
+    """
+    Collects the distinct strings of the file while it is written.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.encoded = []
+
+    def add(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.encoded)
+            self.encoded.append(text.encode("utf-8"))
+        return string_id
+
+    def ids_of(self, values):
+        return np.array([NONE if value is None else self.add(value) for value in values], dtype=np.uint32)
+
+
+def _column(series, strings):
+    """
+    Encodes a column: numbers as a typed array, strings as ids into the string arena.
+    Object columns holding anything else than strings are stored as JSON documents.
+
+    Returns:
+        tuple: The kind of the column ("int", "float", "bool", "str" or "json") and its array.
+    """
+    kind = series.dtype.kind
+
+    if kind in "iu":
+        return "int", series.to_numpy(dtype=np.int64)
+    if kind == "f":
+        return "float", series.to_numpy(dtype=np.float64)
+    if kind == "b":
+        return "bool", series.to_numpy(dtype=np.uint8)
+
+    values = [None if pd.isna(value) else value for value in series]
+    if all(value is None or isinstance(value, str) for value in values):
+        return "str", strings.ids_of(values)
+    return "json", strings.ids_of([None if value is None else json.dumps(value) for value in values])
+
+
+def write(path, dataframes, mint_map):
+    """
+    Writes the vocabulary tables, their n-gram indexes and the mint map into one file that can be memory-mapped.
+
+    All strings are stored once in a UTF-8 arena addressed through an offset array. Every column is an array of
+    numbers or of string ids, every indexed column also has the ids of its folded cell values and its posting
+    lists (the sorted n-grams, their offsets and the concatenated row positions). The mint map is stored as
+    sorted key ids next to the ids of the labels. The file is written to a temporary path and moved into place.
+
+    Parameters:
+        path (str): The path of the file.
+        dataframes (Dataframes): The loaded and indexed vocabulary tables.
+        mint_map (dict): A dictionary mapping mint IDs to mint labels.
+
+    Returns:
+        int: The size of the file in bytes.
+    """
+    strings = _StringTable()
+    arrays = {}
+    tables = {}
+
+    for table, custom_df in dataframes.dataframes.items():
+        index = custom_df.index
+        columns = []
+
+        for column in custom_df.df.columns:
+            kind, arrays[f"{table}/{column}"] = _column(custom_df.df[column], strings)
+            columns.append([column, kind])
+
+        for column, texts in index.texts.items():
+            postings = index.postings[column]
+            grams = sorted(postings)
+
+            arrays[f"{table}/{column}/folded"] = strings.ids_of(texts)
+            arrays[f"{table}/{column}/grams"] = strings.ids_of(grams)
+            arrays[f"{table}/{column}/offsets"] = np.cumsum([0] + [len(postings[gram]) for gram in grams], dtype=np.uint32)
+            arrays[f"{table}/{column}/positions"] = np.fromiter(
+                (position for gram in grams for position in postings[gram]), dtype=np.uint32
+            )
+
+        tables[table] = {"rows": len(custom_df), "columns": columns, "indexed": list(index.texts), "n": index.n}
+
+    mints = sorted(mint_map.items())
+    arrays["mints/keys"] = strings.ids_of([mint for mint, _ in mints])
+    arrays["mints/values"] = strings.ids_of([label for _, label in mints])
+
+    arena = b"".join(strings.encoded)
+    arrays["strings/offsets"] = np.cumsum([0] + [len(encoded) for encoded in strings.encoded], dtype=np.uint64)
+
+    sections = {"strings/arena": [0, "u1", len(arena)]}
+    position = _align(len(arena))
+    for name, array in arrays.items():
+        sections[name] = [position, array.dtype.str, len(array)]
+        position = _align(position + array.nbytes)
+
+    header = json.dumps({
+        "built_at": time.time(),
+        "tables": tables,
+        "mints": len(mints),
+        "strings": len(strings.encoded),
+        "sections": sections
+    }).encode("utf-8")
+    header += b" " * (_align(len(header)) - len(header))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        file.write(arena + b"\0" * (_align(len(arena)) - len(arena)))
+        for array in arrays.values():
+            data = array.tobytes()
+            file.write(data + b"\0" * (_align(len(data)) - len(data)))
+        size = file.tell()
+    os.replace(tmp_path, path)
+
+    return size
+
+
+class _Strings(Sequence):
+    """
+    The strings of the arena, decoded on access.
+    """
+
+    def __init__(self, buffer, arena, offsets):
+        self._buffer = buffer
+        self._arena = arena
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, string_id):
+        start = self._arena + int(self._offsets[string_id])
+        end = self._arena + int(self._offsets[string_id + 1])
+        return self._buffer[start:end].decode("utf-8")
+
+    def get(self, string_id):
+        return None if string_id == NONE else self[string_id]
+
+
+class _StringView(Sequence):
+    """
+    A sequence of strings given by an array of string ids, e.g. the sorted n-grams of a column.
+    """
+
+    def __init__(self, strings, ids):
+        self._strings = strings
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, position):
+        return self._strings[int(self._ids[position])]
+
+
+class _Records(Sequence):
+    """
+    The rows of a shared table as dictionaries, decoded on access.
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return self._table.rows
+
+    def __getitem__(self, position):
+        return self._table.record(position)
+
+
+class SharedMintMap(Mapping):
+    """
+    A read-only dictionary mapping mint IDs to mint labels, backed by the sorted arrays of the shared file.
+    """
+
+    def __init__(self, strings, keys, values):
+        self._strings = strings
+        self._keys = _StringView(strings, keys)
+        self._values = values
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __getitem__(self, mint):
+        position = bisect_left(self._keys, mint)
+        if position == len(self._keys) or self._keys[position] != mint:
+            raise KeyError(mint)
+        return self._strings[int(self._values[position])]
+
+
+class SharedDataFrame(CustomDataFrame):
+    """
+    A vocabulary table in the shared file, searched like a CustomDataFrame without holding a copy of the table.
+    Cells, folded texts and posting lists are read from the memory-mapped arrays; only the rows that are
+    returned are decoded into dictionaries.
+
+    Attributes:
+        columns (list): The names of the columns.
+        rows (int): The number of rows.
+        records (Sequence): The rows as dictionaries, decoded on access.
+    """
+
+    def __init__(self, strings, array, table, meta):
+        """
+        Initializes the table from the arrays of the shared file.
+
+        Parameters:
+            strings (Sequence): The strings of the arena.
+            array (callable): Returns the array of a section by name.
+            table (str): The name of the table.
+            meta (dict): The description of the table in the file header.
+        """
+        self.columns = [column for column, _ in meta["columns"]]
+        self.rows = meta["rows"]
+        self.records = _Records(self)
+        self.n = meta["n"]
+
+        self._strings = strings
+        self._kinds = dict(meta["columns"])
+        self._cells = {column: array(f"{table}/{column}") for column in self.columns}
+        self._index = {
+            column: (
+                array(f"{table}/{column}/folded"),
+                _StringView(strings, array(f"{table}/{column}/grams")),
+                array(f"{table}/{column}/offsets"),
+                array(f"{table}/{column}/positions")
+            )
+            for column in meta["indexed"]
+        }
+
+    def _value(self, column, position):
+        value = self._cells[column][position]
+        kind = self._kinds[column]
+
+        if kind == "int":
+            return int(value)
+        if kind == "float":
+            return None if np.isnan(value) else float(value)
+        if kind == "bool":
+            return bool(value)
+        if kind == "json":
+            return None if value == NONE else json.loads(self._strings[int(value)])
+        return self._strings.get(int(value))
+
+    def record(self, position):
+        """
+        Decodes a row into the same dictionary as in `CustomDataFrame.records`.
+        """
+        return {column: self._value(column, position) for column in self.columns}
+
+    def _posting(self, column, gram):
+        _, grams, offsets, positions = self._index[column]
+        index = bisect_left(grams, gram)
+        if index == len(grams) or grams[index] != gram:
+            return positions[:0]
+        return positions[offsets[index]:offsets[index + 1]]
+
+    def _lookup(self, column, query):
+        """
+        Returns the positions of the rows whose indexed `column` contains `query`, like `NGramIndex.lookup`.
+        """
+        folded_ids = self._index[column][0]
+        folded = fold(query)
+
+        if not folded:
+            return np.flatnonzero(folded_ids != NONE).tolist()
+        if len(folded) <= self.n:
+            return self._posting(column, folded).tolist()
+
+        lists = []
+        for gram in {folded[start:start + self.n] for start in range(len(folded) - self.n + 1)}:
+            posting = self._posting(column, gram)
+            if not len(posting):
+                return []
+            lists.append(posting)
+
+        lists.sort(key=len)
+        candidates = lists[0]
+        for posting in lists[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if not len(candidates):
+                return []
+
+        strings = self._strings
+        return [int(position) for position in candidates if folded in strings[int(folded_ids[position])]]
+
+    def _positions(self, column, query):
+        if column in self._index:
+            return self._lookup(column, query)
+
+        folded = query.casefold()
+        return [
+            position for position in range(self.rows)
+            if (value := self._value(column, position)) is not None and folded in str(value).casefold()
+        ]
+
+    def _rank(self, column, position, folded_query):
+        if column in self._index:
+            text = self._strings[int(self._index[column][0][position])]
+        else:
+            text = fold(self._value(column, position))
+
+        if text == folded_query:
+            tier = 0
+        elif text.startswith(folded_query):
+            tier = 1
+        else:
+            tier = 2
+
+        return (tier, len(text))
+
+
+class SharedVocabulary():
+    """
+    The vocabulary tables and the mint map, read from a file that every worker process maps read-only.
+    The operating system keeps a single copy of the mapped pages, so memory no longer grows with the number of
+    workers. Offers the `get` and `column_mapping` of Dataframes and the `get_mint_map` of Helper.
+
+    A file written again (e.g. by `manage.py refresh_vocabulary`) is mapped by the running processes
+    the next time they check it, at most every `check_interval` seconds. Once `is_outdated` reports the mapped
+    file as outdated, one process writes it again in a background thread while the others keep using the old one.
+
+    Attributes:
+        path (str): The path of the shared file.
+        check_interval (float): The minimum number of seconds between two checks of the file.
+        dataframes (dict): Maps the name of every table to its SharedDataFrame.
+        built_at (float): The time the file was written.
+    """
+
+    column_mapping = Dataframes.column_mapping
+    tablenames = Dataframes.tablenames
+
+    # the minimum number of seconds between two attempts of the same process to write an outdated file again
+    RETRY_INTERVAL = 15 * 60
+
+    def __init__(self, path, check_interval=30, build=None, is_outdated=None):
+        """
+        Maps the shared file.
+
+        Parameters:
+            path (str): The path of the shared file.
+            check_interval (float): The minimum number of seconds between two checks of the file.
+            build (callable): Returns the Dataframes and the mint map to write into the file, or None to never write it.
+            is_outdated (callable): Receives the time the mapped file was written and tells whether it has to be
+                written again, or None if it never gets outdated.
+        """
+        self.path = str(path)
+        self.check_interval = check_interval
+        self._build = build
+        self._is_outdated = is_outdated
+        self._checked_at = time.monotonic()
+        self._identity = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._attempted_at = None
+
+        self._map()
+        self.rebuild_in_background()
+
+    @classmethod
+    def open(cls, path, build, check_interval=30, is_outdated=None):
+        """
+        Maps the shared file, writing it first if it does not exist. When several processes start at the same
+        time, one of them writes the file while the others wait for it. An outdated file is mapped right away
+        and written again in the background.
+
+        Parameters:
+            path (str): The path of the shared file.
+            build (callable): Returns the Dataframes and the mint map to write into the file.
+            check_interval (float): The minimum number of seconds between two checks of the file.
+            is_outdated (callable): Receives the time the file was written and tells whether it has to be written again.
+
+        Returns:
+            SharedVocabulary: The mapped vocabulary.
+        """
+        path = str(path)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(f"{path}.lock", "w") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not os.path.exists(path):
+                    write(path, *build())
+
+        return cls(path, check_interval, build, is_outdated)
+
+    def _map(self):
+        """
+        Maps the current file and replaces the tables and the mint map in memory.
+        """
+        with open(self.path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a shared vocabulary file")
+
+        (header_size,) = struct.unpack_from("<Q", buffer, len(MAGIC))
+        data = len(MAGIC) + 8 + header_size
+        header = json.loads(buffer[len(MAGIC) + 8:data])
+
+        def array(name):
+            offset, dtype, count = header["sections"][name]
+            return np.frombuffer(buffer, dtype=dtype, count=count, offset=data + offset)
+
+        strings = _Strings(buffer, data + header["sections"]["strings/arena"][0], array("strings/offsets"))
+
+        self.dataframes = {table: SharedDataFrame(strings, array, table, meta) for table, meta in header["tables"].items()}
+        self.mint_map = SharedMintMap(strings, array("mints/keys"), array("mints/values"))
+        self.built_at = header["built_at"]
+        self._identity = (stat.st_ino, stat.st_mtime_ns)
+
+    def _check_file(self):
+        """
+        Maps a file written again by another process, at most once every `check_interval` seconds.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+
+        if (stat.st_ino, stat.st_mtime_ns) != self._identity:
+            self._map()
+        self.rebuild_in_background()
+
+    def rebuild_in_background(self):
+        """
+        Writes an outdated file again in a daemon thread. At most one process writes it at a time,
+        and a failed attempt is not retried for RETRY_INTERVAL seconds.
+        """
+        if self._build is None or self._is_outdated is None or not self._is_outdated(self.built_at):
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if self._rebuilding or (self._attempted_at is not None and now - self._attempted_at < self.RETRY_INTERVAL):
+                return
+            self._rebuilding = True
+            self._attempted_at = now
+
+        threading.Thread(target=self._rebuild, name="shared-vocabulary-rebuild", daemon=True).start()
+
+    def _rebuild(self):
+        """
+        Writes the file again unless another process is already doing so, then maps the new file.
+        """
+        lock_file = open(f"{self.path}.lock", "w")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+
+            # another process may have written the file in the meantime; it is mapped with the next check
+            stat = os.stat(self.path)
+            if (stat.st_ino, stat.st_mtime_ns) != self._identity:
+                return
+
+            write(self.path, *self._build())
+            self._map()
+        except Exception as error:
+            print(f"Could not write the shared vocabulary file: {error}")
+        finally:
+            lock_file.close()
+            self._rebuilding = False
+
+    def get(self, tablename):
+        """
+        Retrieves the shared table with the specified name.
+
+        Parameters:
+            tablename (str): The name of the table to retrieve.
+
+        Returns:
+            SharedDataFrame: The table.
+        """
+        self._check_file()
+        return self.dataframes[tablename]
+
+    def get_mint_map(self):
+        """
+        Returns the shared mint map.
+
+        Returns:
+        Mapping: A read-only dictionary mapping mint IDs to mint labels.
+        """
+        self._check_file()
+        return self.mint_map
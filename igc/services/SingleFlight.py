@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+
+class _Call():
+    """
+    An execution in flight that other callers with the same key can wait on.
+    """
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight():
+    """
+    Coalesces concurrent calls with the same key: the first caller executes the function, every caller that
+    arrives while it is still running waits for it and receives the same result (or exception).
+    Nothing is remembered once the execution has finished; caching is left to the caller.
+
+    Attributes:
+        stats (dict): The number of calls, of executions and of calls that were coalesced into another execution.
+    """
+
+    def __init__(self):
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self):
+        """
+        Returns the number of executions currently running.
+        """
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+    def do(self, key, function):
+        """
+        Executes `function`, unless a call with the same key is already running, in which case its result is shared.
+
+        Parameters:
+            key (str): The key identifying equivalent calls.
+            function (callable): The function to execute, without arguments.
+
+        Returns:
+            The result of the function.
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["executions"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, function):
+        """
+        Awaits `function()` like `do`, coalescing concurrent calls with the same key on the running event loop.
+        The work runs in a task of its own, so a caller that is cancelled (e.g. because its client disconnected)
+        stops waiting without cancelling the work the other callers are waiting for.
+
+        Parameters:
+            key (str): The key identifying equivalent calls.
+            function (callable): A function without arguments returning the awaitable to execute.
+
+        Returns:
+            The result of the awaitable.
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            self.stats["calls"] += 1
+            task = self._async_calls.get((loop, key))
+            if task is None:
+                task = self._async_calls[(loop, key)] = asyncio.ensure_future(function())
+                task.add_done_callback(lambda done: self._finish(loop, key, done))
+                self.stats["executions"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        return await asyncio.shield(task)
+
+    def _finish(self, loop, key, task):
+        """
+        Forgets a finished task and retrieves its exception, so it is not reported as never retrieved
+        when every caller stopped waiting for it.
+        """
+        with self._lock:
+            if self._async_calls.get((loop, key)) is task:
+                del self._async_calls[(loop, key)]
+
+        if not task.cancelled():
+            task.exception()
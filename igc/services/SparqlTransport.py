@@ -0,0 +1,471 @@
+import asyncio
+import random
+import re
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from io import BytesIO
+
+import requests
+from requests.adapters import HTTPAdapter
+from rdflib.query import Result
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from services.CircuitBreaker import CircuitBreaker
+from services.QueryCache import QueryResult, QueryRow
+from services.SparqlUtils import split_prologue
+
+
+class EndpointUnavailable(Exception):
+    """
+    Raised when the endpoint could not answer a query: no free slot within the queue deadline,
+    connection errors, timeouts or 5xx/429 responses that persisted through all retries.
+    """
+
+
+class SparqlTransport():
+    """
+    The HTTP transport used to send SPARQL queries to a remote endpoint.
+
+    All requests go through one pooled keep-alive session. The number of concurrent requests is
+    bounded by a semaphore, every request has connect and read timeouts, and read-only queries
+    (SELECT/ASK) are retried with exponential backoff on connection errors, timeouts and 5xx/429 responses.
+    A request that cannot get a slot within `queue_timeout` seconds is rejected instead of queueing indefinitely,
+    and a circuit breaker stops sending requests for a while after repeated failures, so callers fail fast
+    while the endpoint is down or overloaded.
+    The same policy is available for asyncio callers through `aquery`, which uses a non-blocking httpx client.
+
+    Attributes:
+        endpoint (str): The SPARQL endpoint URL.
+        pool_size (int): The number of keep-alive connections kept to the endpoint.
+        max_concurrent (int): The maximum number of requests in flight at the same time.
+        timeout (tuple): The connect and read timeouts in seconds.
+        retries (int): The number of retries for read-only queries.
+        backoff (float): The base delay of the exponential backoff in seconds.
+        queue_timeout (float): The maximum number of seconds a request waits for a free slot.
+        breaker (CircuitBreaker): The circuit breaker guarding the endpoint.
+        session (requests.Session): The pooled HTTP session.
+    """
+
+    accept = "application/sparql-results+xml"
+    json_accept = "application/sparql-results+json"
+    _results_ns = "{http://www.w3.org/2005/sparql-results#}"
+
+    def __init__(self, endpoint, pool_size=10, max_concurrent=8, connect_timeout=5, read_timeout=60, retries=2, backoff=0.5,
+                 queue_timeout=10, failure_threshold=5, reset_timeout=30):
+        """
+        Initializes the transport and its connection pool.
+
+        Parameters:
+            endpoint (str): The SPARQL endpoint URL.
+            pool_size (int): The number of keep-alive connections kept to the endpoint.
+            max_concurrent (int): The maximum number of requests in flight at the same time.
+            connect_timeout (float): The connect timeout in seconds.
+            read_timeout (float): The read timeout in seconds.
+            retries (int): The number of retries for read-only queries.
+            backoff (float): The base delay of the exponential backoff in seconds.
+            queue_timeout (float): The maximum number of seconds a request waits for a free slot.
+            failure_threshold (int): The number of consecutive failed requests that open the circuit breaker.
+            reset_timeout (float): The number of seconds the circuit breaker stays open.
+        """
+        self.endpoint = endpoint
+        self.pool_size = pool_size
+        self.max_concurrent = max_concurrent
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._async_states = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "queued": 0,
+            "rejected": 0,
+            "wait_seconds": 0.0,
+            "request_seconds": 0.0
+        }
+
+    def stats(self):
+        """
+        Returns the usage counters of the transport together with its pool configuration.
+
+        Returns:
+            dict: A snapshot of the counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+
+        stats.update(pool_size=self.pool_size, max_concurrent=self.max_concurrent, breaker=self.breaker.snapshot())
+        return stats
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    @staticmethod
+    def is_read_only(query):
+        """
+        Checks whether a query is a SELECT or ASK query and can therefore be retried safely.
+
+        Parameters:
+            query (str): The SPARQL query.
+
+        Returns:
+            bool: True for SELECT and ASK queries.
+        """
+        _, body = split_prologue(query)
+        return re.match(r"(SELECT|ASK)\b", body, re.IGNORECASE) is not None
+
+    def post(self, query, accept=None, stream=False, timeout=None, read_timeout=None):
+        """
+        Sends a query to the endpoint, waiting for a free slot and retrying read-only queries.
+
+        Parameters:
+            query (str): The SPARQL query.
+            accept (str): The requested result format, defaults to SPARQL XML.
+            stream (bool): Whether to return before the response body has been read.
+                The response then holds its concurrency slot until it is closed.
+            timeout (float): The number of seconds the request may take in total, including the wait for a slot
+                and the retries, or None for no limit beyond the timeouts of the transport.
+            read_timeout (float): The read timeout of this request in seconds, e.g. for a long-running bulk query,
+                or None for the read timeout of the transport.
+
+        Returns:
+            requests.Response: The successful response.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open.
+            EndpointUnavailable: If the endpoint could not answer the query.
+            requests.HTTPError: If the endpoint rejected the query with a 4xx response.
+        """
+        self.breaker.allow()
+        try:
+            attempts = 1 + (self.retries if self.is_read_only(query) else 0)
+            deadline = time.monotonic() + timeout if timeout is not None else None
+
+            for attempt in range(attempts):
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                try:
+                    response = self._post_once(query, accept or self.accept, stream, deadline, read_timeout)
+                    if response.status_code < 500 and response.status_code != 429:
+                        self.breaker.record_success()
+                        if response.status_code >= 400:
+                            # the error body is read before closing, so a streamed request gives its slot back
+                            response.content
+                            response.close()
+                            response.raise_for_status()
+                        return response
+                    if self._last_attempt(attempt, attempts, delay, deadline):
+                        response.close()
+                        self._fail(f"The endpoint answered with status {response.status_code}")
+                    response.close()
+                except (requests.ConnectionError, requests.Timeout) as error:
+                    if self._last_attempt(attempt, attempts, delay, deadline):
+                        self._fail(str(error), error)
+                except requests.HTTPError:
+                    self._count("failures")
+                    raise
+
+                self._count("retries")
+                time.sleep(delay)
+        except (EndpointUnavailable, requests.HTTPError):
+            raise
+        except requests.RequestException as error:
+            # e.g. a broken chunked encoding: the endpoint failed, but not in a way that is retried
+            self._fail(str(error) or type(error).__name__, error)
+        except BaseException as error:
+            self._settle(error)
+            raise
+
+    @staticmethod
+    def _last_attempt(attempt, attempts, delay, deadline):
+        """
+        Checks whether a failed attempt is the last one: either the retries are used up or the next attempt
+        would only start after the deadline.
+        """
+        return attempt == attempts - 1 or (deadline is not None and time.monotonic() + delay >= deadline)
+
+    def _settle(self, error):
+        """
+        Records the outcome of a request that ended with an exception the retry loop does not handle, so a
+        half-open circuit breaker never waits forever for the result of its trial call. Errors count as failures,
+        while cancellations and interpreter exits only give the trial up.
+        """
+        if isinstance(error, Exception):
+            self._count("failures")
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+
+    def _fail(self, message, cause=None):
+        """
+        Records a failed request and raises EndpointUnavailable.
+        """
+        self._count("failures")
+        self.breaker.record_failure()
+        raise EndpointUnavailable(message) from cause
+
+    def _reject(self, queue_timeout=None):
+        """
+        Records a request that did not get a slot within the queue deadline and raises EndpointUnavailable.
+        A full queue means the endpoint is too slow, so it counts as a failure for the circuit breaker.
+        """
+        self._count("rejected")
+        self.breaker.record_failure()
+        raise EndpointUnavailable(f"No free connection to the endpoint within {round(queue_timeout if queue_timeout is not None else self.queue_timeout, 3)} seconds")
+
+    def _post_once(self, query, accept, stream, deadline=None, read_timeout=None):
+        """
+        Performs a single request while holding one of the concurrency slots.
+        With `stream`, the slot is only given back when the returned response is closed.
+        With a `deadline` (a time.monotonic() value), the wait for a slot and the connect and read timeouts
+        are shortened so that the request does not outlast it. A `read_timeout` replaces the one of the transport.
+        """
+        started = time.monotonic()
+        queue_timeout = self.queue_timeout if deadline is None else max(min(self.queue_timeout, deadline - started), 0)
+        if not self._slots.acquire(blocking=False):
+            self._count("queued")
+            if not self._slots.acquire(timeout=queue_timeout):
+                self._reject(queue_timeout)
+        waited = time.monotonic() - started
+
+        timeout = self.timeout if read_timeout is None else (self.timeout[0], read_timeout)
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0.001)
+            timeout = tuple(min(part, remaining) for part in timeout)
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["wait_seconds"] += waited
+            self._stats["in_flight"] += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                with self._lock:
+                    self._stats["in_flight"] -= 1
+                    self._stats["request_seconds"] += time.monotonic() - started - waited
+                self._slots.release()
+
+        try:
+            response = self.session.post(
+                self.endpoint,
+                data={"query": query},
+                headers={"Accept": accept},
+                timeout=timeout,
+                stream=stream
+            )
+        except BaseException:
+            release()
+            raise
+
+        if not stream:
+            release()
+            return response
+
+        # a streamed body is still being received after the headers, so the slot is held until the response is closed
+        close = response.close
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+
+        response.close = close_and_release
+        return response
+
+    @staticmethod
+    def _decode(content, content_type):
+        """
+        Decodes a SELECT result: SPARQL JSON directly into plain values, any other format through rdflib.
+        """
+        if "json" in (content_type or ""):
+            return QueryResult.from_sparql_json(content)
+        return QueryResult.from_rdflib(Result.parse(BytesIO(content), format="xml"))
+
+    def query(self, query, timeout=None, read_timeout=None):
+        """
+        Executes a SELECT query and returns its results.
+        The results are requested as SPARQL JSON, which is decoded without building rdflib terms.
+
+        Parameters:
+            query (str): The SPARQL query.
+            timeout (float): The number of seconds the request may take in total, or None.
+            read_timeout (float): The read timeout of the request in seconds, or None for the one of the transport.
+
+        Returns:
+            QueryResult: The results of the query.
+        """
+        response = self.post(query, accept=self.json_accept, timeout=timeout, read_timeout=read_timeout)
+        return self._decode(response.content, response.headers.get("Content-Type"))
+
+    def stream(self, query):
+        """
+        Executes a SELECT query and returns its rows, which are parsed while the response is still being received.
+        The SPARQL XML result document is parsed incrementally, so memory stays flat for large results.
+        The request is sent right away, so a failing endpoint raises here instead of in the middle of the rows.
+
+        Parameters:
+            query (str): The SPARQL query.
+
+        Returns:
+            generator: One QueryRow per solution, as soon as it has been parsed. Closing the generator closes the response.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open.
+            EndpointUnavailable: If the endpoint could not answer the query.
+            requests.HTTPError: If the endpoint rejected the query with a 4xx response.
+        """
+        rows = self._rows(self.post(query, stream=True))
+        # entering the generator puts it inside its try block, so closing it closes the response even before the first row
+        next(rows)
+        return rows
+
+    def _rows(self, response):
+        ns = self._results_ns
+
+        try:
+            response.raw.decode_content = True
+            yield
+
+            vars = []
+            for event, element in ElementTree.iterparse(response.raw, events=("end",)):
+                if element.tag == ns + "variable":
+                    vars.append(element.get("name"))
+                elif element.tag == ns + "result":
+                    binding = {}
+                    for child in element:
+                        value = child[0].text if len(child) else None
+                        binding[child.get("name")] = value if value is not None else ""
+                    element.clear()
+                    yield QueryRow(vars, binding)
+        finally:
+            response.close()
+
+    def _async_state(self):
+        """
+        Returns the httpx client and the asyncio semaphore of the running event loop, creating them on first use.
+        Both are bound to the loop they were created in, and `async_to_sync` runs every call in a new loop,
+        so each loop gets its own pair. The pairs of loops that have been closed are dropped.
+        """
+        if httpx is None:
+            raise RuntimeError("The async SPARQL transport requires the httpx package.")
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._async_states.get(loop)
+            if state is None:
+                for closed in [other for other in self._async_states if other.is_closed()]:
+                    del self._async_states[closed]
+
+                connect_timeout, read_timeout = self.timeout
+                state = self._async_states[loop] = (
+                    httpx.AsyncClient(
+                        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                        limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                    ),
+                    asyncio.Semaphore(self.max_concurrent)
+                )
+
+        return state
+
+    async def apost(self, query, accept=None):
+        """
+        Sends a query to the endpoint without blocking the event loop.
+        Concurrency limits, timeouts and retries follow the same rules as `post`.
+
+        Parameters:
+            query (str): The SPARQL query.
+            accept (str): The requested result format, defaults to SPARQL XML.
+
+        Returns:
+            httpx.Response: The successful response.
+        """
+        client, slots = self._async_state()
+        self.breaker.allow()
+        try:
+            attempts = 1 + (self.retries if self.is_read_only(query) else 0)
+
+            for attempt in range(attempts):
+                try:
+                    started = time.monotonic()
+                    if slots.locked():
+                        self._count("queued")
+                        try:
+                            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+                        except asyncio.TimeoutError:
+                            self._reject()
+                    else:
+                        await slots.acquire()
+                    try:
+                        waited = time.monotonic() - started
+                        with self._lock:
+                            self._stats["requests"] += 1
+                            self._stats["wait_seconds"] += waited
+                            self._stats["in_flight"] += 1
+                            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+                        try:
+                            response = await client.post(self.endpoint, data={"query": query}, headers={"Accept": accept or self.accept})
+                        finally:
+                            with self._lock:
+                                self._stats["in_flight"] -= 1
+                                self._stats["request_seconds"] += time.monotonic() - started - waited
+                    finally:
+                        slots.release()
+
+                    if response.status_code < 500 and response.status_code != 429:
+                        self.breaker.record_success()
+                        response.raise_for_status()
+                        return response
+                    if attempt == attempts - 1:
+                        self._fail(f"The endpoint answered with status {response.status_code}")
+                except httpx.TransportError as error:
+                    if attempt == attempts - 1:
+                        self._fail(str(error) or type(error).__name__, error)
+                except httpx.HTTPStatusError:
+                    self._count("failures")
+                    raise
+
+                self._count("retries")
+                await asyncio.sleep(self.backoff * (2 ** attempt) * (1 + random.random()))
+        except (EndpointUnavailable, httpx.HTTPStatusError):
+            raise
+        except httpx.HTTPError as error:
+            self._fail(str(error) or type(error).__name__, error)
+        except BaseException as error:
+            self._settle(error)
+            raise
+
+    async def aquery(self, query):
+        """
+        Executes a SELECT query without blocking the event loop and returns its results.
+        The response is decoded in a worker thread.
+
+        Parameters:
+            query (str): The SPARQL query.
+
+        Returns:
+            QueryResult: The results of the query.
+        """
+        response = await self.apost(query, accept=self.json_accept)
+        return await asyncio.to_thread(self._decode, response.content, response.headers.get("Content-Type"))
@@ -0,0 +1,72 @@
+import hashlib
+import re
+
+
+_PREFIX_PATTERN = re.compile(r"^\s*PREFIX\s+([\w\-]*:)\s*<([^>]*)>", re.IGNORECASE)
+_TOKEN_PATTERN = re.compile(r"(\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'|<[^>\s]*>)|\s+")
+
+
+def split_prologue(query):
+    """
+    Splits a SPARQL query into its PREFIX declarations and the remaining query body.
+
+    Parameters:
+        query (str): The SPARQL query.
+
+    Returns:
+        tuple: A list of (prefix, iri) tuples and the query body as a string.
+    """
+    prefixes = []
+    rest = query
+
+    while True:
+        match = _PREFIX_PATTERN.match(rest)
+        if not match:
+            break
+        prefixes.append((match.group(1), match.group(2)))
+        rest = rest[match.end():]
+
+    return prefixes, rest.strip()
+
+
+def collapse_whitespace(text):
+    """
+    Collapses every whitespace run outside of string literals and IRIs into a single space.
+
+    Parameters:
+        text (str): A SPARQL fragment.
+
+    Returns:
+        str: The fragment with normalized whitespace.
+    """
+    return _TOKEN_PATTERN.sub(lambda match: match.group(1) or " ", text).strip()
+
+
+def normalize_query(query):
+    """
+    Normalizes a SPARQL query so that queries differing only in whitespace or in the order
+    and layout of their PREFIX declarations map to the same text.
+
+    Parameters:
+        query (str): The SPARQL query.
+
+    Returns:
+        str: The normalized query.
+    """
+    prefixes, body = split_prologue(query)
+    prologue = " ".join(f"PREFIX {prefix} <{iri}>" for prefix, iri in sorted(set(prefixes)))
+
+    return f"{prologue} {collapse_whitespace(body)}".strip()
+
+
+def query_key(query):
+    """
+    Computes a stable cache key for a SPARQL query.
+
+    Parameters:
+        query (str): The SPARQL query.
+
+    Returns:
+        str: The hex SHA-256 digest of the normalized query.
+    """
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
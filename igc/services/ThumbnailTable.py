@@ -0,0 +1,75 @@
+from services.LookupTable import LookupTable
+
+
+class ThumbnailTable(LookupTable):
+    """
+    A materialized table mapping every type series item to a representative obverse and reverse thumbnail,
+    taken from one of the coins of that type.
+
+    Type searches normally aggregate the thumbnails of all coins with a SAMPLE/GROUP BY subquery on every
+    request. With this table, `CoinSearchHandler` leaves the subquery out and fills in the thumbnails in Python.
+
+    Attributes:
+        thumbnails (dict): Maps each type series item URI to its (obverse, reverse) thumbnail URLs, either may be None.
+    """
+
+    name = "thumbnail table"
+    query = """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX foaf: <http://xmlns.com/foaf/0.1/>
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    SELECT ?type (SAMPLE(?obvThumbnail) AS ?thumbnailObverse) (SAMPLE(?revThumbnail) AS ?thumbnailReverse) WHERE {
+        ?numismaticObject nmo:hasTypeSeriesItem ?type ;
+                        rdf:type nmo:NumismaticObject .
+        OPTIONAL {
+            ?numismaticObject nmo:hasObverse ?obvSide .
+            ?obvSide dcterms:relation ?obverseRelation .
+            ?obverseRelation foaf:thumbnail ?obvThumbnail .
+        }
+        OPTIONAL {
+            ?numismaticObject nmo:hasObverse ?obvSide .
+            ?obvSide foaf:thumbnail ?obvThumbnail .
+        }
+        OPTIONAL {
+            ?numismaticObject nmo:hasReverse ?revSide .
+            ?revSide dcterms:relation ?reverseRelation .
+            ?reverseRelation foaf:thumbnail ?revThumbnail .
+        }
+        OPTIONAL {
+            ?numismaticObject nmo:hasReverse ?revSide .
+            ?revSide foaf:thumbnail ?revThumbnail .
+        }
+    } GROUP BY ?type
+    """
+
+    def __init__(self, path=None, max_age=24 * 60 * 60, build_timeout=10 * 60):
+        """
+        Initializes the table from its file, if there is one.
+
+        Parameters:
+            path (str): The path of the JSON file holding the thumbnails, or None for a memory-only table.
+            max_age (float): The age in seconds after which the table is rebuilt.
+            build_timeout (float): The read timeout in seconds of the query that builds the table.
+        """
+        self.thumbnails = {}
+
+        super().__init__(path, max_age, build_timeout)
+
+    def _row(self, row):
+        return [row.type, row.thumbnailObverse, row.thumbnailReverse]
+
+    def _set(self, rows):
+        self.thumbnails = {type: (obverse, reverse) for type, obverse, reverse in rows}
+
+    def get(self, type):
+        """
+        Returns the representative thumbnails of a type series item.
+
+        Parameters:
+            type (str): The URI of the type series item.
+
+        Returns:
+            tuple: The obverse and reverse thumbnail URLs, (None, None) for unknown types.
+        """
+        return self.thumbnails.get(type, (None, None))